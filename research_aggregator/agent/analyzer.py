@@ -1,76 +1,138 @@
-import os
 from dotenv import load_dotenv
-from pathlib import Path
-from mistral_inference.transformer import Transformer
-from mistral_inference.generate import generate
-from mistral_common.tokens.tokenizers.mistral import MistralTokenizer
-from mistral_common.protocol.instruct.messages import UserMessage
-from mistral_common.protocol.instruct.request import ChatCompletionRequest
+from src.instrumentation import metrics
+from src.deadline import Deadline
+from agent.inference_worker import InferenceClient
+from agent.context_packer import ContextPacker, mistral_token_counter
+from agent.llm_cache import LLMCache, get_llm_cache
 
 load_dotenv()
 
-# Define the path where the model will be downloaded
-mistral_models_path = Path.home().joinpath('mistral_models', '7B-Instruct-v0.3')
-
-# Initialize tokenizer and model globally to avoid re-loading on each call
-tokenizer = MistralTokenizer.from_file(str(mistral_models_path.joinpath('tokenizer.model.v3')))
-model = Transformer.from_folder(mistral_models_path)
-
-# Note: mistral_inference handles device placement internally, no explicit .to(device) needed
-
 class ResearchAnalyzer:
-    def __init__(self):
-        # No API key needed for local model
-        pass
-
-    def filter_and_analyze(self, query: str, articles: list[str]) -> str:
-        """
-        Filters relevant information from articles and generates a 'What, When, How, Why' analysis report 
-        using a locally run Mistral 7B model via mistral_inference.
+    MODEL_NAME = 'mistral-7b-instruct-v0.3'
+
+    def __init__(self, client: InferenceClient = None, packer: ContextPacker = None,
+                 article_token_limit: int = 3000, report_token_limit: int = 6000,
+                 cache: LLMCache = None):
+        # The model runs in a shared worker process, started and loaded on first use
+        self.client = client or InferenceClient()
+        self.cache = cache or get_llm_cache()
+        # Prompts carry only the most query-relevant passages that fit these token limits
+        self.packer = packer or ContextPacker(mistral_token_counter())
+        self.article_token_limit = article_token_limit
+        self.report_token_limit = report_token_limit
+
+    def warmup(self) -> dict:
+        """Start the inference worker and load the model ahead of the first request."""
+        return self.client.warmup()
+
+    def health(self) -> dict:
+        """Status of the inference worker, without starting it."""
+        return self.client.health()
+
+    def generate(self, prompts: list[str], max_tokens: int, temperature: float = 0.7,
+                 top_p: float = 0.9, time_budget: float = None) -> list:
+        """Generate through the response cache; only uncached prompts reach the worker.
+
+        Reports are sampled, so they are only cached when the cache is set
+        to cache_sampled (LLM_CACHE_SAMPLED=1), e.g. so a regression rerun
+        reproduces the same report. Cached outputs are marked with
+        'cached': True.
         """
+        params = {'max_tokens': max_tokens, 'temperature': temperature, 'top_p': top_p}
+        outputs = [self.cache.get(self.MODEL_NAME, prompt, params) for prompt in prompts]
+        for output in outputs:
+            if output is not None:
+                output['cached'] = True
+        missing = [i for i, output in enumerate(outputs) if output is None]
+        if missing:
+            generated = self.client.generate(
+                [prompts[i] for i in missing], max_tokens, temperature, top_p, time_budget
+            )
+            for i, output in zip(missing, generated):
+                if output is not None:
+                    self.cache.put(self.MODEL_NAME, prompts[i], params, output)
+                    outputs[i] = output
+        return outputs
+
+    # Share of the deadline the per-article filter pass may use; the report gets the rest
+    FILTER_SHARE = 0.6
+
+    def _filter(self, query: str, articles: list[str], deadline: Deadline = None) -> list[str]:
+        """First pass: the relevant information from each article, "" where there is none."""
         filtered_information = []
+        filter_deadline = deadline.child(self.FILTER_SHARE) if deadline else None
 
-        # First pass: Filter relevant information from each article
-        for i, article_content in enumerate(articles):
-            # Mistral instruct format
-            filter_prompt_content = f"""
+        # Mistral instruct format; the worker batches the prompts by length.
+        filter_prompts = [
+            f"""
             You are a research assistant. Read the following article carefully.
             Extract ALL facts, events, and statements that are directly relevant to answering the research query: "{query}".
             List the extracted information clearly, sentence by sentence or as concise points.
             If no information is relevant, state 'No relevant facts found'.
 
             Article {i+1}:
-            {article_content}
+            {self.packer.pack(query, [article_content], self.article_token_limit).sources[0]}
 
             Extracted Relevant Information:
             """
-            
-            completion_request = ChatCompletionRequest(messages=[UserMessage(content=filter_prompt_content)])
-            encoded_prompt_tokens = tokenizer.encode_chat_completion(completion_request).tokens
-
-            try:
-                # Generate response using mistral_inference
-                output_tokens, _ = generate(
-                    [encoded_prompt_tokens],
-                    model,
+            for i, article_content in enumerate(articles)
+        ]
+
+        try:
+            # Generate responses in the inference worker
+            with metrics.span('llm.generate', model='mistral-7b', stage='filter', batch=len(filter_prompts)):
+                outputs = self.generate(
+                    filter_prompts,
                     max_tokens=1000,
                     temperature=0.7,
                     top_p=0.9,
-                    eos_id=tokenizer.instruct_tokenizer.tokenizer.eos_id # Ensure eos_id is used
+                    time_budget=filter_deadline.timeout() if filter_deadline else None
                 )
-                extracted_text = tokenizer.decode(output_tokens[0]).strip()
-                if extracted_text.lower() != "no relevant facts found" and extracted_text.strip():
-                    filtered_information.append(f"Source {i+1}:\n{extracted_text}")
-            except Exception as e:
-                print(f"Error filtering article {i+1}: {str(e)}")
+            if deadline:
+                finished = sum(output is not None for output in outputs)
+                deadline.mark('filter', 'complete' if finished == len(outputs)
+                              else 'partial' if finished else 'timed_out')
+        except Exception as e:
+            print(f"Error filtering articles: {str(e)}")
+            outputs = []
+            if deadline:
+                deadline.mark('filter', 'failed')
+
+        for i, output in enumerate(outputs):
+            if output is None:
+                filtered_information.append("")
                 continue
+            if not output.get('cached'):
+                metrics.incr('llm.tokens_generated', output['generated_tokens'])
+            extracted_text = output['text']
+            if extracted_text.lower() != "no relevant facts found" and extracted_text.strip():
+                filtered_information.append(extracted_text)
+            else:
+                filtered_information.append("")
+        return filtered_information
+
+    def _report_prompt(self, query: str, articles: list[str], deadline: Deadline = None) -> tuple:
+        """Run the filter pass and build the report prompt.
+
+        Returns (prompt, partial): the prompt, and the filtered information
+        to return instead if the report runs out of time. The prompt is None
+        when there is nothing to report on or no time left for the report.
+        """
+        filtered_information = self._filter(query, articles, deadline)
+        if not any(filtered_information):
+            return None, "No relevant information found for the query to generate a report."
 
-        if not filtered_information:
-            return "No relevant information found for the query to generate a report."
+        # Numbered by article position, so 'Source N' stays the same article after packing
+        combined_filtered_text = self.packer.pack(
+            query, filtered_information, self.report_token_limit
+        ).numbered()
 
-        combined_filtered_text = "\n\n".join(filtered_information)
+        partial = ("Partial analysis (time budget reached before the report was generated).\n\n"
+                   f"Filtered Information:\n{combined_filtered_text}")
+        if deadline and deadline.expired():
+            deadline.mark('report', 'skipped')
+            return None, partial
 
-        # Second pass: Generate the comprehensive analysis report
         analysis_prompt_content = f"""
         You are an AI research analyst. Based on the following filtered information related to the query: "{query}", generate a comprehensive analysis report with the following sections:
 
@@ -86,19 +148,87 @@ class ResearchAnalyzer:
 
         Comprehensive Analysis Report:
         """
-        
-        completion_request = ChatCompletionRequest(messages=[UserMessage(content=analysis_prompt_content)])
-        encoded_analysis_tokens = tokenizer.encode_chat_completion(completion_request).tokens
+        return analysis_prompt_content, partial
+
+    # Sampling settings of the report pass, shared by the blocking and streaming paths
+    REPORT_PARAMS = {'max_tokens': 2000, 'temperature': 0.7, 'top_p': 0.9}
 
+    def filter_and_analyze(self, query: str, articles: list[str], deadline: Deadline = None) -> str:
+        """
+        Filters relevant information from articles and generates a 'What, When, How, Why' analysis report 
+        using a locally run Mistral 7B model via mistral_inference.
+
+        With a deadline, the filter pass stops starting new batches when its
+        share runs out. The report pass gets the rest: if it runs out before
+        the worker starts the report (e.g. while it serves other requests),
+        the filtered information is returned as is. A batch the worker has
+        started is not interrupted. Stage outcomes are recorded on the
+        deadline.
+        """
+        analysis_prompt_content, partial = self._report_prompt(query, articles, deadline)
+        if analysis_prompt_content is None:
+            return partial
+
+        # Second pass: Generate the comprehensive analysis report
         try:
-            output_tokens, _ = generate(
-                [encoded_analysis_tokens],
-                model,
-                max_tokens=2000, # Increased tokens for detailed report
-                temperature=0.7,
-                top_p=0.9,
-                eos_id=tokenizer.instruct_tokenizer.tokenizer.eos_id # Ensure eos_id is used
-            )
-            return tokenizer.decode(output_tokens[0]).strip()
+            with metrics.span('llm.generate', model='mistral-7b', stage='report'):
+                output = self.generate([analysis_prompt_content], **self.REPORT_PARAMS,
+                                       time_budget=deadline.timeout() if deadline else None)[0]
+            if output is None:
+                if deadline:
+                    deadline.mark('report', 'timed_out')
+                return partial
+            if not output.get('cached'):
+                metrics.incr('llm.tokens_generated', output['generated_tokens'])
+            if deadline:
+                deadline.mark('report')
+            return output['text']
+        except Exception as e:
+            if deadline:
+                deadline.mark('report', 'failed')
+            return f"Error generating analysis report with Mistral: {str(e)}"
+
+    def filter_and_analyze_stream(self, query: str, articles: list[str], deadline: Deadline = None):
+        """Like filter_and_analyze, but yields the report as it is generated.
+
+        The filter pass runs first, as a batch; the report is then streamed
+        from the worker a few tokens at a time, so the first words show up
+        long before the full report is done. A cached report, or a partial
+        or error result, is yielded in one piece. With a deadline, the
+        stream is stopped once it passes, ending with a note that the report
+        is incomplete. Suitable for st.write_stream.
+        """
+        analysis_prompt_content, partial = self._report_prompt(query, articles, deadline)
+        if analysis_prompt_content is None:
+            yield partial
+            return
+
+        cached = self.cache.get(self.MODEL_NAME, analysis_prompt_content, self.REPORT_PARAMS)
+        if cached is not None:
+            if deadline:
+                deadline.mark('report')
+            yield cached['text']
+            return
+
+        pieces = []
+        try:
+            with metrics.span('llm.generate', model='mistral-7b', stage='report', streamed=True):
+                for piece in self.client.stream(analysis_prompt_content, **self.REPORT_PARAMS):
+                    pieces.append(piece)
+                    yield piece
+                    if deadline and deadline.expired():
+                        # Leaving the loop closes the stream, which stops decoding in the worker
+                        deadline.mark('report', 'timed_out')
+                        yield "\n\n(Time budget reached; the report is incomplete.)"
+                        return
         except Exception as e:
-            return f"Error generating analysis report with Mistral: {str(e)}" 
\ No newline at end of file
+            if deadline:
+                deadline.mark('report', 'failed')
+            yield f"\n\nError generating analysis report with Mistral: {str(e)}"
+            return
+        # Only a report that streamed to the end is cached
+        text = "".join(pieces)
+        self.cache.put(self.MODEL_NAME, analysis_prompt_content, self.REPORT_PARAMS,
+                       {'text': text, 'prompt_tokens': None, 'generated_tokens': None})
+        if deadline:
+            deadline.mark('report')
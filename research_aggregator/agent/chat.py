@@ -1,41 +1,222 @@
-import google.generativeai as genai
+import logging
 import os
 from dotenv import load_dotenv
+from sklearn.feature_extraction.text import TfidfVectorizer
+from agent.gemini_client import GEMINI_MODEL, GeminiClient, get_gemini_client
+from agent.context_packer import ContextPacker, approximate_token_counter
+from agent.llm_cache import LLMCache, get_llm_cache
 
 load_dotenv()
 
+SUMMARY_PROMPT = """Update the running summary of a research conversation with the turns below.
+Keep every fact, figure, source number and open question the user may refer back to. Write at most {words} words.
+
+Current summary:
+{summary}
+
+New turns:
+{turns}
+
+Updated summary:"""
+
 class ResearchChat:
-    def __init__(self):
-        """Initialize the chat with Google's Generative AI model."""
+    def __init__(self, cache: LLMCache = None, client: GeminiClient = None,
+                 max_history_tokens: int = 2000, max_context_tokens: int = 1500,
+                 summary_words: int = 200, retrieval_k: int = 6):
+        """Initialize the chat with Google's Generative AI model.
+
+        Each request carries a bounded context: the rolling summary of older
+        turns, the recent turns that fit in `max_history_tokens`, and the
+        corpus passages most relevant to the question, up to
+        `max_context_tokens`. When the recent turns outgrow their budget the
+        oldest are folded into the summary in the background, so the cost
+        of a turn doesn't grow with the length of the conversation.
+        """
         api_key = os.getenv("GOOGLE_API_KEY")
         if not api_key:
             raise ValueError("GOOGLE_API_KEY not found in environment variables")
-            
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('models/gemini-1.5-flash')
-        self.chat = self.model.start_chat(history=[])
-        
+
+        self.logger = logging.getLogger(__name__)
+        # Requests go through the process-wide client so every chat shares its rate limits
+        self.client = client or get_gemini_client()
+        # Chat replies are sampled, so they are only cached when the cache is set to cache_sampled
+        self.cache = cache or get_llm_cache()
+        self.max_history_tokens = max_history_tokens
+        self.max_context_tokens = max_context_tokens
+        self.summary_words = summary_words
+        self.retrieval_k = retrieval_k
+
+        self.transcript = []    # Every message, for display only
+        self.window = []        # Recent turns sent with each request
+        self.summary = ""
+        self._folding = None    # (turns, future) while a summary update is in flight
+
+        self.packer = ContextPacker(approximate_token_counter)
+        self.passages = []      # (source number, passage text)
+        self._vectorizer = None
+        self._matrix = None
+
+    # Session corpus
+
+    def set_corpus(self, documents: list):
+        """Index the session's scraped articles (or reports) for retrieval, numbered from 1."""
+        self.passages = [
+            (number, passage)
+            for number, document in enumerate(documents, 1)
+            for passage in self.packer.split_passages(document)
+        ]
+        if not self.passages:
+            self._vectorizer = self._matrix = None
+            return
+        self._vectorizer = TfidfVectorizer(stop_words='english', sublinear_tf=True)
+        self._matrix = self._vectorizer.fit_transform([passage for _, passage in self.passages])
+
+    def retrieve(self, question: str) -> list:
+        """The corpus passages most relevant to `question` that fit the context budget."""
+        if self._vectorizer is None:
+            return []
+        scores = (self._matrix @ self._vectorizer.transform([question]).T).toarray().ravel()
+        selected, spent = [], 0
+        for i in scores.argsort()[::-1][:self.retrieval_k]:
+            if scores[i] <= 0:
+                break
+            tokens = approximate_token_counter(self.passages[i][1])
+            if spent + tokens > self.max_context_tokens:
+                continue
+            selected.append(self.passages[i])
+            spent += tokens
+        return selected
+
+    # History
+
+    @staticmethod
+    def _text(turn: dict) -> str:
+        return " ".join(turn['parts'])
+
+    def _window_tokens(self) -> int:
+        return sum(approximate_token_counter(self._text(turn)) for turn in self.window)
+
+    def _apply_folded_summary(self):
+        if self._folding is None or not self._folding[1].done():
+            return
+        turns, future = self._folding
+        self._folding = None
+        try:
+            self.summary = future.result().text.strip()
+        except Exception as e:
+            # Keep the turns rather than lose them; they'll be folded again later
+            self.logger.warning(f"Could not update the chat summary: {str(e)}")
+            self.window = turns + self.window
+
+    def _compact(self):
+        """Fold the oldest turns into the summary once the window is over budget."""
+        if self._folding is not None or self._window_tokens() <= self.max_history_tokens:
+            return
+        folded = []
+        # Drop whole user/model pairs until the window is back to half its budget
+        while len(self.window) > 2 and self._window_tokens() > self.max_history_tokens // 2:
+            folded.extend(self.window[:2])
+            self.window = self.window[2:]
+        if not folded:
+            return
+        prompt = SUMMARY_PROMPT.format(
+            words=self.summary_words,
+            summary=self.summary or "(none yet)",
+            turns="\n".join(f"{turn['role']}: {self._text(turn)}" for turn in folded)
+        )
+        self._folding = (folded, self.client.submit(prompt, stage='chat_summary'))
+
+    def build_contents(self, message: str) -> list:
+        """The request for `message`: summary, retrieved passages, recent turns and the question."""
+        # Turns being folded aren't in the summary yet, so they still go out verbatim
+        recent = (self._folding[0] if self._folding else []) + self.window
+        previous_question = next((self._text(t) for t in reversed(recent) if t['role'] == 'user'), "")
+        passages = self.retrieve(f"{previous_question} {message}")
+
+        context = []
+        if self.summary:
+            context.append(f"Summary of the earlier conversation:\n{self.summary}")
+        if passages:
+            context.append("Relevant passages from the research sources:\n" + "\n\n".join(
+                f"[Source {number}] {passage}" for number, passage in passages
+            ))
+        question = message
+        if context:
+            question = ("\n\n".join(context) + "\n\nAnswer using the passages above where relevant, "
+                        f"citing sources as [n].\n\nQuestion: {message}")
+        return recent + [{'role': 'user', 'parts': [question]}]
+
     def send_message(self, message: str) -> str:
         """
         Send a message to the chat and get the response.
-        
+
         Args:
             message (str): The user's message
-            
+
         Returns:
             str: The model's response
         """
-        try:
-            response = self.chat.send_message(message)
-            return response.text
-        except Exception as e:
-            return f"Error: {str(e)}"
-            
+        self._apply_folded_summary()
+        contents = self.build_contents(message)
+        user_turn = {'role': 'user', 'parts': [message]}
+        self.transcript.append(user_turn)
+
+        # The reply depends on everything sent, so that is the cache key
+        cache_params = {'temperature': None}
+        reply = self.cache.get(GEMINI_MODEL, contents, cache_params)
+        if reply is None:
+            try:
+                reply = self.client.generate(contents, stage='chat').text
+                self.cache.put(GEMINI_MODEL, contents, cache_params, reply)
+            except Exception as e:
+                self.transcript.pop()
+                return f"Error: {str(e)}"
+
+        model_turn = {'role': 'model', 'parts': [reply]}
+        self.transcript.append(model_turn)
+        self.window.extend([user_turn, model_turn])
+        self._compact()
+        return reply
+
+    def stream_message(self, message: str):
+        """
+        Like send_message, but yields the response in pieces as it is generated.
+
+        The turn is added to the history once the reply has streamed to the
+        end; a failed reply yields an error message and leaves no turn behind.
+        """
+        self._apply_folded_summary()
+        contents = self.build_contents(message)
+        user_turn = {'role': 'user', 'parts': [message]}
+        self.transcript.append(user_turn)
+
+        cache_params = {'temperature': None}
+        reply = self.cache.get(GEMINI_MODEL, contents, cache_params)
+        if reply is not None:
+            yield reply
+        else:
+            chunks = []
+            try:
+                for chunk in self.client.stream(contents, stage='chat'):
+                    chunks.append(chunk)
+                    yield chunk
+            except Exception as e:
+                self.transcript.pop()
+                yield f"Error: {str(e)}"
+                return
+            reply = "".join(chunks)
+            self.cache.put(GEMINI_MODEL, contents, cache_params, reply)
+
+        model_turn = {'role': 'model', 'parts': [reply]}
+        self.transcript.append(model_turn)
+        self.window.extend([user_turn, model_turn])
+        self._compact()
+
     def get_history(self) -> list:
         """
         Get the chat history.
-        
+
         Returns:
             list: List of messages in the chat history
         """
-        return self.chat.history 
\ No newline at end of file
+        return self.transcript
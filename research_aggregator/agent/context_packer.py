@@ -0,0 +1,152 @@
+import logging
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, List
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from agent.inference_worker import MISTRAL_MODELS_PATH
+
+# Rough English average, for models whose tokenizer isn't available locally
+CHARS_PER_TOKEN = 4
+
+
+def approximate_token_counter(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def mistral_token_counter(model_path: Path = MISTRAL_MODELS_PATH) -> Callable[[str], int]:
+    """Count tokens with the Mistral tokenizer (a small file; the model itself isn't loaded).
+
+    Falls back to the character estimate if the tokenizer can't be loaded.
+    """
+    try:
+        from mistral_common.tokens.tokenizers.mistral import MistralTokenizer
+
+        tokenizer = MistralTokenizer.from_file(str(Path(model_path).joinpath('tokenizer.model.v3')))
+        raw = tokenizer.instruct_tokenizer.tokenizer
+        return lambda text: len(raw.encode(text, bos=False, eos=False))
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"Mistral tokenizer unavailable, estimating tokens: {str(e)}")
+        return approximate_token_counter
+
+
+@dataclass
+class PackedContext:
+    """Packed source texts, in the same order (and so with the same numbers) as the input."""
+    sources: List[str]
+    tokens: List[int]
+    dropped_passages: int = 0
+    truncated_sources: List[int] = field(default_factory=list)
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self.tokens)
+
+    def numbered(self, label: str = "Source") -> str:
+        """The sources joined as 'Source 1: ...' blocks, skipping any packed to nothing."""
+        return "\n\n".join(
+            f"{label} {i + 1}:\n{text}" for i, text in enumerate(self.sources) if text
+        )
+
+
+class ContextPacker:
+    """Fits source texts into a prompt token budget, keeping the most relevant parts.
+
+    Each source is split into passages (paragraphs, or groups of sentences
+    for long paragraphs) and every passage is scored by TF-IDF similarity
+    to the query. The budget is shared fairly between sources: a source
+    that needs less than its share gives the rest to the others. Each
+    source then keeps its best passages that fit, in their original order.
+    """
+
+    def __init__(self, count_tokens: Callable[[str], int] = approximate_token_counter,
+                 max_tokens: int = 6000, passage_tokens: int = 200, lead_bonus: float = 0.1):
+        self.logger = logging.getLogger(__name__)
+        self.count_tokens = count_tokens
+        self.max_tokens = max_tokens
+        self.passage_tokens = passage_tokens
+        # Opening paragraphs tend to carry the gist, so they get a small boost
+        self.lead_bonus = lead_bonus
+
+    def split_passages(self, text: str) -> List[str]:
+        passages = []
+        for paragraph in re.split(r"\s*\n\s*", text):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            if self.count_tokens(paragraph) <= self.passage_tokens:
+                passages.append(paragraph)
+                continue
+            current = ""
+            for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+                candidate = f"{current} {sentence}".strip()
+                if current and self.count_tokens(candidate) > self.passage_tokens:
+                    passages.append(current)
+                    current = sentence
+                else:
+                    current = candidate
+            if current:
+                passages.append(current)
+        return passages
+
+    def score_passages(self, query: str, passages: List[str]) -> List[float]:
+        try:
+            vectorizer = TfidfVectorizer(stop_words='english')
+            matrix = vectorizer.fit_transform(passages + [query])
+            return (matrix[:-1] @ matrix[-1].T).toarray().ravel().tolist()
+        except ValueError:
+            # Only stop words or empty text; fall back to document order
+            return [0.0] * len(passages)
+
+    @staticmethod
+    def allocate(needs: List[int], budget: int) -> List[int]:
+        """Split `budget` across sources: none gets more than it needs, the rest share equally."""
+        allocation = [0] * len(needs)
+        open_sources = [i for i, need in enumerate(needs) if need > 0]
+        while open_sources and budget > 0:
+            share = budget // len(open_sources)
+            satisfied = [i for i in open_sources if needs[i] <= share]
+            if not satisfied:
+                for i in open_sources:
+                    allocation[i] = share
+                break
+            for i in satisfied:
+                allocation[i] = needs[i]
+                budget -= needs[i]
+            open_sources = [i for i in open_sources if i not in satisfied]
+        return allocation
+
+    def pack(self, query: str, sources: List[str], max_tokens: int = None) -> PackedContext:
+        """Pack `sources` into at most `max_tokens` (default: the packer's limit)."""
+        max_tokens = max_tokens or self.max_tokens
+        split = [self.split_passages(text) for text in sources]
+        passages = [passage for source in split for passage in source]
+        flat_scores = self.score_passages(query, passages) if passages else []
+        token_counts = [[self.count_tokens(passage) for passage in source] for source in split]
+        allocation = self.allocate([sum(counts) for counts in token_counts], max_tokens)
+
+        packed, used, dropped, truncated = [], [], 0, []
+        offset = 0
+        for index, (source, counts, budget) in enumerate(zip(split, token_counts, allocation)):
+            scores = flat_scores[offset:offset + len(source)]
+            offset += len(source)
+            if scores:
+                scores[0] += self.lead_bonus
+            ranked = sorted(range(len(source)), key=scores.__getitem__, reverse=True)
+            keep, spent = set(), 0
+            for i in ranked:
+                if spent + counts[i] <= budget:
+                    keep.add(i)
+                    spent += counts[i]
+            if len(keep) < len(source):
+                dropped += len(source) - len(keep)
+                truncated.append(index)
+            packed.append("\n\n".join(source[i] for i in sorted(keep)))
+            used.append(spent)
+
+        if truncated:
+            self.logger.info(f"Packed {len(sources)} sources into {sum(used)} tokens, "
+                             f"dropping {dropped} passages")
+        return PackedContext(packed, used, dropped, truncated)
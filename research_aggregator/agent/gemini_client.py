@@ -0,0 +1,333 @@
+import asyncio
+import concurrent.futures
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+
+import google.generativeai as genai
+from dotenv import load_dotenv
+
+from src.instrumentation import metrics
+from src.deadline import Deadline, DeadlineExceeded
+from agent.context_packer import approximate_token_counter
+
+load_dotenv()
+
+GEMINI_MODEL = 'models/gemini-1.5-flash'
+
+
+class RateLimitException(Exception):
+    """Custom exception for rate limit errors."""
+    pass
+
+
+def record_token_usage(response):
+    """Add Gemini's reported prompt and output token counts to the metrics."""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is not None:
+        metrics.incr('llm.tokens_prompt', getattr(usage, 'prompt_token_count', 0))
+        metrics.incr('llm.tokens_generated', getattr(usage, 'candidates_token_count', 0))
+
+
+def is_rate_limited(error: Exception) -> bool:
+    text = str(error).lower()
+    return (type(error).__name__ in ('ResourceExhausted', 'TooManyRequests')
+            or '429' in text or 'quota' in text or 'rate limit' in text)
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """The server's suggested wait in seconds, from a Retry-After header or RetryInfo, if given."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    if headers.get('retry-after'):
+        try:
+            return float(headers['retry-after'])
+        except ValueError:
+            pass
+    match = (re.search(r"retry_delay\s*\{\s*seconds:\s*(\d+)", str(error))
+             or re.search(r"retry in ([\d.]+)\s*s", str(error), re.IGNORECASE))
+    return float(match.group(1)) if match else None
+
+
+class TokenBucketLimiter:
+    """Client-side limiter on requests and tokens per minute.
+
+    Both buckets refill continuously up to one minute's allowance. A 429
+    halves the working rates and pauses new requests for the server's
+    suggested delay; every success then restores 5% of the configured rate,
+    so throughput climbs back once the quota recovers. Use from one event loop.
+    `clock` and `sleep` can be replaced, e.g. by a simulated clock in tests.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float, min_fraction: float = 0.1,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], Any] = asyncio.sleep):
+        self.max_rpm = requests_per_minute
+        self.max_tpm = tokens_per_minute
+        self.min_fraction = min_fraction
+        self.fraction = 1.0
+        self.requests = requests_per_minute
+        self.tokens = tokens_per_minute
+        self.paused_until = 0.0
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self._lock = asyncio.Lock()
+
+    @property
+    def rpm(self) -> float:
+        return self.max_rpm * self.fraction
+
+    @property
+    def tpm(self) -> float:
+        return self.max_tpm * self.fraction
+
+    def _refill(self):
+        now = self.clock()
+        elapsed = now - self.updated
+        self.updated = now
+        self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60)
+        self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60)
+
+    def wait_time(self, tokens: int) -> float:
+        """Seconds until a request of `tokens` tokens may start."""
+        self._refill()
+        # A request larger than a minute's allowance waits for a full bucket
+        tokens = min(tokens, self.tpm)
+        waits = [
+            self.paused_until - self.clock(),
+            (1 - self.requests) * 60 / self.rpm,
+            (tokens - self.tokens) * 60 / self.tpm
+        ]
+        return max(0.0, *waits)
+
+    async def acquire(self, tokens: int, deadline: Optional[Deadline] = None):
+        # Requests are admitted in arrival order; the lock is held while waiting
+        async with self._lock:
+            while (wait := self.wait_time(tokens)) > 0:
+                if deadline and wait > deadline.remaining():
+                    raise RateLimitException(f"Rate limit would delay the request {wait:.1f}s past the deadline")
+                metrics.observe('gemini.limiter_wait.ms', wait * 1000)
+                await self.sleep(wait)
+            self.requests -= 1
+            self.tokens -= min(tokens, self.tpm)
+
+    def settle(self, estimated: int, actual: int):
+        """Correct the token bucket once the real usage of a request is known."""
+        self.tokens -= actual - estimated
+
+    def on_success(self):
+        self.fraction = min(1.0, self.fraction + 0.05)
+
+    def on_rate_limited(self, delay: Optional[float]):
+        self.fraction = max(self.min_fraction, self.fraction / 2)
+        self.requests = min(self.requests, 0)
+        self.paused_until = max(self.paused_until, self.clock() + (delay or 60 / self.rpm))
+        metrics.incr('gemini.rate_limited')
+
+
+class GeminiClient:
+    """Process-wide Gemini client with client-side rate limiting.
+
+    genai is configured once and a GenerativeModel is kept per model name.
+    Requests run on a private event loop thread, so callers in any thread
+    (Streamlit sessions, worker threads, other event loops) share one
+    limiter and up to `max_concurrency` requests in flight. Rate-limited
+    requests are retried after the server's suggested delay, up to
+    `max_retries` times or until the caller's deadline. A request is also
+    sent with the deadline's remaining time as its timeout, and the
+    blocking calls give up and cancel it with DeadlineExceeded once the
+    deadline passes.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, requests_per_minute: float = 15,
+                 tokens_per_minute: float = 1_000_000, max_concurrency: int = 8, max_retries: int = 5,
+                 expected_output_tokens: int = 1024):
+        self.logger = logging.getLogger(__name__)
+        api_key = api_key or os.getenv("GOOGLE_API_KEY")
+        if not api_key:
+            raise ValueError("GOOGLE_API_KEY not found in environment variables")
+        genai.configure(api_key=api_key)
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.expected_output_tokens = expected_output_tokens
+        self.models: Dict[str, Any] = {}
+        self._loop = None
+        self._start_lock = threading.Lock()
+
+    def model(self, model_name: str = GEMINI_MODEL):
+        if model_name not in self.models:
+            self.models[model_name] = genai.GenerativeModel(model_name)
+        return self.models[model_name]
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='gemini-client', daemon=True).start()
+                # Loop-bound primitives are created on the loop they will be used from
+                asyncio.run_coroutine_threadsafe(self._setup(), self._loop).result()
+            return self._loop
+
+    async def _setup(self):
+        self.limiter = TokenBucketLimiter(self.requests_per_minute, self.tokens_per_minute)
+        self.in_flight = asyncio.Semaphore(self.max_concurrency)
+
+    async def _generate(self, contents, model_name: str, generation_config: Optional[Dict],
+                        deadline: Optional[Deadline], stage: str,
+                        on_chunk: Optional[Callable[[str], None]] = None):
+        """Send one request, retrying on rate limits. With `on_chunk`, the
+        response is streamed and each chunk's text passed to it as it arrives;
+        a stream that has started delivering is not retried."""
+        prompt_text = contents if isinstance(contents, str) else str(contents)
+        estimated = approximate_token_counter(prompt_text) + self.expected_output_tokens
+        started = time.monotonic()
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(estimated, deadline)
+            try:
+                delivered = False
+                async with self.in_flight:
+                    options = {}
+                    if deadline and deadline.timeout() is not None:
+                        deadline.check(stage)
+                        options['request_options'] = {'timeout': deadline.remaining()}
+                    with metrics.span('llm.generate', model=model_name, stage=stage):
+                        response = await self.model(model_name).generate_content_async(
+                            contents, generation_config=generation_config, stream=on_chunk is not None, **options
+                        )
+                        if on_chunk is not None:
+                            async for chunk in response:
+                                if not delivered:
+                                    metrics.observe('llm.first_chunk.ms', (time.monotonic() - started) * 1000)
+                                delivered = True
+                                on_chunk(chunk.text)
+                # Older API versions reported quota errors in the response body
+                if on_chunk is None and "quota_metric" in response.text and "rate-limits" in response.text:
+                    raise RateLimitException(response.text)
+            except Exception as e:
+                if delivered or not (isinstance(e, RateLimitException) or is_rate_limited(e)):
+                    raise
+                delay = retry_after(e)
+                self.limiter.on_rate_limited(delay)
+                if attempt == self.max_retries or (deadline and (delay or 0) > deadline.remaining()):
+                    raise RateLimitException(str(e)) from e
+                self.logger.warning(f"Gemini rate limited, retrying (attempt {attempt + 1}): {str(e)[:200]}")
+                continue
+
+            self.limiter.on_success()
+            usage = getattr(response, 'usage_metadata', None)
+            if usage is not None:
+                self.limiter.settle(estimated, getattr(usage, 'total_token_count', estimated))
+            record_token_usage(response)
+            return response
+
+    def submit(self, contents, model_name: str = GEMINI_MODEL, generation_config: Optional[Dict] = None,
+               deadline: Optional[Deadline] = None, stage: str = 'generate'):
+        """Schedule a request on the client's loop; returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(
+            self._generate(contents, model_name, generation_config, deadline, stage), self.loop
+        )
+
+    async def generate_async(self, contents, model_name: str = GEMINI_MODEL,
+                             generation_config: Optional[Dict] = None, deadline: Optional[Deadline] = None,
+                             stage: str = 'generate'):
+        """Await a response from any event loop."""
+        future = asyncio.wrap_future(self.submit(contents, model_name, generation_config, deadline, stage))
+        try:
+            # Cancelling the wrapper cancels the request on the client's loop
+            return await asyncio.wait_for(future, deadline.timeout() if deadline else None)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"No response from {model_name} within the deadline ({stage})")
+
+    def generate(self, contents, model_name: str = GEMINI_MODEL, generation_config: Optional[Dict] = None,
+                 deadline: Optional[Deadline] = None, stage: str = 'generate'):
+        """Blocking call for synchronous code."""
+        future = self.submit(contents, model_name, generation_config, deadline, stage)
+        try:
+            return future.result(timeout=deadline.timeout() if deadline else None)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise DeadlineExceeded(f"No response from {model_name} within the deadline ({stage})")
+
+    def stream(self, contents, model_name: str = GEMINI_MODEL, generation_config: Optional[Dict] = None,
+               deadline: Optional[Deadline] = None, stage: str = 'generate') -> Iterator[str]:
+        """Yield the response text chunk by chunk as Gemini produces it."""
+        chunks = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(
+            self._generate(contents, model_name, generation_config, deadline, stage, on_chunk=chunks.put),
+            self.loop
+        )
+        future.add_done_callback(lambda _: chunks.put(None))
+        try:
+            while True:
+                try:
+                    chunk = chunks.get(timeout=deadline.timeout() if deadline else None)
+                except queue.Empty:
+                    raise DeadlineExceeded(f"{model_name} did not finish within the deadline ({stage})")
+                if chunk is None:
+                    break
+                yield chunk
+            future.result()
+        finally:
+            # The consumer stopped early; don't keep generating for nobody
+            future.cancel()
+
+    async def stream_async(self, contents, model_name: str = GEMINI_MODEL,
+                           generation_config: Optional[Dict] = None, deadline: Optional[Deadline] = None,
+                           stage: str = 'generate') -> AsyncIterator[str]:
+        """Async version of stream(), usable from any event loop."""
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+
+        def put(chunk):
+            loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+
+        future = asyncio.run_coroutine_threadsafe(
+            self._generate(contents, model_name, generation_config, deadline, stage, on_chunk=put), self.loop
+        )
+        future.add_done_callback(lambda _: put(None))
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.get(), deadline.timeout() if deadline else None)
+                except asyncio.TimeoutError:
+                    raise DeadlineExceeded(f"{model_name} did not finish within the deadline ({stage})")
+                if chunk is None:
+                    break
+                yield chunk
+            future.result()
+        finally:
+            future.cancel()
+
+    def stats(self) -> Dict:
+        limiter = getattr(self, 'limiter', None)
+        if limiter is None:
+            return {'requests_per_minute': self.requests_per_minute, 'tokens_per_minute': self.tokens_per_minute}
+        return {
+            'requests_per_minute': round(limiter.rpm, 2),
+            'tokens_per_minute': round(limiter.tpm, 2),
+            'rate_fraction': limiter.fraction,
+            'paused_for': max(0.0, round(limiter.paused_until - limiter.clock(), 2))
+        }
+
+
+_shared_client = None
+_shared_lock = threading.Lock()
+
+def get_gemini_client() -> GeminiClient:
+    """The process-wide client, configured from GOOGLE_API_KEY, GEMINI_RPM and GEMINI_TPM."""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = GeminiClient(
+                requests_per_minute=float(os.getenv("GEMINI_RPM", "15")),
+                tokens_per_minute=float(os.getenv("GEMINI_TPM", "1000000")),
+                max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+            )
+        return _shared_client
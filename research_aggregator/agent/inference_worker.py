@@ -0,0 +1,435 @@
+import argparse
+import errno
+import inspect
+import logging
+import os
+import secrets
+import stat
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.managers import BaseManager, IteratorProxy
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Default location where download_model.py puts the weights
+MISTRAL_MODELS_PATH = Path.home().joinpath('mistral_models', '7B-Instruct-v0.3')
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = int(os.getenv('INFERENCE_WORKER_PORT', '50055'))
+AUTHKEY_PATH = Path(os.getenv('INFERENCE_WORKER_AUTHKEY_FILE', PROJECT_ROOT.joinpath('data', 'inference_worker.key')))
+
+
+def load_authkey(path: Path = AUTHKEY_PATH, create: bool = True) -> bytes:
+    """The key clients and the worker authenticate with.
+
+    The manager unpickles what clients send, so anyone holding the key can
+    run code in the worker. It comes from INFERENCE_WORKER_AUTHKEY, or else
+    from a random per-install key file readable only by its owner, created
+    on first use if `create` is set. A key file others can read is refused.
+    """
+    if os.getenv('INFERENCE_WORKER_AUTHKEY'):
+        return os.environ['INFERENCE_WORKER_AUTHKEY'].encode('utf-8')
+    path = Path(path)
+    if create and not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(secrets.token_hex(32))
+        except FileExistsError:
+            # Another process created it first
+            pass
+    if not path.exists():
+        raise RuntimeError(f"No inference worker key: set INFERENCE_WORKER_AUTHKEY or create {path}")
+    if os.name == 'posix' and stat.S_IMODE(path.stat().st_mode) & 0o077:
+        raise RuntimeError(f"Inference worker key {path} is readable by other users; chmod 600 it")
+    key = path.read_text(encoding='utf-8').strip()
+    if not key:
+        raise RuntimeError(f"Inference worker key file {path} is empty")
+    return key.encode('utf-8')
+
+
+class MistralEngine:
+    """The Mistral model and tokenizer, loaded on first use.
+
+    Lives inside the worker process. Generation holds a lock because the
+    model is not safe to run from several threads at once; callers that
+    arrive together queue on it. If `idle_unload` is set, the model is
+    dropped after that many idle seconds and reloaded by the next request.
+
+    Several prompts are generated together in micro-batches of similar
+    length. Each batch is sized so its KV cache, every sequence at the
+    batch's longest prompt plus max_tokens, fits in `kv_cache_budget_mb`.
+    """
+
+    def __init__(self, model_path: Path = MISTRAL_MODELS_PATH, idle_unload: Optional[float] = None,
+                 max_batch_size: int = 8, kv_cache_budget_mb: int = 4096):
+        self.logger = logging.getLogger(__name__)
+        self.model_path = Path(model_path)
+        self.idle_unload = idle_unload
+        self.max_batch_size = max_batch_size
+        self.kv_cache_budget_mb = kv_cache_budget_mb
+        self.model = None
+        self.tokenizer = None
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.loaded_at = None
+        self.last_used = time.time()
+        self.requests = 0
+        if idle_unload:
+            threading.Thread(target=self._unload_when_idle, name='idle-unload', daemon=True).start()
+
+    def load(self):
+        """Load the tokenizer and model if they aren't loaded. Call with the lock held."""
+        if self.model is not None:
+            return
+        from mistral_inference.transformer import Transformer
+        from mistral_common.tokens.tokenizers.mistral import MistralTokenizer
+
+        started = time.perf_counter()
+        self.logger.info(f"Loading Mistral model from {self.model_path}")
+        self.tokenizer = MistralTokenizer.from_file(str(self.model_path.joinpath('tokenizer.model.v3')))
+        self.model = Transformer.from_folder(self.model_path, max_batch_size=self.max_batch_size)
+        self.loaded_at = time.time()
+        self.logger.info(f"Model loaded in {time.perf_counter() - started:.1f}s")
+
+    def unload(self):
+        import gc
+        import torch
+
+        with self._lock:
+            self.model = None
+            self.loaded_at = None
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        self.logger.info("Model unloaded")
+
+    def _unload_when_idle(self):
+        while True:
+            time.sleep(self.idle_unload / 4)
+            if self.model is not None and time.time() - self.last_used > self.idle_unload:
+                self.unload()
+
+    def encode(self, prompt: str) -> List[int]:
+        from mistral_common.protocol.instruct.messages import UserMessage
+        from mistral_common.protocol.instruct.request import ChatCompletionRequest
+
+        request = ChatCompletionRequest(messages=[UserMessage(content=prompt)])
+        return self.tokenizer.encode_chat_completion(request).tokens
+
+    def kv_bytes_per_token(self) -> int:
+        """KV cache bytes one token occupies across all layers."""
+        import torch
+
+        args = self.model.args
+        element_size = torch.tensor([], dtype=self.model.dtype).element_size()
+        return 2 * args.n_layers * args.n_kv_heads * args.head_dim * element_size
+
+    def plan_batches(self, lengths: List[int], max_tokens: int) -> List[List[int]]:
+        """Group prompt indices into batches of similar length that fit the KV cache budget.
+
+        A batch's cache has one row per prompt, each as long as its longest
+        prompt plus `max_tokens` (see _generate).
+        """
+        budget_tokens = self.kv_cache_budget_mb * 2**20 // self.kv_bytes_per_token()
+        batches, batch = [], []
+        # Shortest first, so the prompt being added is always the batch's longest
+        for index in sorted(range(len(lengths)), key=lengths.__getitem__):
+            window = lengths[index] + max_tokens
+            if batch and (len(batch) >= self.max_batch_size or (len(batch) + 1) * window > budget_tokens):
+                batches.append(batch)
+                batch = []
+            batch.append(index)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _generate(self, encoded: List[List[int]], max_tokens: int, temperature: float,
+                  top_p: float) -> List[List[int]]:
+        from mistral_inference.generate import generate
+
+        eos_id = self.tokenizer.instruct_tokenizer.tokenizer.eos_id
+        # Older mistral_inference releases sample with a fixed top_p
+        options = {'top_p': top_p} if 'top_p' in inspect.signature(generate).parameters else {}
+        # generate() sizes its KV cache by the model's max_batch_size, not the batch; allocate only
+        # this batch's rows so the memory matches what plan_batches() budgeted
+        args = self.model.args
+        allocated_rows, args.max_batch_size = args.max_batch_size, len(encoded)
+        try:
+            # generate() stops as soon as every sequence in the batch has produced EOS
+            output_tokens, _ = generate(
+                encoded,
+                self.model,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                eos_id=eos_id,
+                **options
+            )
+        finally:
+            args.max_batch_size = allocated_rows
+        # Sequences that finished early keep sampling until the batch is done; drop that tail
+        return [tokens[:tokens.index(eos_id)] if eos_id in tokens else tokens for tokens in output_tokens]
+
+    def generate(self, prompts: List[str], max_tokens: int = 1000, temperature: float = 0.7,
+                 top_p: float = 0.9, time_budget: Optional[float] = None) -> List[Optional[Dict]]:
+        """Complete each prompt as a user message. Returns text and token counts per prompt.
+
+        With `time_budget` (seconds, counted from the call), no new batch is
+        started once it has passed; prompts that were not generated get None.
+        """
+        started = time.monotonic()
+        with self._lock:
+            self.load()
+            self.requests += 1
+            encoded = [self.encode(prompt) for prompt in prompts]
+            results = [None] * len(prompts)
+            for batch in self.plan_batches([len(tokens) for tokens in encoded], max_tokens):
+                if time_budget is not None and time.monotonic() - started >= time_budget:
+                    break
+                output_tokens = self._generate([encoded[i] for i in batch], max_tokens, temperature, top_p)
+                for i, tokens in zip(batch, output_tokens):
+                    results[i] = {
+                        'text': self.tokenizer.decode(tokens).strip(),
+                        'prompt_tokens': len(encoded[i]),
+                        'generated_tokens': len(tokens)
+                    }
+            self.last_used = time.time()
+            return results
+
+    def stream(self, prompt: str, max_tokens: int = 1000, temperature: float = 0.7,
+               top_p: float = 0.9, chunk_tokens: int = 4) -> Iterator[str]:
+        """Yield the completion of one prompt as text pieces while it is decoded.
+
+        A token-by-token version of mistral_inference.generate for a single
+        sequence: the prompt is prefilled into a KV cache, then each sampled
+        token is fed back one at a time. Every `chunk_tokens` tokens the new
+        text is yielded; the whole sequence is re-decoded each time so
+        multi-token characters and word spacing come out right. The model
+        lock is taken per decoding step, so other requests interleave with
+        a stream instead of waiting for it to be read to the end.
+        """
+        import torch
+        from mistral_inference.cache import BufferCache
+        from mistral_inference.generate import sample
+
+        with self._lock:
+            self.load()
+            self.requests += 1
+            model = self.model.eval()
+            tokens = self.encode(prompt)
+            eos_id = self.tokenizer.instruct_tokenizer.tokenizer.eos_id
+            # A single sequence needs one cache row, not the batch's max_batch_size
+            cache = BufferCache(model.n_local_layers, 1, len(tokens) + max_tokens,
+                                model.args.n_kv_heads, model.args.head_dim, model.args.sliding_window)
+            cache.to(device=model.device, dtype=model.dtype)
+            cache.reset()
+            with torch.inference_mode():
+                prelogits = model.forward(
+                    torch.tensor(tokens, device=model.device, dtype=torch.long), seqlens=[len(tokens)], cache=cache
+                )[-1:]
+
+        generated, emitted = [], ""
+        for _ in range(max_tokens):
+            next_token = sample(prelogits, temperature=temperature, top_p=top_p)
+            if next_token.item() == eos_id:
+                break
+            generated.append(next_token.item())
+            if len(generated) % chunk_tokens == 0:
+                text = self.tokenizer.decode(generated)
+                # Yielded without the lock, so a slow or abandoned consumer holds up no other request
+                yield text[len(emitted):]
+                emitted = text
+            # Other requests run between our steps; this sequence's state is all in its own cache
+            with self._lock, torch.inference_mode():
+                prelogits = model.forward(next_token, seqlens=[1], cache=cache)
+                self.last_used = time.time()
+        text = self.tokenizer.decode(generated)
+        if len(text) > len(emitted):
+            yield text[len(emitted):]
+        self.last_used = time.time()
+
+    def warmup(self) -> Dict:
+        """Load the model and run a one-token generation so the first real request is fast."""
+        self.generate(["Hello"], max_tokens=1)
+        return self.health()
+
+    def health(self) -> Dict:
+        return {
+            'status': 'ready' if self.model is not None else 'idle',
+            'pid': os.getpid(),
+            'model_path': str(self.model_path),
+            'uptime_seconds': round(time.time() - self.started_at, 1),
+            'loaded_seconds': round(time.time() - self.loaded_at, 1) if self.loaded_at else None,
+            'busy': self._lock.locked(),
+            'requests': self.requests
+        }
+
+
+class InferenceManager(BaseManager):
+    pass
+
+ENGINE_METHODS = ('generate', 'stream', 'warmup', 'health', 'unload')
+
+# stream() returns a generator, which the manager serves through an iterator proxy
+InferenceManager.register('Iterator', proxytype=IteratorProxy, create_method=False)
+InferenceManager.register('engine', exposed=ENGINE_METHODS, method_to_typeid={'stream': 'Iterator'})
+
+
+def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, authkey: Optional[bytes] = None,
+          model_path: Path = MISTRAL_MODELS_PATH, idle_unload: Optional[float] = None,
+          warmup: bool = False, max_batch_size: int = 8, kv_cache_budget_mb: int = 4096):
+    """Run the worker in this process until it is killed."""
+    engine = MistralEngine(model_path, idle_unload=idle_unload, max_batch_size=max_batch_size,
+                           kv_cache_budget_mb=kv_cache_budget_mb)
+    InferenceManager.register('engine', callable=lambda: engine, exposed=ENGINE_METHODS,
+                              method_to_typeid={'stream': 'Iterator'})
+    manager = InferenceManager(address=(host, port), authkey=authkey or load_authkey())
+    # Binds now, so a second worker on the same port fails here instead of loading the model
+    server = manager.get_server()
+    logging.getLogger(__name__).info(f"Inference worker listening on {host}:{port}")
+    if warmup:
+        threading.Thread(target=engine.warmup, name='warmup', daemon=True).start()
+    server.serve_forever()
+
+
+class InferenceClient:
+    """Connects to the shared inference worker, starting it if none is running.
+
+    The worker is a separate, long-lived process listening on a localhost
+    port, so every app process and session on the machine shares one loaded
+    model. It is started detached on first use and loads the model lazily,
+    on the first request or an explicit warmup().
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 authkey: Optional[bytes] = None, autostart: bool = True,
+                 start_timeout: float = 30.0, log_path: Path = Path("data/logs/inference_worker.log"),
+                 worker_args: Optional[List[str]] = None):
+        self.logger = logging.getLogger(__name__)
+        self.address: Tuple[str, int] = (host, port)
+        self.authkey = authkey or load_authkey()
+        self.autostart = autostart
+        self.start_timeout = start_timeout
+        self.log_path = Path(log_path)
+        # Extra command line flags for an autostarted worker, e.g. ['--kv-cache-budget-mb', '2048']
+        self.worker_args = worker_args or []
+        self._engine = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        manager = InferenceManager(address=self.address, authkey=self.authkey)
+        manager.connect()
+        return manager.engine()
+
+    def start_worker(self):
+        """Launch the worker process detached from this one so it outlives it."""
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        self.logger.info(f"Starting inference worker on {self.address[0]}:{self.address[1]}")
+        with open(self.log_path, 'ab') as log:
+            subprocess.Popen(
+                [sys.executable, '-m', 'agent.inference_worker',
+                 '--host', self.address[0], '--port', str(self.address[1]), *self.worker_args],
+                cwd=PROJECT_ROOT,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                stdin=subprocess.DEVNULL,
+                env={**os.environ, 'INFERENCE_WORKER_AUTHKEY': self.authkey.decode('utf-8')},
+                start_new_session=True
+            )
+
+    def engine(self):
+        """Proxy to the worker's engine, connecting (and starting it) as needed."""
+        with self._lock:
+            if self._engine is not None:
+                return self._engine
+            try:
+                self._engine = self._connect()
+                return self._engine
+            except (ConnectionRefusedError, FileNotFoundError):
+                if not self.autostart:
+                    raise
+
+            # If several processes race to start a worker, the losers fail to bind and exit
+            self.start_worker()
+            deadline = time.monotonic() + self.start_timeout
+            while True:
+                try:
+                    self._engine = self._connect()
+                    return self._engine
+                except ConnectionRefusedError:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f"Inference worker did not start within {self.start_timeout}s; "
+                                           f"see {self.log_path}")
+                    time.sleep(0.2)
+
+    def _call(self, method: str, *args, **kwargs):
+        try:
+            return getattr(self.engine(), method)(*args, **kwargs)
+        except (EOFError, ConnectionError):
+            # The worker went away (crashed or was restarted); reconnect once
+            self._engine = None
+            return getattr(self.engine(), method)(*args, **kwargs)
+
+    def generate(self, prompts: List[str], max_tokens: int = 1000, temperature: float = 0.7,
+                 top_p: float = 0.9, time_budget: Optional[float] = None) -> List[Optional[Dict]]:
+        """See MistralEngine.generate."""
+        return self._call('generate', prompts, max_tokens, temperature, top_p, time_budget)
+
+    def stream(self, prompt: str, max_tokens: int = 1000, temperature: float = 0.7,
+               top_p: float = 0.9) -> Iterator[str]:
+        """Yield the completion of `prompt` piece by piece; see MistralEngine.stream."""
+        pieces = self._call('stream', prompt, max_tokens, temperature, top_p)
+        try:
+            yield from pieces
+        finally:
+            # Dropping the proxy closes the generator in the worker, freeing its KV cache
+            del pieces
+
+    def warmup(self) -> Dict:
+        """Make sure the worker is running with the model loaded."""
+        return self._call('warmup')
+
+    def health(self) -> Dict:
+        """Worker status without starting it or loading the model."""
+        try:
+            if self._engine is None:
+                self._engine = self._connect()
+            return self._engine.health()
+        except (ConnectionRefusedError, EOFError, ConnectionError) as e:
+            self._engine = None
+            return {'status': 'unavailable', 'error': str(e)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the local Mistral model to other processes.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--model-path", type=Path, default=MISTRAL_MODELS_PATH)
+    parser.add_argument("--idle-unload", type=float, default=None,
+                        help="Unload the model after this many idle seconds")
+    parser.add_argument("--warmup", action="store_true", help="Load the model at startup")
+    parser.add_argument("--max-batch-size", type=int, default=8, help="Most prompts generated together")
+    parser.add_argument("--kv-cache-budget-mb", type=int, default=4096,
+                        help="KV cache memory a generation batch may use")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    try:
+        serve(args.host, args.port, load_authkey(), args.model_path, args.idle_unload, args.warmup,
+              args.max_batch_size, args.kv_cache_budget_mb)
+    except OSError as e:
+        if e.errno != errno.EADDRINUSE:
+            raise
+        # Another process started a worker first; it will serve the clients
+        logging.getLogger(__name__).info(f"A worker is already listening on {args.host}:{args.port}")
+
+if __name__ == "__main__":
+    main()
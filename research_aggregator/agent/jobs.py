@@ -0,0 +1,208 @@
+import logging
+import os
+import queue
+import threading
+import time
+import traceback
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from src.instrumentation import metrics
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobQueueFull(Exception):
+    """Raised by JobManager.submit when the queue has no room for another job."""
+    pass
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's function once the job has been cancelled."""
+    pass
+
+
+@dataclass
+class Job:
+    """One background run and everything a page needs to show its progress.
+
+    The job's function reports progress through `set_stage` and `append`;
+    pages read `status`, `stage`, `text` and finally `result` or `error`.
+    """
+    name: str
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    status: str = QUEUED
+    stage: str = ''
+    output: List[str] = field(default_factory=list)
+    result: Any = None
+    error: Optional[str] = None
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    cancel_requested: bool = False
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    @property
+    def text(self) -> str:
+        """Everything appended so far, e.g. the report as it is being written."""
+        return "".join(self.output)
+
+    def check(self):
+        if self.cancel_requested:
+            raise JobCancelled(self.id)
+
+    def set_stage(self, stage: str):
+        self.check()
+        self.stage = stage
+
+    def append(self, piece: str):
+        """Add a piece of streamed output; stops the job here if it was cancelled."""
+        self.check()
+        self.output.append(piece)
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'stage': self.stage,
+            'text': self.text,
+            'error': self.error,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class JobManager:
+    """Runs research jobs on a fixed pool of worker threads.
+
+    Jobs wait in a queue of at most `max_queued`; beyond that `submit`
+    raises JobQueueFull rather than letting work pile up. A job's function
+    is called as `func(job, *args, **kwargs)` and its return value becomes
+    `job.result`. Finished jobs are kept for `retention_seconds` (and at
+    most `max_finished` of them) so a page that polls late still finds
+    its result.
+    """
+
+    def __init__(self, workers: int = 4, max_queued: int = 32,
+                 retention_seconds: float = 3600, max_finished: int = 500):
+        self.logger = logging.getLogger(__name__)
+        self.workers = workers
+        self.retention_seconds = retention_seconds
+        self.max_finished = max_finished
+        self.jobs: Dict[str, Job] = {}
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._work, name=f'research-job-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, name: str, func: Callable, *args, **kwargs) -> Job:
+        job = Job(name)
+        with self._lock:
+            self._prune()
+            self.jobs[job.id] = job
+        try:
+            self._queue.put_nowait((job, func, args, kwargs))
+        except queue.Full:
+            with self._lock:
+                del self.jobs[job.id]
+            metrics.incr('jobs.rejected')
+            raise JobQueueFull(f"{self._queue.maxsize} jobs are already waiting; try again shortly")
+        metrics.incr('jobs.submitted')
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Ask a job to stop. A queued job never starts; a running one stops at its next progress report."""
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return False
+        job.cancel_requested = True
+        return True
+
+    def position(self, job_id: str) -> Optional[int]:
+        """How many jobs are ahead of a queued job, or None if it isn't queued."""
+        with self._queue.mutex:
+            waiting = [entry[0].id for entry in self._queue.queue]
+        return waiting.index(job_id) if job_id in waiting else None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            statuses = [job.status for job in self.jobs.values()]
+        return {
+            'workers': self.workers,
+            'queued': statuses.count(QUEUED),
+            'running': statuses.count(RUNNING),
+            'finished': sum(status in FINISHED for status in statuses)
+        }
+
+    def _prune(self):
+        """Forget old finished jobs. Call with the lock held."""
+        now = time.time()
+        finished = sorted((job for job in self.jobs.values() if job.finished), key=lambda job: job.finished_at)
+        excess = len(finished) - self.max_finished
+        for i, job in enumerate(finished):
+            if i < excess or now - job.finished_at > self.retention_seconds:
+                del self.jobs[job.id]
+
+    def _work(self):
+        while True:
+            job, func, args, kwargs = self._queue.get()
+            try:
+                self._run(job, func, args, kwargs)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job: Job, func: Callable, args: tuple, kwargs: dict):
+        if job.cancel_requested:
+            job.finished_at = time.time()
+            job.status = CANCELLED
+            return
+        job.status, job.started_at = RUNNING, time.time()
+        metrics.observe('jobs.queue_wait.ms', (job.started_at - job.submitted_at) * 1000)
+        try:
+            with metrics.span('job', job=job.name):
+                job.result = func(job, *args, **kwargs)
+            status = DONE
+        except JobCancelled:
+            status = CANCELLED
+        except Exception as e:
+            self.logger.error(f"Job {job.id} ({job.name}) failed: {str(e)}\n{traceback.format_exc()}")
+            job.error = str(e)
+            status = FAILED
+        # Pages treat the status as the signal that everything else is set
+        job.finished_at = time.time()
+        job.status = status
+        metrics.incr(f'jobs.{job.status}')
+
+
+_shared_manager = None
+_shared_lock = threading.Lock()
+
+def get_job_manager() -> JobManager:
+    """The process-wide job manager, sized from RESEARCH_WORKERS and RESEARCH_QUEUE_SIZE."""
+    global _shared_manager
+    with _shared_lock:
+        if _shared_manager is None:
+            _shared_manager = JobManager(
+                workers=int(os.getenv("RESEARCH_WORKERS", "4")),
+                max_queued=int(os.getenv("RESEARCH_QUEUE_SIZE", "32"))
+            )
+        return _shared_manager
@@ -0,0 +1,181 @@
+import atexit
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from src.instrumentation import metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access);
+"""
+
+
+class LLMCache:
+    """On-disk cache of LLM responses keyed by model, prompt and sampling parameters.
+
+    The key is the SHA-256 of all three, so any change to the prompt or to
+    a parameter is a miss. Calls that sample (temperature above zero, or
+    not given, which means the provider's default) bypass the cache unless
+    the caller passes `allow_sampled=True` or the cache is created with
+    `cache_sampled=True`. Least recently used entries are evicted beyond
+    `max_entries` or `max_bytes`, and entries older than `ttl_seconds`
+    are treated as misses.
+    """
+
+    def __init__(self, path: str = "data/cache/llm_cache.db", max_entries: int = 10000,
+                 max_bytes: int = 256 * 1024 * 1024, ttl_seconds: Optional[float] = None,
+                 cache_sampled: bool = False):
+        self.logger = logging.getLogger(__name__)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.cache_sampled = cache_sampled
+        self.counts = {'hits': 0, 'misses': 0, 'bypassed': 0, 'stores': 0, 'evictions': 0}
+
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        atexit.register(self.close)
+
+    @staticmethod
+    def make_key(model: str, prompt: Any, params: Dict) -> str:
+        payload = json.dumps({'model': model, 'prompt': prompt, 'params': params},
+                             sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def is_sampled(params: Dict) -> bool:
+        """Whether these parameters can give a different answer for the same prompt."""
+        if params.get('top_k') == 1:
+            return False
+        return params.get('temperature') is None or params['temperature'] > 0
+
+    def _count(self, outcome: str):
+        with self._lock:
+            self.counts[outcome] += 1
+        metrics.incr(f"llm_cache.{outcome}")
+
+    def get(self, model: str, prompt: Any, params: Dict, allow_sampled: Optional[bool] = None) -> Optional[Any]:
+        """The cached response, or None on a miss or when the call bypasses the cache."""
+        if self.is_sampled(params) and not (self.cache_sampled if allow_sampled is None else allow_sampled):
+            self._count('bypassed')
+            return None
+        key = self.make_key(model, prompt, params)
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row and (self.ttl_seconds is None or now - row[1] <= self.ttl_seconds):
+                self.conn.execute(
+                    "UPDATE responses SET last_access = ?, hits = hits + 1 WHERE key = ?", (now, key)
+                )
+                self.conn.commit()
+            else:
+                row = None
+        if row is None:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return json.loads(row[0])
+
+    def put(self, model: str, prompt: Any, params: Dict, response: Any,
+            allow_sampled: Optional[bool] = None):
+        """Store a successful response. Callers must not store errors or rate-limit replies."""
+        if self.is_sampled(params) and not (self.cache_sampled if allow_sampled is None else allow_sampled):
+            return
+        key = self.make_key(model, prompt, params)
+        payload = json.dumps(response, ensure_ascii=False, default=str)
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, payload, len(payload.encode('utf-8')), now, now)
+            )
+            evicted = self._evict()
+            self.conn.commit()
+            self.counts['evictions'] += evicted
+        self._count('stores')
+
+    def _evict(self) -> int:
+        """Drop least recently used entries beyond the limits. Call with the lock held."""
+        entries, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        evicted = 0
+        while entries > self.max_entries or size > self.max_bytes:
+            # Evict in chunks so one oversized write doesn't mean one DELETE per row
+            excess = max(entries - self.max_entries, 1, entries // 20)
+            rows = self.conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access LIMIT ?", (excess,)
+            ).fetchall()
+            if not rows:
+                break
+            self.conn.executemany("DELETE FROM responses WHERE key = ?", [(row[0],) for row in rows])
+            entries -= len(rows)
+            size -= sum(row[1] for row in rows)
+            evicted += len(rows)
+        return evicted
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries, size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+            counts = dict(self.counts)
+        lookups = counts['hits'] + counts['misses']
+        return {
+            **counts,
+            'hit_rate': counts['hits'] / lookups if lookups else 0.0,
+            'entries': entries,
+            'bytes': size
+        }
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
+
+    def close(self):
+        with self._lock:
+            try:
+                self.conn.close()
+            except sqlite3.ProgrammingError:
+                pass
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+def get_llm_cache() -> LLMCache:
+    """The process-wide cache used by the summarizer, chat and analyzer.
+
+    Configured from LLM_CACHE_PATH and LLM_CACHE_SAMPLED (set to 1 to cache
+    sampled calls everywhere, e.g. for regression runs).
+    """
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = LLMCache(
+                path=os.getenv("LLM_CACHE_PATH", "data/cache/llm_cache.db"),
+                cache_sampled=os.getenv("LLM_CACHE_SAMPLED", "0") == "1"
+            )
+        return _shared_cache
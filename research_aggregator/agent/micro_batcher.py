@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+
+from src.instrumentation import metrics
+
+
+class Overloaded(Exception):
+    """Raised by MicroBatcher.submit when the queue is full; the caller should shed the request."""
+    pass
+
+
+class MicroBatcher:
+    """Group concurrent requests into batched calls of a blocking model.
+
+    `process_batch` takes a list of inputs and returns the outputs in the
+    same order. It runs on `executor` (by default one dedicated thread, so
+    the model sees one batch at a time and the event loop is never
+    blocked). A batch is sent as soon as `max_batch_size` requests are
+    waiting, or `max_wait_ms` after its first request arrived; while a
+    batch runs, new requests queue up and form the next one. At most
+    `max_queue` requests wait; beyond that `submit` raises Overloaded.
+
+    If a batch raises, its inputs are re-run one at a time, so only the
+    requests whose own input fails get the exception.
+    """
+
+    def __init__(self, process_batch: Callable[[List[Any]], List[Any]], max_batch_size: int = 8,
+                 max_wait_ms: float = 10, max_queue: int = 64, executor: Optional[Executor] = None,
+                 name: str = 'batch'):
+        self.logger = logging.getLogger(__name__)
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max_queue
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self.name = name
+        self._queue = None
+        self._task = None
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self):
+        """Start collecting batches on the running event loop; submit() calls this as needed."""
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.get_running_loop().create_task(self._collect())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Don't leave callers of requests that never ran waiting forever
+        while self._queue is not None and not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(Overloaded("Batcher closed"))
+
+    async def submit(self, item: Any) -> Any:
+        """Queue one input and wait for its output."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((item, future, time.monotonic()))
+        except asyncio.QueueFull:
+            metrics.incr(f'{self.name}.shed')
+            raise Overloaded(f"{self.max_queue} requests are already waiting")
+        return await future
+
+    async def _next_batch(self) -> list:
+        batch = [await self._queue.get()]
+        closes_at = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = closes_at - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        # Callers that gave up (e.g. the client disconnected) are left out
+        return [entry for entry in batch if not entry[1].done()]
+
+    async def _run(self, batch: list) -> list:
+        with metrics.span(self.name, batch=len(batch)):
+            outputs = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.process_batch, [item for item, _, _ in batch]
+            )
+        if len(outputs) != len(batch):
+            raise ValueError(f"process_batch returned {len(outputs)} outputs for {len(batch)} inputs")
+        return outputs
+
+    async def _collect(self):
+        while True:
+            batch = await self._next_batch()
+            if not batch:
+                continue
+            started = time.monotonic()
+            for _, _, queued_at in batch:
+                metrics.observe(f'{self.name}.queue_wait.ms', (started - queued_at) * 1000)
+            metrics.observe(f'{self.name}.batch_size', len(batch))
+            try:
+                outputs = await self._run(batch)
+            except Exception as e:
+                self.logger.error(f"Error processing a batch of {len(batch)}: {str(e)}")
+                if len(batch) > 1:
+                    await self._run_singly(batch)
+                elif not batch[0][1].done():
+                    batch[0][1].set_exception(e)
+                continue
+            for (_, future, _), output in zip(batch, outputs):
+                if not future.done():
+                    future.set_result(output)
+
+    async def _run_singly(self, batch: list):
+        """Re-run a failed batch's inputs one at a time, so one bad input doesn't fail its neighbours."""
+        metrics.incr(f'{self.name}.split')
+        for entry in batch:
+            future = entry[1]
+            if future.done():
+                continue
+            try:
+                (output,) = await self._run([entry])
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            if not future.done():
+                future.set_result(output)
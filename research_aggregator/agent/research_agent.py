@@ -1,18 +1,77 @@
 from agent.web_scraper import search_and_scrape
-from agent.summarizer import summarize_texts
+from agent.summarizer import partial_report, stream_summary, summarize_texts
+from src.deadline import Deadline
 
-def run_research_agent(query, max_results=5):
+# Share of the deadline for searching and scraping; summarizing gets the rest
+SCRAPE_SHARE = 0.6
+
+def scrape_for_report(query, max_results=5, deadline: Deadline = None):
+    """
+    Search and scrape the articles for a report, with SCRAPE_SHARE of the
+    deadline. Returns (articles, early_report): early_report is the text to
+    report instead of summarizing the articles, if there is one - the error
+    when nothing could be scraped (articles is then empty), or excerpts of
+    the articles when no time is left to summarize them.
+    """
+    scrape_deadline = deadline.child(SCRAPE_SHARE) if deadline else None
+    scraped_content = search_and_scrape(query, max_results=max_results, deadline=scrape_deadline)
+
+    if len(scraped_content) == 1 and scraped_content[0].startswith(("Error", "No valid")):
+        return [], scraped_content[0]
+
+    if deadline and deadline.expired():
+        deadline.mark('summarize', 'skipped')
+        return scraped_content, partial_report(scraped_content)
+    return scraped_content, None
+
+def run_research_agent(query, max_results=5, deadline: Deadline = None):
     """
     Run the complete research pipeline:
     1. Search and scrape articles
     2. Summarize the content
+
+    With a deadline (e.g. Deadline(30) for a 30 second budget), scraping
+    gets a share of it and stops early when that runs out; if no time is
+    left to summarize, excerpts of the scraped articles are returned
+    instead. deadline.completeness() then reports which stages finished.
     """
-    # Step 1: Search and scrape
-    scraped_content = search_and_scrape(query, max_results=max_results)
-    
-    # Step 2: Summarize
-    if len(scraped_content) == 1 and scraped_content[0].startswith("Error") or scraped_content[0].startswith("No valid"):
-        return scraped_content[0]
-        
-    summary = summarize_texts(scraped_content)
-    return summary 
\ No newline at end of file
+    scraped_content, early_report = scrape_for_report(query, max_results, deadline)
+    if early_report is not None:
+        return early_report
+    return summarize_texts(scraped_content, deadline=deadline, query=query)
+
+def research_job(job, query, max_results=5, deadline: Deadline = None):
+    """
+    run_research_agent as a background job (see agent.jobs.JobManager).
+    The stage and the report as it is written are published on `job`;
+    returns {'articles': [...], 'report': str}.
+    """
+    job.set_stage('searching')
+    scraped_content, early_report = scrape_for_report(query, max_results, deadline)
+    if not scraped_content:
+        job.append(early_report)
+        return {'articles': [], 'report': early_report}
+
+    job.set_stage('writing report')
+    if early_report is not None:
+        job.append(early_report)
+    else:
+        for piece in stream_summary(scraped_content, deadline=deadline, query=query):
+            job.append(piece)
+    return {'articles': scraped_content, 'report': job.text}
+
+def analysis_job(job, analyzer, query, max_results=5):
+    """
+    Scrape and run the analyzer's two-pass Mistral report as a background
+    job; returns {'articles': [...], 'report': str}, with an empty article
+    list when scraping failed.
+    """
+    job.set_stage('searching')
+    articles, error = scrape_for_report(query, max_results)
+    if error is not None:
+        return {'articles': [], 'report': error}
+
+    job.set_stage('extracting and writing report')
+    for piece in analyzer.filter_and_analyze_stream(query, articles):
+        job.append(piece)
+    return {'articles': articles, 'report': job.text}
@@ -1,25 +1,55 @@
-import google.generativeai as genai
 import os
 from dotenv import load_dotenv
-from tenacity import retry, wait_exponential, stop_after_attempt, retry_if_exception_type
+from src.deadline import Deadline
+from agent.context_packer import ContextPacker
+from agent.llm_cache import get_llm_cache
+from agent.gemini_client import GEMINI_MODEL, RateLimitException, get_gemini_client
 
 load_dotenv()
 
-class RateLimitException(Exception):
-    """Custom exception for rate limit errors."""
-    pass
+# Gemini's tokenizer is only reachable through the API, so the packer estimates
+# tokens from characters; keep the limit well under the model's context window
+MAX_CONTEXT_TOKENS = int(os.getenv("SUMMARIZER_MAX_CONTEXT_TOKENS", "30000"))
+context_packer = ContextPacker(max_tokens=MAX_CONTEXT_TOKENS)
+EXCERPT_CHARS = 500
 
-@retry(
-    wait=wait_exponential(multiplier=1, min=4, max=10),
-    stop=stop_after_attempt(5),
-    retry=retry_if_exception_type(RateLimitException)
-)
-def summarize_texts(texts: list[str]) -> str:
+def partial_report(texts: list[str]) -> str:
+    """Numbered excerpts of the scraped texts, for when there is no time to summarize."""
+    excerpts = "\n\n".join(f"[{i + 1}] {text[:EXCERPT_CHARS].strip()}..." for i, text in enumerate(texts))
+    return f"Partial results (time budget reached before the report was generated).\n\n{excerpts}"
+
+def build_prompt(texts: list[str], query: str = None) -> str:
+    """The report prompt for `texts`, packed to MAX_CONTEXT_TOKENS."""
+    combined_text = context_packer.pack(query or "", texts).numbered()
+    
+    prompt = f"""
+    You are an AI research assistant. Your task is to provide a comprehensive and well-structured research report based on the provided texts. 
+    The report should include an executive summary, a detailed introduction, a breakdown of key findings, ethical considerations (if applicable), limitations and future research directions, and a conclusion. 
+    Ensure that the report is coherent, informative, and free of redundancies. Provide citations in the text using numerical references (e.g., [1], [2]) corresponding to the order of the source texts provided. 
+    When citing, refer to the source text number. If a piece of information comes from more than one source, cite all applicable sources. 
+    Do not make up any information or add any external knowledge beyond what is provided in the texts. If a section cannot be generated based on the provided text, state 'N/A' or 'Not applicable'.
+
+    Here are the texts:
+
+    {combined_text}
+
+    Comprehensive Research Report:
+    """
+    return prompt
+
+def summarize_texts(texts: list[str], deadline: Deadline = None, query: str = None) -> str:
     """
     Summarizes a list of texts using the gemma-3-27b-it model.
     
     Args:
         texts (list[str]): A list of text documents to summarize.
+        deadline (Deadline, optional): Time budget. Rate-limited requests are
+            retried only while the suggested wait fits in it, and a request
+            still running when it passes is cancelled; excerpts of the texts
+            (partial_report) are returned instead.
+        query (str, optional): The research query. Passages most relevant to it
+            are kept when the texts exceed MAX_CONTEXT_TOKENS; without it the
+            leading passages are kept.
         
     Returns:
         str: A comprehensive summary of all texts.
@@ -27,33 +57,83 @@ def summarize_texts(texts: list[str]) -> str:
     api_key = os.getenv("GOOGLE_API_KEY")
     if not api_key:
         return "Error: GOOGLE_API_KEY not found in environment variables"
-        
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('models/gemini-1.5-flash')
-    
-    combined_text = "\n\n".join(texts)
     
-    prompt = f"""
-    You are an AI research assistant. Your task is to provide a comprehensive and well-structured research report based on the provided texts. 
-    The report should include an executive summary, a detailed introduction, a breakdown of key findings, ethical considerations (if applicable), limitations and future research directions, and a conclusion. 
-    Ensure that the report is coherent, informative, and free of redundancies. Provide citations in the text using numerical references (e.g., [1], [2]) corresponding to the order of the source texts provided. 
-    When citing, refer to the source text number. If a piece of information comes from more than one source, cite all applicable sources. 
-    Do not make up any information or add any external knowledge beyond what is provided in the texts. If a section cannot be generated based on the provided text, state 'N/A' or 'Not applicable'.
+    prompt = build_prompt(texts, query)
 
-    Here are the texts:
+    # Gemini samples at its default temperature, so reports are only cached when the cache is set to cache_sampled
+    cache_params = {'temperature': None}
+    cache = get_llm_cache()
+    cached = cache.get(GEMINI_MODEL, prompt, cache_params)
+    if cached is not None:
+        if deadline:
+            deadline.mark('summarize')
+        return cached
 
-    {combined_text}
+    try:
+        # The shared client limits request and token rates and retries on 429s
+        response = get_gemini_client().generate(prompt, deadline=deadline, stage='summarize')
+        cache.put(GEMINI_MODEL, prompt, cache_params, response.text)
+        if deadline:
+            deadline.mark('summarize')
+        return response.text
+    except RateLimitException as e:
+        if deadline:
+            deadline.mark('summarize', 'timed_out')
+        return f"Error generating summary: rate limit exceeded ({str(e)})"
+    except Exception as e:
+        # DeadlineExceeded from the client, or the SDK's own timeout
+        if deadline and deadline.expired():
+            deadline.mark('summarize', 'timed_out')
+            return partial_report(texts)
+        if deadline:
+            deadline.mark('summarize', 'failed')
+        return f"Error generating summary: {str(e)}"
 
-    Comprehensive Research Report:
+
+def stream_summary(texts: list[str], deadline: Deadline = None, query: str = None):
     """
-    
+    Like summarize_texts, but yields the report in pieces as Gemini writes it.
+
+    A cached report, or an error message, is yielded in one piece. The
+    report is cached only once it has streamed to the end. When the
+    deadline passes first, the request is cancelled and partial_report is
+    yielded if nothing had arrived yet, or a note that the report is cut
+    short if it had.
+    """
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        yield "Error: GOOGLE_API_KEY not found in environment variables"
+        return
+
+    prompt = build_prompt(texts, query)
+    cache_params = {'temperature': None}
+    cache = get_llm_cache()
+    cached = cache.get(GEMINI_MODEL, prompt, cache_params)
+    if cached is not None:
+        if deadline:
+            deadline.mark('summarize')
+        yield cached
+        return
+
+    chunks = []
     try:
-        response = model.generate_content(prompt)
-        if "quota_metric" in response.text and "rate-limits" in response.text:
-            raise RateLimitException(response.text)
-        return response.text
+        for chunk in get_gemini_client().stream(prompt, deadline=deadline, stage='summarize'):
+            chunks.append(chunk)
+            yield chunk
     except RateLimitException as e:
-        print(f"Rate limit exceeded, retrying... {e}")
-        raise # Re-raise to trigger tenacity retry
+        if deadline:
+            deadline.mark('summarize', 'timed_out')
+        yield f"Error generating summary: rate limit exceeded ({str(e)})"
+        return
     except Exception as e:
-        return f"Error generating summary: {str(e)}" 
\ No newline at end of file
+        if deadline and deadline.expired():
+            deadline.mark('summarize', 'timed_out')
+            yield "\n\n(Time budget reached; the report is incomplete.)" if chunks else partial_report(texts)
+            return
+        if deadline:
+            deadline.mark('summarize', 'failed')
+        yield f"Error generating summary: {str(e)}"
+        return
+    cache.put(GEMINI_MODEL, prompt, cache_params, "".join(chunks))
+    if deadline:
+        deadline.mark('summarize')
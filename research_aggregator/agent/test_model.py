@@ -3,6 +3,9 @@ from analyzer import ResearchAnalyzer
 def test_model():
     print("Initializing ResearchAnalyzer...")
     analyzer = ResearchAnalyzer()
+    print(f"Worker status: {analyzer.health()['status']}")
+    print("Warming up the model...")
+    print(f"Worker status: {analyzer.warmup()['status']}")
     
     # Test query and sample article
     test_query = "What are the key features of artificial intelligence?"
@@ -3,12 +3,18 @@ from newspaper import Article
 import time
 import os
 from dotenv import load_dotenv
+from src.instrumentation import metrics
+from src.deadline import Deadline
 
 load_dotenv()
 
-def search_and_scrape(query, max_results=5):
+REQUEST_DELAY = 2
+
+def search_and_scrape(query, max_results=5, deadline: Deadline = None):
     """
-    Search for articles using serper.dev API and scrape their content
+    Search for articles using serper.dev API and scrape their content.
+    With a deadline, scraping stops when it expires and the articles
+    scraped so far are returned; the outcome is recorded on the deadline.
     """
     urls = []
     contents = []
@@ -30,11 +36,13 @@ def search_and_scrape(query, max_results=5):
             'num': max_results
         }
         
-        response = requests.post(
-            'https://google.serper.dev/search',
-            headers=headers,
-            json=payload
-        )
+        with metrics.span('search'):
+            response = requests.post(
+                os.getenv("SERPER_API_URL", "https://google.serper.dev/search"),
+                headers=headers,
+                json=payload,
+                timeout=deadline.timeout() if deadline else None
+            )
         
         if response.status_code != 200:
             return [f"Error searching: {response.text}"]
@@ -48,21 +56,38 @@ def search_and_scrape(query, max_results=5):
                     urls.append(result['link'])
     
     except Exception as e:
+        if deadline and deadline.expired():
+            deadline.mark('search', 'timed_out')
         return [f"Error searching: {str(e)}"]
 
+    if deadline:
+        deadline.mark('search')
+
     # Process URLs with delays
     for url in urls:
+        if deadline and deadline.remaining() <= REQUEST_DELAY:
+            deadline.mark('scrape', 'partial' if contents else 'timed_out')
+            break
         try:
             # Add delay between requests
-            time.sleep(2)
+            time.sleep(REQUEST_DELAY)
             
-            article = Article(url)
-            article.download()
-            article.parse()
+            if deadline:
+                article = Article(url, request_timeout=deadline.remaining())
+            else:
+                article = Article(url)
+            with metrics.span('fetch', url=url):
+                article.download()
+            metrics.incr('scraper.bytes_fetched', len(article.html.encode('utf-8')))
+            with metrics.span('parse', url=url):
+                article.parse()
             
             if article.text.strip():  # Only add non-empty articles
                 contents.append(article.text)
         except Exception as e:
             continue
+    else:
+        if deadline:
+            deadline.mark('scrape')
             
     return contents if contents else ["No valid articles found. Try a different query."] 
\ No newline at end of file
@@ -1,43 +1,102 @@
-import streamlit as st
-from agent.web_scraper import search_and_scrape
-from agent.chat import ResearchChat
-from agent.analyzer import ResearchAnalyzer
+import os
+import time
+from src.startup import StartupProfile
+
+profile = StartupProfile("streamlit")
+with profile.phase("import app modules"):
+    import streamlit as st
+    from agent.chat import ResearchChat
+    from agent.analyzer import ResearchAnalyzer
+    from agent.jobs import JobManager, JobQueueFull, get_job_manager
+    from agent.research_agent import analysis_job
+
+# How often a page with a running job refreshes its progress
+POLL_SECONDS = 1.0
 
 st.set_page_config(page_title="AI Research Agent", layout="wide")
 
 st.title("AI Research Agent 🤖")
 
-# Initialize session state for chat and analyzer
+# Shared by every session in this server process
+@st.cache_resource
+def get_startup_profile() -> StartupProfile:
+    # The first run's profile; later reruns find the modules already imported
+    return profile
+
+@st.cache_resource
+def get_analyzer() -> ResearchAnalyzer:
+    # The model itself loads in the inference worker on first use or on "Warm up model"
+    with get_startup_profile().phase("construct analyzer"):
+        return ResearchAnalyzer()
+
+@st.cache_resource
+def get_jobs() -> JobManager:
+    return get_job_manager()
+
+analyzer = get_analyzer()
+jobs = get_jobs()
+
+# Per-session state is only the conversation; its Gemini client and cache are shared
 if "chat" not in st.session_state:
     st.session_state.chat = ResearchChat()
-if "analyzer" not in st.session_state:
-    st.session_state.analyzer = ResearchAnalyzer()
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "job_id" not in st.session_state:
+    st.session_state.job_id = None
+
+# Collect a finished job's result before the sidebar, so its button is enabled again on this run
+job = jobs.get(st.session_state.job_id) if st.session_state.job_id else None
+if st.session_state.job_id and job is None:
+    st.session_state.job_id = None
+    st.error("The research job was lost; please start it again.")
+elif job is not None and job.finished:
+    st.session_state.job_id = None
+    if job.status == 'failed':
+        st.error(f"Research failed: {job.error}")
+    elif job.status == 'done':
+        articles, analysis_report = job.result['articles'], job.result['report']
+        # Store raw articles in session state for debugging
+        st.session_state.raw_articles = articles
+        if articles:
+            # Follow-up questions are answered from the scraped articles, numbered as in the report
+            st.session_state.chat.set_corpus(articles)
+            st.session_state.research_summary = analysis_report # Renaming for consistency, though it's now a report
+            st.session_state.messages.append({"role": "assistant", "content": f"I've completed the research on '{st.session_state.job_query}'. Here's the detailed analysis report:\n\n{analysis_report}"})
+        else:
+            st.error(analysis_report)
 
 # Sidebar for research query
 with st.sidebar:
     st.header("Research Query")
     query = st.text_input("Enter your research topic:")
     max_results = st.slider("Maximum number of sources", 1, 10, 5)
-    
-    if st.button("Start Research"):
-        with st.spinner("Gathering information and generating report..."):
-            # Get articles
-            articles = search_and_scrape(query, max_results)
-            
-            # Store raw articles in session state for debugging
-            st.session_state.raw_articles = articles
-            
-            if articles and not articles[0].startswith("Error"):
-                # Generate comprehensive analysis report
-                analysis_report = st.session_state.analyzer.filter_and_analyze(query, articles)
-                
-                # Store in session state
-                st.session_state.research_summary = analysis_report # Renaming for consistency, though it's now a report
-                st.session_state.messages.append({"role": "assistant", "content": f"I've completed the research on '{query}'. Here's the detailed analysis report:\n\n{analysis_report}"})
+
+    with st.expander("Model worker"):
+        health = analyzer.health()
+        st.write(f"Status: {health['status']}")
+        if st.button("Warm up model"):
+            with st.spinner("Loading the model..."):
+                health = analyzer.warmup()
+            st.write(f"Status: {health['status']}")
+        queue_stats = jobs.stats()
+        st.write(f"Research jobs: {queue_stats['running']} running, {queue_stats['queued']} queued")
+        if os.getenv("STARTUP_PROFILE", "0") == "1":
+            st.text(get_startup_profile().format())
+
+    if st.button("Start Research", disabled=st.session_state.job_id is not None):
+        if not query.strip():
+            st.warning("Please enter a research topic.")
+        else:
+            # The run happens on a worker thread; this page polls it below
+            try:
+                job = jobs.submit(f"research: {query}", analysis_job, analyzer, query, max_results)
+            except JobQueueFull as e:
+                st.warning(f"The server is busy: {str(e)}")
             else:
-                st.error(articles[0] if articles else "No results found or an error occurred during scraping.")
+                st.session_state.job_id = job.id
+                st.session_state.job_query = query
+                # Redraw with the button disabled and the job's progress showing
+                st.rerun()
 
 # Main chat interface
 st.header("Chat with Research Assistant")
@@ -54,17 +113,33 @@ for message in st.session_state.messages:
     with st.chat_message(message["role"]):
         st.write(message["content"])
 
+# Progress of a running job, with the report so far
+if job is not None and not job.finished:
+    with st.chat_message("assistant"):
+        if job.status == 'queued':
+            st.info(f"Waiting for a free worker ({jobs.position(job.id) or 0} jobs ahead)...")
+        else:
+            st.info(f"Researching '{st.session_state.job_query}': {job.stage}...")
+        if job.text:
+            st.write(job.text)
+        if st.button("Cancel research"):
+            jobs.cancel(job.id)
+
 # Chat input
 if prompt := st.chat_input("Ask a follow-up question about the research"):
     # Add user message to chat history
     st.session_state.messages.append({"role": "user", "content": prompt})
-    
+
     # Display user message
     with st.chat_message("user"):
         st.write(prompt)
-    
+
     # Get assistant response
     with st.chat_message("assistant"):
-        response = st.session_state.chat.send_message(prompt)
-        st.write(response)
-        st.session_state.messages.append({"role": "assistant", "content": response}) 
\ No newline at end of file
+        response = st.write_stream(st.session_state.chat.stream_message(prompt))
+        st.session_state.messages.append({"role": "assistant", "content": response})
+
+# Keep refreshing while the job runs; reruns are cheap since nothing heavy happens here
+if job is not None and not job.finished:
+    time.sleep(POLL_SECONDS)
+    st.rerun()
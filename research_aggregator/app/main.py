@@ -1,11 +1,16 @@
 import streamlit as st
 import sys
 import os
+import time
 
 # Add the parent directory to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from agent.research_agent import run_research_agent
+from agent.jobs import JobManager, JobQueueFull, get_job_manager
+from agent.research_agent import research_job
+
+# How often a page with a running job refreshes its progress
+POLL_SECONDS = 1.0
 
 # Configure the page
 st.set_page_config(
@@ -47,14 +52,42 @@ query = st.text_input(
 with st.expander("Advanced Options"):
     max_results = st.slider("Maximum number of articles to analyze", 3, 10, 5)
 
+# One job manager for every session in this server process
+@st.cache_resource
+def get_jobs() -> JobManager:
+    return get_job_manager()
+
+jobs = get_jobs()
+if "job_id" not in st.session_state:
+    st.session_state.job_id = None
+
+job = jobs.get(st.session_state.job_id) if st.session_state.job_id else None
+
 # Generate button
-if st.button("Generate Research Report", type="primary") and query:
-    with st.spinner("🔍 Researching and analyzing..."):
-        try:
-            result = run_research_agent(query, max_results=max_results)
-            st.markdown("### 📊 Research Report")
-            st.markdown(result)
-        except Exception as e:
-            st.error(f"An error occurred: {str(e)}")
-else:
-    st.info("👆 Enter a research topic and click 'Generate Research Report' to begin") 
\ No newline at end of file
+if st.button("Generate Research Report", type="primary", disabled=job is not None and not job.finished) and query:
+    # The research runs on a worker thread; this page polls it below
+    try:
+        job = jobs.submit(f"research: {query}", research_job, query, max_results=max_results)
+        st.session_state.job_id = job.id
+    except JobQueueFull as e:
+        st.warning(f"The server is busy: {str(e)}")
+
+if job is None:
+    st.session_state.job_id = None
+    st.info("👆 Enter a research topic and click 'Generate Research Report' to begin")
+elif job.status == 'queued':
+    st.info(f"⏳ Waiting for a free worker ({jobs.position(job.id) or 0} jobs ahead)...")
+elif job.status == 'running' and not job.text:
+    st.info(f"🔍 Researching and analyzing ({job.stage})...")
+elif job.status == 'failed':
+    st.session_state.job_id = None
+    st.error(f"An error occurred: {job.error}")
+elif job.status != 'cancelled':
+    st.markdown("### 📊 Research Report")
+    st.markdown(job.text)
+
+if job is not None and not job.finished:
+    if st.button("Cancel"):
+        jobs.cancel(job.id)
+    time.sleep(POLL_SECONDS)
+    st.rerun()
@@ -0,0 +1,289 @@
+"""Offline benchmarks for WebScraper, NLPProcessor and ResearchAggregator.
+
+Every benchmark talks to a local StubServer instead of the real search
+engine and article hosts, and uses stub models unless --real-models is
+given, so the suite runs without network access. Each benchmark runs in its
+own process so peak RSS is attributable to it.
+
+    python benchmarks/run_benchmarks.py --output bench.json
+    python benchmarks/run_benchmarks.py --compare bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Callable, Dict, List
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.append(str(BENCH_DIR.parent / "src"))
+sys.path.append(str(BENCH_DIR))
+
+from stub_server import StubServer
+
+QUERIES = [line.strip() for line in (BENCH_DIR / "fixtures" / "queries.txt").read_text().splitlines() if line.strip()]
+
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def summarize(latencies_ms: List[float], items: int, elapsed: float) -> Dict:
+    return {
+        'iterations': len(latencies_ms),
+        'items': items,
+        'throughput_per_s': items / elapsed if elapsed > 0 else 0.0,
+        'latency_ms': {
+            'mean': sum(latencies_ms) / len(latencies_ms) if latencies_ms else 0.0,
+            'p50': percentile(latencies_ms, 50),
+            'p95': percentile(latencies_ms, 95),
+            'p99': percentile(latencies_ms, 99)
+        }
+    }
+
+
+def make_processor(real_models: bool):
+    if real_models:
+        from nlp_processor import NLPProcessor
+        return NLPProcessor()
+    from stub_models import StubNLPProcessor
+    return StubNLPProcessor()
+
+
+def load_articles(search_url: str) -> List[Dict]:
+    """Scrape every fixture page once so NLP benchmarks get realistic input."""
+    from scraper import WebScraper
+    scraper = WebScraper(search_url=search_url)
+    return asyncio.run(scraper.scrape_multiple_sources("", num_sources=100))
+
+
+# Benchmarks. Each runs inside a fresh worker process with its cwd set to a
+# scratch directory, and returns a summary dict.
+
+def bench_scraper_search(search_url: str, iterations: int, real_models: bool) -> Dict:
+    from scraper import WebScraper
+    scraper = WebScraper(search_url=search_url)
+    latencies = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        t = time.perf_counter()
+        scraper.search_duckduckgo(QUERIES[i % len(QUERIES)])
+        latencies.append((time.perf_counter() - t) * 1000)
+    return summarize(latencies, iterations, time.perf_counter() - start)
+
+
+def bench_scraper_fetch_parse(search_url: str, iterations: int, real_models: bool) -> Dict:
+    from scraper import WebScraper
+    scraper = WebScraper(search_url=search_url)
+    urls = scraper.search_duckduckgo("", num_results=100)
+    latencies, items = [], 0
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for url in urls:
+            # Measure real fetch + parse, not the disk cache
+            cache_path = scraper.get_cache_path(url)
+            if os.path.exists(cache_path):
+                os.remove(cache_path)
+            t = time.perf_counter()
+            asyncio.run(scraper.scrape_article_async(url))
+            latencies.append((time.perf_counter() - t) * 1000)
+            items += 1
+    return summarize(latencies, items, time.perf_counter() - start)
+
+
+def bench_scraper_concurrent(search_url: str, iterations: int, real_models: bool) -> Dict:
+    from scraper import WebScraper
+    scraper = WebScraper(search_url=search_url)
+    latencies, items = [], 0
+    start = time.perf_counter()
+    for i in range(iterations):
+        shutil.rmtree(scraper.cache_dir, ignore_errors=True)
+        os.makedirs(scraper.cache_dir, exist_ok=True)
+        t = time.perf_counter()
+        articles = asyncio.run(scraper.scrape_multiple_sources(QUERIES[i % len(QUERIES)], num_sources=5))
+        latencies.append((time.perf_counter() - t) * 1000)
+        items += len(articles)
+    return summarize(latencies, items, time.perf_counter() - start)
+
+
+def bench_nlp_process_article(search_url: str, iterations: int, real_models: bool) -> Dict:
+    articles = load_articles(search_url)
+    processor = make_processor(real_models)
+    latencies, items = [], 0
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for article in articles:
+            t = time.perf_counter()
+            processor.process_article(article)
+            latencies.append((time.perf_counter() - t) * 1000)
+            items += 1
+    return summarize(latencies, items, time.perf_counter() - start)
+
+
+def bench_nlp_combine_summaries(search_url: str, iterations: int, real_models: bool) -> Dict:
+    articles = load_articles(search_url)
+    processor = make_processor(real_models)
+    processed = [processor.process_article(article) for article in articles]
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t = time.perf_counter()
+        processor.combine_summaries(processed)
+        latencies.append((time.perf_counter() - t) * 1000)
+    return summarize(latencies, iterations, time.perf_counter() - start)
+
+
+def bench_aggregator_end_to_end(search_url: str, iterations: int, real_models: bool) -> Dict:
+    from main import ResearchAggregator
+    from scraper import WebScraper
+    from events import ARTICLE_PROCESSED, ANALYSIS_COMPLETE
+
+    aggregator = ResearchAggregator(
+        scraper=WebScraper(search_url=search_url),
+        nlp_processor=make_processor(real_models)
+    )
+    latencies, first_result, items = [], [], 0
+
+    async def run(query: str):
+        t = time.perf_counter()
+        first = None
+        async for event in aggregator.research_topic_stream(query, num_sources=3, use_cache=False):
+            if event.type == ARTICLE_PROCESSED and first is None:
+                first = (time.perf_counter() - t) * 1000
+            if event.type == ANALYSIS_COMPLETE:
+                return first, (time.perf_counter() - t) * 1000, len(event.data['output']['source_articles'])
+        return first, (time.perf_counter() - t) * 1000, 0
+
+    start = time.perf_counter()
+    for i in range(iterations):
+        shutil.rmtree(aggregator.scraper.cache_dir, ignore_errors=True)
+        os.makedirs(aggregator.scraper.cache_dir, exist_ok=True)
+        first, total, count = asyncio.run(run(QUERIES[i % len(QUERIES)]))
+        latencies.append(total)
+        if first is not None:
+            first_result.append(first)
+        items += count
+
+    summary = summarize(latencies, items, time.perf_counter() - start)
+    summary['time_to_first_article_ms'] = {
+        'p50': percentile(first_result, 50),
+        'p95': percentile(first_result, 95)
+    }
+    return summary
+
+
+BENCHMARKS: Dict[str, Callable] = {
+    'scraper.search': bench_scraper_search,
+    'scraper.fetch_parse': bench_scraper_fetch_parse,
+    'scraper.concurrent': bench_scraper_concurrent,
+    'nlp.process_article': bench_nlp_process_article,
+    'nlp.combine_summaries': bench_nlp_combine_summaries,
+    'aggregator.end_to_end': bench_aggregator_end_to_end,
+}
+
+
+def run_isolated(name: str, search_url: str, iterations: int, real_models: bool) -> Dict:
+    """Worker-process entry point: run one benchmark in a scratch directory."""
+    from instrumentation import metrics
+
+    scratch = tempfile.mkdtemp(prefix="bench-")
+    os.chdir(scratch)
+    try:
+        result = BENCHMARKS[name](search_url, iterations, real_models)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result['peak_rss_mb'] = peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    result['stages'] = metrics.snapshot()
+    return result
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=BENCH_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(previous: Dict, current: Dict):
+    """Print p50/p95 latency and throughput changes between two runs."""
+    print(f"\n{'benchmark':<26}{'p50 ms':>18}{'p95 ms':>18}{'items/s':>18}")
+    for name, result in current['results'].items():
+        old = previous.get('results', {}).get(name)
+        if not old:
+            continue
+
+        def cell(old_value, new_value):
+            delta = (new_value - old_value) / old_value * 100 if old_value else 0.0
+            return f"{new_value:8.1f} ({delta:+5.1f}%)"
+
+        print(f"{name:<26}"
+              f"{cell(old['latency_ms']['p50'], result['latency_ms']['p50']):>18}"
+              f"{cell(old['latency_ms']['p95'], result['latency_ms']['p95']):>18}"
+              f"{cell(old['throughput_per_s'], result['throughput_per_s']):>18}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run offline pipeline benchmarks.")
+    parser.add_argument("--only", nargs="*", choices=sorted(BENCHMARKS), help="Benchmarks to run (default: all)")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--real-models", action="store_true", help="Load the real NLP models instead of stubs")
+    parser.add_argument("--host-delay", type=float, default=0.0,
+                        help="Artificial latency in seconds added to one fixture host")
+    parser.add_argument("--output", help="Write machine-readable results to this JSON file")
+    parser.add_argument("--compare", help="Previous results JSON to compare against")
+    args = parser.parse_args()
+
+    names = args.only or list(BENCHMARKS)
+    results = {}
+    with StubServer() as stub:
+        if args.host_delay:
+            stub.delays[next(iter(stub.pages))] = args.host_delay
+        for name in names:
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                result = pool.submit(run_isolated, name, stub.search_url, args.iterations, args.real_models).result()
+            results[name] = result
+            print(f"{name:<26} p50 {result['latency_ms']['p50']:8.1f} ms  "
+                  f"p95 {result['latency_ms']['p95']:8.1f} ms  "
+                  f"{result['throughput_per_s']:8.1f} items/s  "
+                  f"peak RSS {result['peak_rss_mb']:7.1f} MB")
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'iterations': args.iterations,
+            'real_models': args.real_models,
+            'host_delay': args.host_delay
+        },
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
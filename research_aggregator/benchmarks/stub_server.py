@@ -0,0 +1,141 @@
+import json
+import re
+import threading
+import time
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures" / "pages"
+
+
+class StubServer:
+    """Local stand-in for the search engines and article hosts.
+
+    Serves the recorded pages in fixtures/pages under /pages/<name>.html, a
+    DuckDuckGo-style HTML results page at /html/ and a Serper-style JSON
+    endpoint at /search. `delays` maps page names to artificial latency in
+    seconds so slow hosts can be modelled.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 delays: Optional[Dict[str, float]] = None,
+                 fixtures_dir: Path = FIXTURES_DIR):
+        self.pages = {path.stem: path.read_bytes() for path in sorted(fixtures_dir.glob("*.html"))}
+        self.delays = delays or {}
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def search_url(self) -> str:
+        return f"{self.base_url}/html/"
+
+    @property
+    def serper_url(self) -> str:
+        return f"{self.base_url}/search"
+
+    def page_url(self, name: str) -> str:
+        return f"{self.base_url}/pages/{name}.html"
+
+    def rank_pages(self, query: str, num: int) -> List[str]:
+        """Order pages by how many query terms appear in their text."""
+        terms = set(re.findall(r"\w+", query.lower()))
+
+        def score(name):
+            text = self.pages[name].decode("utf-8").lower()
+            return sum(text.count(term) for term in terms)
+
+        return sorted(self.pages, key=score, reverse=True)[:num]
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str):
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", content_type)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client cancelled, e.g. a straggler or losing hedge
+                    pass
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                parsed = urlparse(self.path)
+
+                if parsed.path.startswith("/pages/"):
+                    name = Path(parsed.path).stem
+                    if name not in server.pages:
+                        return self._send(404, b"not found", "text/plain")
+                    time.sleep(server.delays.get(name, 0))
+                    return self._send(200, server.pages[name], "text/html; charset=utf-8")
+
+                if parsed.path.rstrip("/") == "/html":
+                    query = parse_qs(parsed.query).get("q", [""])[0]
+                    links = "\n".join(
+                        f'<div class="result"><a class="result__url" href="{escape(server.page_url(name))}">'
+                        f'{escape(name)}</a></div>'
+                        for name in server.rank_pages(query, len(server.pages))
+                    )
+                    body = f"<html><body>{links}</body></html>".encode("utf-8")
+                    return self._send(200, body, "text/html; charset=utf-8")
+
+                self._send(404, b"not found", "text/plain")
+
+            def do_POST(self):
+                with server._lock:
+                    server.requests += 1
+                if urlparse(self.path).path != "/search":
+                    return self._send(404, b"not found", "text/plain")
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                names = server.rank_pages(payload.get("q", ""), int(payload.get("num", 10)))
+                body = json.dumps({
+                    "organic": [{"title": name, "link": server.page_url(name)} for name in names]
+                }).encode("utf-8")
+                self._send(200, body, "application/json")
+
+        return Handler
+
+    def start(self) -> "StubServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="stub-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    with StubServer(port=8765) as stub:
+        print(f"Serving {len(stub.pages)} fixture pages at {stub.base_url}")
+        print(f"Search endpoint: {stub.search_url}?q=<query>")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
@@ -1,18 +1,78 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List, Optional
-import uvicorn
-from newspaper import Article
-import nltk
-from transformers import pipeline
+from src.startup import FAST_START, Readiness, StartupProfile, ensure_nltk_resource
 
-# Download required NLTK data
-nltk.download('punkt')
+profile = StartupProfile("api")
+with profile.phase("import web stack"):
+    from contextlib import asynccontextmanager
+    from concurrent.futures import ThreadPoolExecutor
+    import asyncio
+    import os
+    import threading
+    from fastapi import FastAPI, HTTPException
+    from fastapi.responses import JSONResponse
+    from pydantic import BaseModel
+    from typing import List, Optional
+    import aiohttp
+    from agent.micro_batcher import MicroBatcher, Overloaded
+# newspaper (and NLTK with it) and transformers are imported by the warm-up
+# thread, so the server answers liveness checks while they load
 
-app = FastAPI(title="Research Aggregator API")
+# Concurrent summaries are grouped into one model call of up to this many articles,
+# waiting at most SUMMARY_BATCH_WAIT_MS for the batch to fill; beyond
+# SUMMARY_QUEUE_DEPTH waiting requests, new ones get a 503
+SUMMARY_BATCH_SIZE = int(os.getenv("SUMMARY_BATCH_SIZE", "8"))
+SUMMARY_BATCH_WAIT_MS = float(os.getenv("SUMMARY_BATCH_WAIT_MS", "20"))
+SUMMARY_QUEUE_DEPTH = int(os.getenv("SUMMARY_QUEUE_DEPTH", "64"))
+DOWNLOAD_TIMEOUT = 20
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
 
-# Initialize the summarization pipeline
-summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
+readiness = Readiness()
+_summarizer = None
+_summarizer_lock = threading.Lock()
+
+def get_summarizer():
+    """The BART summarization pipeline, loaded on first use."""
+    global _summarizer
+    with _summarizer_lock:
+        if _summarizer is None:
+            with profile.phase("load summarizer"):
+                from transformers import pipeline
+                _summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
+        return _summarizer
+
+def warm_up():
+    with profile.phase("import newspaper"):
+        import newspaper  # noqa: F401
+    # Article.nlp() needs punkt; with FAST_START only the local NLTK data is checked
+    if not ensure_nltk_resource('punkt', 'tokenizers/punkt'):
+        raise RuntimeError("NLTK punkt tokenizer is not installed")
+    get_summarizer()
+    profile.log_if_enabled()
+
+def summarize_batch(texts: List[str]) -> List[str]:
+    """Summarize several articles in one batched BART call."""
+    outputs = get_summarizer()(texts, max_length=130, min_length=30, do_sample=False,
+                               truncation=True, batch_size=len(texts))
+    return [output['summary_text'] for output in outputs]
+
+summary_batcher = MicroBatcher(summarize_batch, max_batch_size=SUMMARY_BATCH_SIZE,
+                               max_wait_ms=SUMMARY_BATCH_WAIT_MS, max_queue=SUMMARY_QUEUE_DEPTH,
+                               name='summarizer')
+# Article parsing and keyword extraction are CPU-bound and run here, off the event loop
+parse_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='parse')
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.http = aiohttp.ClientSession(
+        timeout=aiohttp.ClientTimeout(total=DOWNLOAD_TIMEOUT), headers={'User-Agent': USER_AGENT}
+    )
+    summary_batcher.start()
+    # Models load in the background; /ready reports when they are done
+    readiness.warm_up("summarizer", warm_up)
+    yield
+    await summary_batcher.close()
+    await app.state.http.close()
+
+app = FastAPI(title="Research Aggregator API", lifespan=lifespan)
 
 class URLInput(BaseModel):
     url: str
@@ -23,17 +83,30 @@ class ReportResponse(BaseModel):
     key_points: List[str]
     full_text: str
 
+async def download(url: str) -> str:
+    async with app.state.http.get(url) as response:
+        if response.status >= 400:
+            raise HTTPException(status_code=502, detail=f"Fetching {url} failed: HTTP {response.status}")
+        return await response.text()
+
+def parse_article(url: str, html: str):
+    from newspaper import Article
+    article = Article(url)
+    article.set_html(html)
+    article.parse()
+    article.nlp()  # This will extract keywords, summary, etc.
+    return article
+
 @app.post("/analyze", response_model=ReportResponse)
 async def analyze_article(url_input: URLInput):
     try:
         # Scrape the article
-        article = Article(url_input.url)
-        article.download()
-        article.parse()
-        article.nlp()  # This will extract keywords, summary, etc.
+        html = await download(url_input.url)
+        loop = asyncio.get_running_loop()
+        article = await loop.run_in_executor(parse_executor, parse_article, url_input.url, html)
 
-        # Generate a more detailed summary using BART
-        summary = summarizer(article.text, max_length=130, min_length=30, do_sample=False)[0]['summary_text']
+        # Generate a more detailed summary using BART, batched with concurrent requests
+        summary = await summary_batcher.submit(article.text)
 
         return ReportResponse(
             title=article.title,
@@ -41,6 +114,10 @@ async def analyze_article(url_input: URLInput):
             key_points=article.keywords,
             full_text=article.text
         )
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=f"Server busy: {str(e)}", headers={'Retry-After': '1'})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -48,5 +125,17 @@ async def analyze_article(url_input: URLInput):
 async def root():
     return {"message": "Welcome to Research Aggregator API"}
 
+@app.get("/health")
+async def health():
+    """Liveness: the server is up and answering, whether or not the models are loaded."""
+    return {"status": "ok"}
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 once the models are loaded, 503 with their warm-up status until then."""
+    status = {**readiness.snapshot(), 'fast_start': FAST_START, 'startup': profile.report()}
+    return JSONResponse(status, status_code=200 if status['ready'] else 503)
+
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    import uvicorn
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
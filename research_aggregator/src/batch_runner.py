@@ -0,0 +1,201 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from main import ResearchAggregator
+from instrumentation import metrics, run_in_context
+
+
+def load_queries(path: str) -> List[Dict]:
+    """Read queries from a text file (one per line) or JSON Lines.
+
+    JSON Lines records may carry their own `id` and `num_sources`; otherwise a
+    query's id is its line number, which keeps checkpoints valid as long as
+    the file isn't reordered.
+    """
+    queries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('{'):
+                record = json.loads(line)
+                record.setdefault('id', str(line_number))
+                queries.append(record)
+            else:
+                queries.append({'id': str(line_number), 'query': line})
+    return queries
+
+
+class BatchRunner:
+    """Run thousands of research queries through one shared ResearchAggregator.
+
+    Queries are handled in chunks. For each chunk, every search runs with
+    bounded concurrency, each distinct URL is fetched once, the new articles
+    are analyzed together in one batched NLP pass, and each query's output
+    is then combined from the shared analyses. Analyses are kept in a bounded
+    cache, keyed by URL, so later chunks reuse them too. After each chunk the
+    completed query ids are appended to the checkpoint file, and a rerun
+    skips them.
+    """
+
+    def __init__(self, aggregator: Optional[ResearchAggregator] = None, concurrency: int = 8,
+                 chunk_size: int = 50, num_sources: int = 5, nlp_batch_size: int = 8,
+                 checkpoint_path: str = "data/batch/checkpoint.jsonl",
+                 max_cached_analyses: int = 20000):
+        self.logger = logging.getLogger(__name__)
+        self.aggregator = aggregator or ResearchAggregator()
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.num_sources = num_sources
+        self.nlp_batch_size = nlp_batch_size
+        self.checkpoint_path = Path(checkpoint_path)
+        self.checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_cached_analyses = max_cached_analyses
+        self.analyses = OrderedDict()
+        self.stats = {'queries': 0, 'skipped': 0, 'failed': 0, 'urls_fetched': 0, 'url_reuses': 0}
+
+    def completed_ids(self) -> set:
+        """Ids of queries finished in a previous run."""
+        if not self.checkpoint_path.exists():
+            return set()
+        done = set()
+        with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    done.add(json.loads(line)['id'])
+                except (json.JSONDecodeError, KeyError):
+                    # Ignore a torn last line from an interrupted run
+                    continue
+        return done
+
+    def write_checkpoint(self, records: List[Dict]):
+        with open(self.checkpoint_path, 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def remember_analysis(self, url: str, analysis: Dict):
+        self.analyses[url] = analysis
+        self.analyses.move_to_end(url)
+        while len(self.analyses) > self.max_cached_analyses:
+            self.analyses.popitem(last=False)
+
+    async def search_all(self, chunk: List[Dict]) -> Dict[str, List[str]]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def search(item):
+            num_sources = item.get('num_sources', self.num_sources)
+            async with semaphore:
+                urls = await self.aggregator.scraper.search_sources(item['query'], num_sources)
+            # Candidates come back best host first; batch runs skip the over-provisioned tail
+            return item['id'], urls[:num_sources]
+
+        return dict(await asyncio.gather(*[search(item) for item in chunk]))
+
+    async def fetch_all(self, urls: List[str]) -> List[Dict]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(url):
+            async with semaphore:
+                return await self.aggregator.scraper.scrape_article_async(url)
+
+        articles = await asyncio.gather(*[fetch(url) for url in urls])
+        return [article for article in articles if article]
+
+    async def run_chunk(self, chunk: List[Dict]) -> List[Dict]:
+        loop = asyncio.get_running_loop()
+
+        with metrics.span('batch.search', queries=len(chunk)):
+            urls_by_query = await self.search_all(chunk)
+
+        # Each distinct URL is fetched and analyzed once, across all queries
+        wanted = list(dict.fromkeys(url for urls in urls_by_query.values() for url in urls))
+        missing = [url for url in wanted if url not in self.analyses]
+        self.stats['url_reuses'] += sum(len(urls) for urls in urls_by_query.values()) - len(missing)
+        with metrics.span('batch.fetch', urls=len(missing)):
+            articles = await self.fetch_all(missing)
+        self.stats['urls_fetched'] += len(articles)
+
+        with metrics.span('batch.nlp', articles=len(articles)):
+            processed = await loop.run_in_executor(
+                self.aggregator.nlp_executor,
+                run_in_context(self.aggregator.nlp_processor.process_articles, articles, self.nlp_batch_size)
+            )
+        for analysis in processed:
+            if analysis:
+                self.remember_analysis(analysis['original_data']['url'], analysis)
+        self.aggregator.record_corpus(processed)
+
+        records = []
+        for item in chunk:
+            num_sources = item.get('num_sources', self.num_sources)
+            analyses = [self.analyses[url] for url in urls_by_query.get(item['id'], []) if url in self.analyses]
+            analyses = analyses[:num_sources]
+            record = {'id': item['id'], 'query': item['query'], 'completed_at': datetime.now().isoformat()}
+            if not analyses:
+                self.stats['failed'] += 1
+                records.append({**record, 'status': 'no_articles'})
+                continue
+
+            combined = await loop.run_in_executor(
+                self.aggregator.nlp_executor,
+                run_in_context(self.aggregator.nlp_processor.combine_summaries, analyses)
+            )
+            output = self.aggregator.format_output(combined, analyses)
+            self.aggregator.update_memory(item['query'], output)
+            record_id = self.aggregator.save_results(output, item['query'])
+            records.append({**record, 'status': 'ok', 'result_id': record_id})
+        return records
+
+    async def run(self, queries: List[Dict]) -> Dict:
+        """Run every query not already in the checkpoint. Returns run stats."""
+        done = self.completed_ids()
+        pending = [item for item in queries if item['id'] not in done]
+        self.stats['skipped'] = len(queries) - len(pending)
+        if self.stats['skipped']:
+            self.logger.info(f"Resuming: {self.stats['skipped']} queries already completed")
+
+        for start in range(0, len(pending), self.chunk_size):
+            chunk = pending[start:start + self.chunk_size]
+            records = await self.run_chunk(chunk)
+            self.write_checkpoint(records)
+            self.stats['queries'] += len(records)
+            self.logger.info(f"Batch progress: {self.stats['queries']}/{len(pending)} queries "
+                             f"({self.stats['urls_fetched']} URLs fetched, "
+                             f"{self.stats['url_reuses']} reused)")
+        return self.stats
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Run a file of research queries in batch.")
+    parser.add_argument("queries", help="Text file with one query per line, or JSON Lines")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent searches and fetches")
+    parser.add_argument("--chunk-size", type=int, default=50, help="Queries per checkpointed chunk")
+    parser.add_argument("--num-sources", type=int, default=5)
+    parser.add_argument("--nlp-batch-size", type=int, default=8)
+    parser.add_argument("--checkpoint", default="data/batch/checkpoint.jsonl")
+    args = parser.parse_args()
+
+    runner = BatchRunner(
+        concurrency=args.concurrency,
+        chunk_size=args.chunk_size,
+        num_sources=args.num_sources,
+        nlp_batch_size=args.nlp_batch_size,
+        checkpoint_path=args.checkpoint
+    )
+    stats = await runner.run(load_queries(args.queries))
+    print(json.dumps(stats, indent=2))
+    print("\nStage Timings:")
+    print(metrics.report())
+
+if __name__ == "__main__":
+    asyncio.run(main())
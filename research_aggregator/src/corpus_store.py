@@ -0,0 +1,262 @@
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import urlparse
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from file_lock import file_lock
+from instrumentation import metrics
+
+ARTICLES = 'articles'
+ANALYSES = 'analyses'
+
+ARTICLE_SCHEMA = pa.schema([
+    ('url_hash', pa.string()),
+    ('url', pa.string()),
+    ('domain', pa.string()),
+    ('title', pa.string()),
+    ('text', pa.string()),
+    ('authors', pa.list_(pa.string())),
+    ('keywords', pa.list_(pa.string())),
+    ('publish_date', pa.string()),
+    ('fetched_at', pa.timestamp('ms', tz='UTC')),
+])
+
+ANALYSIS_SCHEMA = pa.schema([
+    ('url_hash', pa.string()),
+    ('url', pa.string()),
+    ('model_version', pa.string()),
+    ('processed_at', pa.timestamp('ms', tz='UTC')),
+    ('summary', pa.string()),
+    ('sentiment_label', pa.string()),
+    ('sentiment_score', pa.float32()),
+    ('entities', pa.list_(pa.struct([('text', pa.string()), ('label', pa.string())]))),
+    ('key_phrases', pa.list_(pa.string())),
+    ('embedding', pa.list_(pa.float32())),
+])
+
+# Each table is partitioned by day, so scans over a date range skip other days' files
+TABLES = {
+    ARTICLES: {'schema': ARTICLE_SCHEMA, 'time': 'fetched_at', 'partition': 'fetch_date'},
+    ANALYSES: {'schema': ANALYSIS_SCHEMA, 'time': 'processed_at', 'partition': 'processed_date'},
+}
+
+
+def url_hash(url: str) -> str:
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+class CorpusStore:
+    """Append-only columnar store of every fetched article and its NLP outputs.
+
+    Articles and analyses are separate Parquet datasets under `root`, hive
+    partitioned by day (`articles/fetch_date=2024-05-01/part-*.parquet`),
+    joined on `url_hash`. Re-summarizing or re-embedding after a model
+    upgrade appends new analysis rows with the new `model_version` next to
+    the old ones; `latest()` keeps the newest row per article.
+
+    Rows are buffered and written as one file per partition when
+    `flush_rows` are pending or on `flush()`. A partition that reaches
+    `compact_files` files is merged into one after the write, so frequent
+    small flushes don't leave thousands of tiny files. Scans read only the
+    requested columns and the partitions and row groups the filter can
+    match, so a pass over `url_hash` and `text` never touches embeddings.
+
+    Several processes may share `root`. Writes and reads hold a shared
+    flock on the table's `.lock` file and compaction an exclusive one, so
+    no write lands in a partition being replaced and no scan loses files
+    it has listed; automatic compaction is skipped while the table is busy
+    and retried on a later write.
+    """
+
+    def __init__(self, root: str = "data/corpus", flush_rows: int = 1000, compression: str = 'zstd',
+                 row_group_size: int = 10000, compact_files: Optional[int] = 16):
+        self.logger = logging.getLogger(__name__)
+        self.root = Path(root)
+        self.flush_rows = flush_rows
+        self.compression = compression
+        self.row_group_size = row_group_size
+        self.compact_files = compact_files
+        self._pending: Dict[str, List[Dict]] = {ARTICLES: [], ANALYSES: []}
+        self._lock = threading.Lock()
+        for table in TABLES:
+            (self.root / table).mkdir(parents=True, exist_ok=True)
+
+    # Writing
+
+    def add_article(self, article: Dict, fetched_at: Optional[datetime] = None):
+        """Queue a scraped article (as returned by WebScraper) for writing."""
+        publish_date = article.get('publish_date')
+        self._add(ARTICLES, {
+            'url_hash': url_hash(article['url']),
+            'url': article['url'],
+            'domain': urlparse(article['url']).netloc,
+            'title': article.get('title'),
+            'text': article.get('text'),
+            'authors': list(article.get('authors') or []),
+            'keywords': list(article.get('keywords') or []),
+            'publish_date': str(publish_date) if publish_date else None,
+            'fetched_at': fetched_at or datetime.now(timezone.utc),
+        })
+
+    def add_analysis(self, url: str, analysis: Dict, model_version: str,
+                     processed_at: Optional[datetime] = None):
+        """Queue NLP outputs for an article (summary, entities, sentiment, key phrases, embedding)."""
+        sentiment = analysis.get('sentiment') or {}
+        embedding = analysis.get('embedding')
+        self._add(ANALYSES, {
+            'url_hash': url_hash(url),
+            'url': url,
+            'model_version': model_version,
+            'processed_at': processed_at or datetime.now(timezone.utc),
+            'summary': analysis.get('summary'),
+            'sentiment_label': sentiment.get('label'),
+            'sentiment_score': sentiment.get('score'),
+            'entities': [{'text': e['text'], 'label': e['label']} for e in analysis.get('entities') or []],
+            'key_phrases': list(analysis.get('key_phrases') or []),
+            'embedding': np.asarray(embedding, dtype=np.float32) if embedding is not None else None,
+        })
+
+    def add_processed(self, processed_articles: List[Dict], model_version: str):
+        """Queue articles from NLPProcessor.process_article(s) together with their analyses."""
+        for processed in processed_articles:
+            if not processed:
+                continue
+            article = processed['original_data']
+            self.add_article(article)
+            self.add_analysis(article['url'], processed, model_version)
+
+    def _add(self, table: str, row: Dict):
+        with self._lock:
+            self._pending[table].append(row)
+            if len(self._pending[table]) < self.flush_rows:
+                return
+            rows, self._pending[table] = self._pending[table], []
+        self._write(table, rows)
+
+    def flush(self):
+        """Write everything buffered so far."""
+        with self._lock:
+            pending = {table: rows for table, rows in self._pending.items() if rows}
+            self._pending = {table: [] for table in TABLES}
+        for table, rows in pending.items():
+            self._write(table, rows)
+
+    def _write(self, table: str, rows: List[Dict]):
+        spec = TABLES[table]
+        partitions = defaultdict(list)
+        for row in rows:
+            partitions[row[spec['time']].astimezone(timezone.utc).strftime('%Y-%m-%d')].append(row)
+        with metrics.span('corpus.write', table=table, rows=len(rows)):
+            for day, day_rows in partitions.items():
+                data = pa.Table.from_pylist(day_rows, schema=spec['schema'])
+                directory = self.root / table / f"{spec['partition']}={day}"
+                with self._table_lock(table, shared=True):
+                    self._write_file(data, directory)
+                if self.compact_files and len(list(directory.glob("part-*.parquet"))) >= self.compact_files:
+                    try:
+                        with self._table_lock(table, blocking=False):
+                            self._compact_partition(directory)
+                    except BlockingIOError:
+                        self.logger.debug(f"Skipped compacting busy partition {directory.name}")
+        metrics.incr(f'corpus.{table}_rows', len(rows))
+
+    def _table_lock(self, table: str, shared: bool = False, blocking: bool = True):
+        return file_lock(self.root / table / ".lock", shared=shared, blocking=blocking)
+
+    def _write_file(self, data: pa.Table, directory: Path):
+        directory.mkdir(parents=True, exist_ok=True)
+        name = f"part-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet"
+        # Written under a dot name first: scans skip hidden files, so readers never see a partial file
+        temp_path = directory / f".{name}"
+        pq.write_table(data, temp_path, compression=self.compression, row_group_size=self.row_group_size)
+        os.replace(temp_path, directory / name)
+
+    # Reading
+
+    def dataset(self, table: str) -> ds.Dataset:
+        """The table as a pyarrow dataset; use scan()/read() unless you hold the table lock meanwhile."""
+        spec = TABLES[table]
+        partitioning = ds.partitioning(pa.schema([(spec['partition'], pa.string())]), flavor='hive')
+        return ds.dataset(self.root / table, schema=spec['schema'].append(pa.field(spec['partition'], pa.string())),
+                          format='parquet', partitioning=partitioning)
+
+    def scan(self, table: str, columns: Optional[List[str]] = None, filter: Optional[ds.Expression] = None,
+             batch_size: int = 65536) -> Iterator[pa.RecordBatch]:
+        """Stream record batches with only `columns`, skipping partitions and row groups `filter` rules out.
+
+        Filter on the partition column to prune by day, e.g.
+        `pc.field('fetch_date') >= '2024-05-01'`. Compaction of the table
+        waits until the iteration finishes or the generator is closed, so
+        don't call compact() from inside the loop.
+        """
+        with self._table_lock(table, shared=True), metrics.span('corpus.scan', table=table):
+            yield from self.dataset(table).to_batches(columns=columns, filter=filter, batch_size=batch_size)
+
+    def read(self, table: str, columns: Optional[List[str]] = None,
+             filter: Optional[ds.Expression] = None) -> pa.Table:
+        with self._table_lock(table, shared=True):
+            return self.dataset(table).to_table(columns=columns, filter=filter)
+
+    def count(self, table: str, filter: Optional[ds.Expression] = None) -> int:
+        with self._table_lock(table, shared=True):
+            return self.dataset(table).count_rows(filter=filter)
+
+    def latest(self, table: str, columns: Optional[List[str]] = None,
+               filter: Optional[ds.Expression] = None) -> pa.Table:
+        """The newest row per article (by url_hash), e.g. the current analysis after a reprocessing run."""
+        time_column = TABLES[table]['time']
+        wanted = columns or list(TABLES[table]['schema'].names) + [TABLES[table]['partition']]
+        data = self.read(table, list(dict.fromkeys([*wanted, 'url_hash', time_column])), filter)
+        if data.num_rows == 0:
+            return data.select(wanted)
+        data = data.take(pc.sort_indices(data, sort_keys=[('url_hash', 'ascending'), (time_column, 'descending')]))
+        keys = data.column('url_hash').to_numpy(zero_copy_only=False)
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = keys[1:] != keys[:-1]
+        return data.filter(pa.array(first)).select(wanted)
+
+    def compact(self, table: str, min_files: int = 8) -> int:
+        """Merge each partition holding at least `min_files` files into one; returns partitions merged.
+
+        Waits for writes in progress in any process, and holds off new ones until it is done.
+        """
+        self.flush()
+        spec = TABLES[table]
+        merged = 0
+        with self._table_lock(table):
+            for directory in sorted((self.root / table).glob(f"{spec['partition']}=*")):
+                if len(list(directory.glob("part-*.parquet"))) >= min_files:
+                    self._compact_partition(directory)
+                    merged += 1
+        return merged
+
+    def _compact_partition(self, directory: Path):
+        """Replace a partition's files with one merged file; call holding the table's exclusive lock.
+
+        The merged file is written to a hidden directory (scans skip hidden
+        paths) that then takes the partition's place, so a scan sees the old
+        files or the merged one, never both: no row is counted twice.
+        """
+        with metrics.span('corpus.compact', partition=directory.name):
+            files = sorted(directory.glob("part-*.parquet"))
+            data = pa.concat_tables(pq.ParquetFile(path).read() for path in files)
+            token = uuid.uuid4().hex[:8]
+            staging = directory.with_name(f".{directory.name}.compact-{token}")
+            retired = directory.with_name(f".{directory.name}.old-{token}")
+            self._write_file(data, staging)
+            os.replace(directory, retired)
+            os.replace(staging, directory)
+            shutil.rmtree(retired)
@@ -0,0 +1,64 @@
+import math
+import time
+from typing import Dict, Optional
+
+
+class DeadlineExceeded(Exception):
+    """Raised by Deadline.check when the budget has run out."""
+    pass
+
+
+class Deadline:
+    """A wall-clock budget that is split across pipeline stages.
+
+    Create one per request with the caller's total budget in seconds (None
+    means unlimited) and hand each stage a `child()` with its share of what
+    is left. Stages check `expired()` between units of work and record how
+    far they got with `mark()`, so a request that runs out of time can
+    still return its partial output together with `completeness()`.
+    """
+
+    def __init__(self, budget: Optional[float] = None, parent: Optional['Deadline'] = None):
+        self.started_at = time.monotonic()
+        self.budget = budget
+        self.expires_at = self.started_at + budget if budget is not None else math.inf
+        if parent is not None:
+            self.expires_at = min(self.expires_at, parent.expires_at)
+        # Stage results are shared with the parent so the root sees every stage
+        self.stages: Dict[str, str] = parent.stages if parent is not None else {}
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def timeout(self) -> Optional[float]:
+        """Remaining time in the form asyncio.wait_for and HTTP clients expect."""
+        return None if self.expires_at == math.inf else self.remaining()
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def check(self, stage: str):
+        if self.expired():
+            self.mark(stage, 'timed_out')
+            raise DeadlineExceeded(f"Deadline exceeded during {stage}")
+
+    def child(self, share: float) -> 'Deadline':
+        """A sub-deadline for a stage allowed `share` (0-1) of the remaining time."""
+        if self.expires_at == math.inf:
+            return Deadline(parent=self)
+        return Deadline(self.remaining() * share, parent=self)
+
+    def mark(self, stage: str, status: str = 'complete'):
+        """Record a stage outcome: 'complete', 'partial', 'timed_out', 'skipped' or 'failed'."""
+        self.stages[stage] = status
+
+    def completeness(self) -> Dict:
+        return {
+            'complete': all(status == 'complete' for status in self.stages.values()),
+            'budget_seconds': self.budget,
+            'elapsed_seconds': round(self.elapsed(), 3),
+            'stages': dict(self.stages)
+        }
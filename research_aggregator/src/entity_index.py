@@ -0,0 +1,350 @@
+import heapq
+import json
+import logging
+import os
+import re
+import threading
+from contextlib import nullcontext
+from collections import Counter, defaultdict
+from itertools import combinations
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from file_lock import file_lock
+
+PHRASE = 'PHRASE'
+
+# (label, normalized text); key phrases use the label PHRASE
+Term = Tuple[str, str]
+
+_EDGE_PUNCTUATION = " \t\n.,;:!?\"'()[]{}“”‘’"
+
+
+def normalize_term(text: str) -> str:
+    """Case- and whitespace-insensitive form of an entity or phrase: 'The  E.U.'s' -> 'e.u.'."""
+    text = re.sub(r"\s+", " ", text).strip(_EDGE_PUNCTUATION).lower()
+    text = re.sub(r"['’]s$", "", text)
+    return re.sub(r"^(?:the|a|an) ", "", text)
+
+
+class EntityIndex:
+    """Incremental inverted index from entities and key phrases to articles.
+
+    Every article's entities (by spaCy label) and key phrases are indexed
+    under their normalized text, with per-article mention counts and
+    article-level co-occurrence between terms, so "which articles mention
+    X", "what appears with X" and "the top entities across these articles"
+    are dictionary lookups rather than another spaCy pass. Re-adding an
+    article replaces its terms. Articles can be tagged with the research
+    queries that found them, to rank terms for a topic.
+
+    With a `path`, additions are appended to a JSON Lines log (like
+    QueryIndex) and replayed on load. Once re-adds and removals make the
+    log more than twice as long as the live index (and over
+    `min_compact_records` lines), it is rewritten from the current state.
+
+    Several processes may share the log. Writes and compaction hold an
+    flock on it and first replay what other processes appended since this
+    one last read it (or reload it whole after another process compacted
+    it), so a rewrite never drops their records. Lookups answer from the
+    state as of this process's last write or `load()`.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_cooccurring_terms: int = 50,
+                 min_compact_records: int = 1000):
+        self.logger = logging.getLogger(__name__)
+        self.path = Path(path) if path else None
+        # Only an article's most mentioned terms count toward co-occurrence, bounding its quadratic cost
+        self.max_cooccurring_terms = max_cooccurring_terms
+        self.min_compact_records = min_compact_records
+        self._lock = threading.RLock()
+        self._lock_path = self.path.with_name(f".{self.path.name}.lock") if self.path else None
+        self._reset()
+        self.load()
+
+    def _reset(self):
+        self._postings: Dict[Term, Dict[str, int]] = defaultdict(dict)
+        self._article_terms: Dict[str, Counter] = {}
+        # Each article's (label, text) mentions as given, to undo its surface forms and rewrite the log
+        self._article_mentions: Dict[str, List[Tuple[str, str]]] = {}
+        self._cooccurrence: Dict[Term, Counter] = defaultdict(Counter)
+        self._surface_forms: Dict[Term, Counter] = defaultdict(Counter)
+        self._labels_by_text: Dict[str, set] = defaultdict(set)
+        self._query_articles: Dict[str, set] = defaultdict(set)
+        # Corpus-wide ranking, rebuilt on the first top() after a change
+        self._corpus_ranking: Optional[List[Term]] = None
+        self._log_records = 0
+        # How far into which log file this process has replayed
+        self._log_offset = 0
+        self._log_identity: Optional[Tuple[int, int]] = None
+
+    def __len__(self) -> int:
+        return len(self._article_terms)
+
+    def __contains__(self, article_id: str) -> bool:
+        return article_id in self._article_terms
+
+    def load(self):
+        """Rebuild the index from the on-disk log, if any."""
+        if not self.path or not self.path.exists():
+            return
+        with self._lock, self._log_lock():
+            self._reset()
+            self._catch_up()
+            self.logger.info(f"Loaded {len(self)} articles into entity index")
+            self._compact_if_due()
+
+    def _log_lock(self):
+        if not self.path:
+            return nullcontext()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        return file_lock(self._lock_path)
+
+    @staticmethod
+    def _identity(stat: os.stat_result) -> Tuple[int, int]:
+        return stat.st_dev, stat.st_ino
+
+    def _catch_up(self):
+        """Replay log records appended since this process last read it; call under the log lock."""
+        if not self.path:
+            return
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if self._identity(stat) != self._log_identity or stat.st_size < self._log_offset:
+            # Compacted by another process: the offset means nothing in the new file
+            if self._log_identity is not None:
+                self._reset()
+            self._log_identity = self._identity(stat)
+        with open(self.path, 'rb') as f:
+            f.seek(self._log_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # A torn final line from a crash; the next write cuts it off
+                    break
+                self._log_offset += len(line)
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if 'query' in record:
+                    self._tag(record['query'], record['articles'])
+                elif record.get('removed'):
+                    self._remove(record['article_id'])
+                else:
+                    self._add(record['article_id'], record.get('entities', []), record.get('key_phrases', []))
+                self._log_records += 1
+
+    def _log(self, record: Dict):
+        """Append a record; call under the log lock after _catch_up()."""
+        if self.path:
+            line = (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+            with open(self.path, 'ab') as f:
+                if f.tell() > self._log_offset:
+                    f.truncate(self._log_offset)
+                f.write(line)
+                self._log_identity = self._identity(os.fstat(f.fileno()))
+            self._log_offset += len(line)
+            self._log_records += 1
+            self._compact_if_due()
+
+    def _records(self) -> Iterator[Dict]:
+        """The current state as log records: one per article, then one per query."""
+        for article_id, mentions in self._article_mentions.items():
+            yield {'article_id': article_id,
+                   'entities': [{'text': text, 'label': label} for label, text in mentions if label != PHRASE],
+                   'key_phrases': [text for label, text in mentions if label == PHRASE]}
+        for query, article_ids in self._query_articles.items():
+            yield {'query': query, 'articles': sorted(article_ids)}
+
+    def _compact_if_due(self):
+        live = len(self._article_mentions) + len(self._query_articles)
+        if self._log_records > max(self.min_compact_records, 2 * live):
+            self._compact()
+
+    def compact(self):
+        """Rewrite the log from the current state, dropping replaced articles and removals."""
+        if not self.path:
+            return
+        with self._lock, self._log_lock():
+            self._catch_up()
+            self._compact()
+
+    def _compact(self):
+        temp_path = self.path.with_name(f".{self.path.name}.compact")
+        records = 0
+        with open(temp_path, 'wb') as f:
+            for record in self._records():
+                f.write((json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8'))
+                records += 1
+            offset = f.tell()
+        # Swapped in whole, so a crash leaves either the old log or the new one
+        os.replace(temp_path, self.path)
+        self.logger.info(f"Compacted entity index log from {self._log_records} to {records} records")
+        self._log_records = records
+        self._log_offset = offset
+        self._log_identity = self._identity(os.stat(self.path))
+
+    # Updating
+
+    def add(self, article_id: str, entities: List[Dict], key_phrases: List[str]):
+        """Index an article's entities ({'text', 'label'} dicts) and key phrases, replacing any earlier entry."""
+        entities = [{'text': e['text'], 'label': e['label']} for e in entities]
+        with self._lock, self._log_lock():
+            self._catch_up()
+            self._add(article_id, entities, list(key_phrases))
+            self._log({'article_id': article_id, 'entities': entities, 'key_phrases': list(key_phrases)})
+
+    def _add(self, article_id: str, entities: List[Dict], key_phrases: List[str]):
+        self._remove(article_id)
+        terms = Counter()
+        mentions = [(entity['label'], entity['text']) for entity in entities]
+        mentions += [(PHRASE, phrase) for phrase in key_phrases]
+        kept = []
+        for label, text in mentions:
+            normalized = normalize_term(text)
+            if not normalized:
+                continue
+            term = (label, normalized)
+            terms[term] += 1
+            self._surface_forms[term][text.strip()] += 1
+            kept.append((label, text))
+        for term, count in terms.items():
+            self._postings[term][article_id] = count
+            self._labels_by_text[term[1]].add(term[0])
+        for a, b in combinations(self._cooccurring(terms), 2):
+            self._cooccurrence[a][b] += 1
+            self._cooccurrence[b][a] += 1
+        self._article_terms[article_id] = terms
+        self._article_mentions[article_id] = kept
+        self._corpus_ranking = None
+
+    def _cooccurring(self, terms: Counter) -> List[Term]:
+        return sorted(term for term, _ in terms.most_common(self.max_cooccurring_terms))
+
+    def remove(self, article_id: str):
+        with self._lock, self._log_lock():
+            self._catch_up()
+            if article_id in self._article_terms:
+                self._remove(article_id)
+                self._log({'article_id': article_id, 'removed': True})
+
+    def _remove(self, article_id: str):
+        terms = self._article_terms.pop(article_id, None)
+        if terms is None:
+            return
+        for label, text in self._article_mentions.pop(article_id):
+            term = (label, normalize_term(text))
+            forms = self._surface_forms[term]
+            forms[text.strip()] -= 1
+            if forms[text.strip()] <= 0:
+                del forms[text.strip()]
+            if not forms:
+                del self._surface_forms[term]
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(article_id, None)
+            if not postings:
+                del self._postings[term]
+                self._cooccurrence.pop(term, None)
+                self._labels_by_text[term[1]].discard(term[0])
+        for a, b in combinations(self._cooccurring(terms), 2):
+            for x, y in ((a, b), (b, a)):
+                if x in self._cooccurrence:
+                    self._cooccurrence[x][y] -= 1
+                    if self._cooccurrence[x][y] <= 0:
+                        del self._cooccurrence[x][y]
+        self._corpus_ranking = None
+
+    def tag(self, query: str, article_ids: Iterable[str]):
+        """Record that a research query found these articles."""
+        article_ids = list(article_ids)
+        with self._lock, self._log_lock():
+            self._catch_up()
+            self._tag(query, article_ids)
+            self._log({'query': query, 'articles': article_ids})
+
+    def _tag(self, query: str, article_ids: List[str]):
+        self._query_articles[query].update(article_ids)
+
+    # Lookups
+
+    def _terms(self, text: str, label: Optional[str] = None) -> List[Term]:
+        normalized = normalize_term(text)
+        labels = [label] if label else sorted(self._labels_by_text.get(normalized, ()))
+        return [(l, normalized) for l in labels if (l, normalized) in self._postings]
+
+    def articles(self, text: str, label: Optional[str] = None) -> List[str]:
+        """Ids of the articles mentioning `text` (as any label unless one is given), most mentions first."""
+        with self._lock:
+            counts = Counter()
+            for term in self._terms(text, label):
+                counts.update(self._postings[term])
+            return [article_id for article_id, _ in counts.most_common()]
+
+    def describe(self, term: Term) -> Dict:
+        postings = self._postings.get(term, {})
+        surface = self._surface_forms.get(term)
+        return {
+            'text': surface.most_common(1)[0][0] if surface else term[1],
+            'label': term[0],
+            'articles': len(postings),
+            'mentions': sum(postings.values())
+        }
+
+    def cooccurring(self, text: str, label: Optional[str] = None, n: int = 10,
+                    entities_only: bool = False) -> List[Dict]:
+        """Terms found in the same articles as `text`, with how many articles they share."""
+        with self._lock:
+            shared = Counter()
+            for term in self._terms(text, label):
+                shared.update(self._cooccurrence.get(term, {}))
+            if entities_only:
+                shared = Counter({term: count for term, count in shared.items() if term[0] != PHRASE})
+            return [{**self.describe(term), 'shared_articles': count} for term, count in shared.most_common(n)]
+
+    @staticmethod
+    def _matches(term: Term, kind: Optional[str]) -> bool:
+        if kind is None or kind == term[0]:
+            return True
+        return kind == ('phrase' if term[0] == PHRASE else 'entity')
+
+    def top(self, n: int = 10, kind: Optional[str] = None, article_ids: Optional[Iterable[str]] = None,
+            query: Optional[str] = None) -> List[Dict]:
+        """The terms in most articles, then with most mentions.
+
+        Across the whole corpus by default, or within `article_ids`, or
+        within the articles tagged with `query`. `kind` is 'entity',
+        'phrase' or a specific label.
+        """
+        with self._lock:
+            if article_ids is None and query is None:
+                if self._corpus_ranking is None:
+                    self._corpus_ranking = sorted(self._postings, key=lambda t: (-len(self._postings[t]),
+                                                                                 -sum(self._postings[t].values()), t))
+                selected = []
+                for term in self._corpus_ranking:
+                    if self._matches(term, kind):
+                        selected.append(self.describe(term))
+                        if len(selected) >= n:
+                            break
+                return selected
+
+            # Counted within the chosen articles only
+            stats = defaultdict(lambda: [0, 0])
+            for article_id in set(article_ids or ()) | self._query_articles.get(query, set()):
+                for term, count in self._article_terms.get(article_id, {}).items():
+                    stats[term][0] += 1
+                    stats[term][1] += count
+            best = heapq.nsmallest(n, (term for term in stats if self._matches(term, kind)),
+                                   key=lambda t: (-stats[t][0], -stats[t][1], t))
+            return [{**self.describe(term), 'articles': stats[term][0], 'mentions': stats[term][1]} for term in best]
+
+    def aggregate(self, article_ids: Iterable[str], num_entities: int = 20, num_themes: int = 10) -> Dict:
+        """Entities and key themes of a set of articles, ranked by how many of them mention each."""
+        article_ids = list(article_ids)
+        return {
+            'common_entities': self.top(num_entities, kind='entity', article_ids=article_ids),
+            'key_themes': [term['text'] for term in self.top(num_themes, kind='phrase', article_ids=article_ids)]
+        }
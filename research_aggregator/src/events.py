@@ -0,0 +1,22 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict
+
+# Event types emitted by ResearchAggregator.research_topic_stream, in the
+# order a client will normally see them.
+SEARCH_COMPLETE = 'search_complete'
+ARTICLE_FETCHED = 'article_fetched'
+ARTICLE_PROCESSED = 'article_processed'
+ANALYSIS_COMPLETE = 'analysis_complete'
+ERROR = 'error'
+
+
+@dataclass
+class ResearchEvent:
+    """A partial result from one stage of a streaming research run."""
+    type: str
+    data: Dict = field(default_factory=dict)
+    timestamp: str = field(default_factory=lambda: datetime.now().isoformat())
+
+    def to_dict(self) -> Dict:
+        return {'type': self.type, 'data': self.data, 'timestamp': self.timestamp}
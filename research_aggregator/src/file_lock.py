@@ -0,0 +1,49 @@
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Without flock the lock can only cover threads of this process
+_thread_locks: Dict[str, threading.RLock] = {}
+_thread_locks_guard = threading.Lock()
+
+
+@contextmanager
+def file_lock(path: Union[str, Path], shared: bool = False, blocking: bool = True):
+    """Hold an advisory lock on `path` shared by every process using the same data directory.
+
+    Each call opens its own descriptor, so threads of one process exclude
+    each other just as separate processes do. A shared lock admits other
+    shared holders; an exclusive one admits nobody. With `blocking=False`
+    a lock that is held elsewhere raises BlockingIOError at once.
+    """
+    path = Path(path)
+    if fcntl is None:
+        with _thread_locks_guard:
+            lock = _thread_locks.setdefault(str(path.resolve()), threading.RLock())
+        if not lock.acquire(blocking=blocking):
+            raise BlockingIOError(f"{path} is locked")
+        try:
+            yield
+        finally:
+            lock.release()
+        return
+
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        flags = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        if not blocking:
+            flags |= fcntl.LOCK_NB
+        fcntl.flock(fd, flags)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
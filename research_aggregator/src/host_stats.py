@@ -0,0 +1,114 @@
+import threading
+from collections import defaultdict, deque
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+
+class HostStats:
+    """Per-host latency and failure statistics used to schedule fetches.
+
+    Latency is tracked as an exponentially weighted mean plus a window of
+    recent samples for the hedge delay (p95). URLs are ranked by the
+    expected time to obtain a good article from their host, latency divided
+    by success probability, so fast and reliable hosts go first. Hosts that
+    keep failing are not admitted, except for an occasional probe so they
+    can recover.
+    """
+
+    def __init__(self, alpha: float = 0.2, window: int = 50, default_latency: float = 2.0,
+                 min_samples: int = 3, max_failure_rate: float = 0.8, probe_every: int = 10,
+                 min_hedge_delay: float = 0.25, max_hedge_delay: float = 5.0):
+        self.alpha = alpha
+        self.window = window
+        self.default_latency = default_latency
+        self.min_samples = min_samples
+        self.max_failure_rate = max_failure_rate
+        self.probe_every = probe_every
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_delay = max_hedge_delay
+        self._lock = threading.Lock()
+        self.hosts: Dict[str, Dict] = defaultdict(lambda: {
+            'latency': None,
+            'failure_rate': 0.0,
+            'samples': 0,
+            'recent': deque(maxlen=self.window),
+            'rejections': 0
+        })
+
+    @staticmethod
+    def host_of(url: str) -> str:
+        return urlparse(url).netloc.lower()
+
+    def record(self, host: str, latency: float, success: bool):
+        with self._lock:
+            stats = self.hosts[host]
+            stats['latency'] = latency if stats['latency'] is None else (
+                self.alpha * latency + (1 - self.alpha) * stats['latency']
+            )
+            stats['failure_rate'] = self.alpha * (0.0 if success else 1.0) + (1 - self.alpha) * stats['failure_rate']
+            stats['samples'] += 1
+            stats['recent'].append(latency)
+
+    def seed(self, source_stats: Dict[str, Dict]):
+        """Prime failure rates from historical per-domain success counts."""
+        with self._lock:
+            for domain, counts in source_stats.items():
+                stats = self.hosts[domain.lower()]
+                if stats['samples'] == 0 and counts.get('total'):
+                    stats['failure_rate'] = 1 - counts['success'] / counts['total']
+
+    def expected_latency(self, host: str) -> float:
+        stats = self.hosts.get(host)
+        if not stats or stats['latency'] is None:
+            return self.default_latency
+        return stats['latency']
+
+    def hedge_delay(self, host: str) -> float:
+        """How long to wait on a request before sending a backup: the host's p95."""
+        stats = self.hosts.get(host)
+        if not stats or len(stats['recent']) < self.min_samples:
+            delay = self.default_latency
+        else:
+            ordered = sorted(stats['recent'])
+            delay = ordered[int(0.95 * (len(ordered) - 1))]
+        return min(self.max_hedge_delay, max(self.min_hedge_delay, delay))
+
+    def score(self, host: str) -> float:
+        """Expected seconds to a successful fetch from `host`; lower is better."""
+        failure_rate = self.hosts[host]['failure_rate'] if host in self.hosts else 0.0
+        return self.expected_latency(host) / max(1.0 - failure_rate, 0.05)
+
+    def admit(self, url: str) -> bool:
+        """Whether to fetch from this URL's host at all."""
+        host = self.host_of(url)
+        with self._lock:
+            stats = self.hosts.get(host)
+            if not stats or stats['samples'] < self.min_samples or stats['failure_rate'] <= self.max_failure_rate:
+                return True
+            stats['rejections'] += 1
+            # Let an occasional request through so a recovered host can earn its way back
+            return stats['rejections'] % self.probe_every == 0
+
+    def rank(self, urls: Iterable[str], preferred_domains: Optional[List[str]] = None) -> List[str]:
+        """Admitted URLs, best host first. Preferred domains get their score halved."""
+        preferred = [domain.lower() for domain in (preferred_domains or [])]
+
+        def key(url):
+            host = self.host_of(url)
+            bonus = 0.5 if any(host == d or host.endswith('.' + d) for d in preferred) else 1.0
+            return self.score(host) * bonus
+
+        # sorted() is stable, so search-engine order breaks ties
+        return sorted((url for url in urls if self.admit(url)), key=key)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {
+                host: {
+                    'latency': stats['latency'],
+                    'failure_rate': stats['failure_rate'],
+                    'samples': stats['samples'],
+                    'hedge_delay': self.hedge_delay(host)
+                }
+                for host, stats in self.hosts.items()
+            }
@@ -0,0 +1,190 @@
+import asyncio
+import contextvars
+import functools
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+
+class Span:
+    """A timed unit of work, possibly nested inside a parent span."""
+
+    def __init__(self, name: str, parent: Optional['Span'] = None, **attributes):
+        self.name = name
+        self.parent = parent
+        self.attributes = attributes
+        self.children: List['Span'] = []
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+
+    @property
+    def path(self) -> str:
+        return f"{self.parent.path}/{self.name}" if self.parent else self.name
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'duration_ms': round(self.duration * 1000, 3) if self.duration is not None else None,
+            'attributes': self.attributes,
+            'error': self.error,
+            'children': [child.to_dict() for child in self.children]
+        }
+
+
+class Histogram:
+    """Count, sum and a bounded window of recent samples for percentiles."""
+
+    def __init__(self, max_samples: int = 10000):
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+        self.samples = deque(maxlen=max_samples)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.samples.append(value)
+
+    def percentile(self, q: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        rank = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+        return ordered[rank]
+
+    def summary(self) -> Dict:
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'mean': self.total / self.count,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99)
+        }
+
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar('current_span', default=None)
+
+
+class Metrics:
+    """Process-wide registry of timing spans, counters and histograms.
+
+    Use `span()` as a context manager or `timed()` as a decorator around each
+    pipeline stage. Span durations are recorded in milliseconds under the
+    histogram `<name>.ms`; completed root spans are kept as trace trees.
+    """
+
+    def __init__(self, max_samples: int = 10000, max_traces: int = 100):
+        self._lock = threading.Lock()
+        self.max_samples = max_samples
+        self.counters: Dict[str, float] = defaultdict(float)
+        self.histograms: Dict[str, Histogram] = {}
+        self.traces = deque(maxlen=max_traces)
+        self.enabled = True
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        if not self.enabled:
+            yield None
+            return
+        parent = _current_span.get()
+        span = Span(name, parent, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            span.duration = time.perf_counter() - span.start
+            _current_span.reset(token)
+            self.observe(f"{name}.ms", span.duration * 1000)
+            with self._lock:
+                if parent is not None:
+                    parent.children.append(span)
+                else:
+                    self.traces.append(span)
+
+    def timed(self, name: Optional[str] = None):
+        """Decorator recording a span around each call of a sync or async function."""
+        def decorator(func):
+            span_name = name or func.__qualname__
+
+            if asyncio.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(span_name):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def incr(self, name: str, value: float = 1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] += value
+
+    def observe(self, name: str, value: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram(self.max_samples)
+            self.histograms[name].observe(value)
+
+    def snapshot(self) -> Dict:
+        """Counters and histogram summaries (count, mean, p50/p95/p99)."""
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'histograms': {name: h.summary() for name, h in self.histograms.items()}
+            }
+
+    def recent_traces(self, limit: int = 10) -> List[Dict]:
+        with self._lock:
+            return [span.to_dict() for span in list(self.traces)[-limit:]]
+
+    def export_json(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({**self.snapshot(), 'traces': self.recent_traces()}, f, indent=2)
+
+    def report(self) -> str:
+        """Human-readable per-stage latency table."""
+        snapshot = self.snapshot()
+        lines = [f"{'stage':<32}{'count':>8}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}"]
+        for name, h in sorted(snapshot['histograms'].items()):
+            if h['count']:
+                lines.append(f"{name:<32}{h['count']:>8}{h['p50']:>12.1f}{h['p95']:>12.1f}{h['p99']:>12.1f}")
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f"{name:<32}{value:>8g}")
+        return "\n".join(lines)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.traces.clear()
+
+
+def run_in_context(func, *args):
+    """Bind `func` to the caller's context so spans nest across executor threads."""
+    return functools.partial(contextvars.copy_context().run, func, *args)
+
+
+metrics = Metrics()
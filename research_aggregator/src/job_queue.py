@@ -0,0 +1,421 @@
+import abc
+import asyncio
+import atexit
+import inspect
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from instrumentation import metrics
+
+QUEUED = 'queued'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+@dataclass
+class Task:
+    stage: str
+    payload: Dict
+    id: int = 0
+    key: Optional[str] = None
+    attempts: int = 0
+    # Identifies one delivery; acks from a delivery whose lease ran out are ignored
+    token: str = ''
+
+
+class Broker(abc.ABC):
+    """Durable task queues, one per stage, with at-least-once delivery.
+
+    A claimed task is leased to its worker for `lease_seconds`; unless it
+    is acked, retried or failed by then it is handed out again, so a
+    worker that dies loses nothing but its work in progress. Handlers
+    must therefore tolerate seeing a task twice. `put` with a `key` adds
+    the task only if no task with that key was ever added, which makes
+    re-enqueueing from a redelivered task harmless.
+
+    Results are kept per group (e.g. per research run) under a name, so
+    the last stage of a fan-out can tell when all its inputs are in.
+    Payloads and results must be JSON-serializable.
+
+    MemoryBroker serves a single process and tests; SQLiteBroker serves
+    any number of worker processes on one host. A networked backend
+    (Redis, Postgres) implements the same methods to spread stages
+    across machines.
+    """
+
+    @abc.abstractmethod
+    def put(self, stage: str, payload: Dict, key: Optional[str] = None, delay: float = 0) -> bool:
+        """Enqueue a task; returns False if `key` was already used."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def claim(self, stage: str, max_tasks: int = 1, lease_seconds: float = 300) -> List[Task]:
+        """Lease up to `max_tasks` ready tasks of `stage`, oldest first."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def ack(self, task: Task) -> bool:
+        """Mark a task done; returns False if its lease had run out and it was handed to someone else."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def retry(self, task: Task, delay: float = 0, error: Optional[str] = None) -> bool:
+        """Put a task back to be claimed again after `delay` seconds."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def fail(self, task: Task, error: Optional[str] = None) -> bool:
+        """Give up on a task; it is kept, with its error, but never delivered again."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def counts(self, stage: Optional[str] = None) -> Dict[str, int]:
+        """Number of tasks per status, for one stage or all."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def save_result(self, group: str, name: str, value: Any) -> int:
+        """Store (or overwrite) a named result; returns how many results `group` now holds."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def results(self, group: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryBroker(Broker):
+    """In-process broker for tests and single-process runs.
+
+    Payloads are round-tripped through JSON so anything that works here
+    also works with a durable broker.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tasks: Dict[int, Dict] = {}
+        self._keys = set()
+        self._results: Dict[str, Dict[str, str]] = {}
+        self._next_id = 1
+
+    def put(self, stage: str, payload: Dict, key: Optional[str] = None, delay: float = 0) -> bool:
+        encoded = json.dumps(payload, default=str)
+        with self._lock:
+            if key is not None:
+                if key in self._keys:
+                    return False
+                self._keys.add(key)
+            self._tasks[self._next_id] = {
+                'id': self._next_id, 'stage': stage, 'key': key, 'payload': encoded, 'status': QUEUED,
+                'attempts': 0, 'available_at': time.time() + delay, 'lease_until': 0, 'token': '', 'error': None
+            }
+            self._next_id += 1
+        return True
+
+    def claim(self, stage: str, max_tasks: int = 1, lease_seconds: float = 300) -> List[Task]:
+        now = time.time()
+        claimed = []
+        with self._lock:
+            for row in self._tasks.values():
+                if len(claimed) >= max_tasks:
+                    break
+                ready = ((row['status'] == QUEUED and row['available_at'] <= now) or
+                         (row['status'] == LEASED and row['lease_until'] <= now))
+                if row['stage'] != stage or not ready:
+                    continue
+                row.update(status=LEASED, lease_until=now + lease_seconds, token=uuid.uuid4().hex,
+                           attempts=row['attempts'] + 1)
+                claimed.append(Task(stage, json.loads(row['payload']), row['id'], row['key'], row['attempts'],
+                                    row['token']))
+        return claimed
+
+    def _settle(self, task: Task, **changes) -> bool:
+        with self._lock:
+            row = self._tasks.get(task.id)
+            if row is None or row['status'] != LEASED or row['token'] != task.token:
+                return False
+            row.update(changes)
+            return True
+
+    def ack(self, task: Task) -> bool:
+        return self._settle(task, status=DONE, payload='null')
+
+    def retry(self, task: Task, delay: float = 0, error: Optional[str] = None) -> bool:
+        return self._settle(task, status=QUEUED, available_at=time.time() + delay, error=error)
+
+    def fail(self, task: Task, error: Optional[str] = None) -> bool:
+        return self._settle(task, status=FAILED, error=error)
+
+    def counts(self, stage: Optional[str] = None) -> Dict[str, int]:
+        counts = {QUEUED: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        with self._lock:
+            for row in self._tasks.values():
+                if stage is None or row['stage'] == stage:
+                    counts[row['status']] += 1
+        return counts
+
+    def save_result(self, group: str, name: str, value: Any) -> int:
+        encoded = json.dumps(value, default=str)
+        with self._lock:
+            self._results.setdefault(group, {})[name] = encoded
+            return len(self._results[group])
+
+    def results(self, group: str) -> Dict[str, Any]:
+        with self._lock:
+            return {name: json.loads(value) for name, value in self._results.get(group, {}).items()}
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    stage TEXT NOT NULL,
+    key TEXT UNIQUE,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    lease_until REAL NOT NULL DEFAULT 0,
+    token TEXT NOT NULL DEFAULT '',
+    error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_ready ON tasks (stage, status, available_at);
+
+CREATE TABLE IF NOT EXISTS results (
+    group_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (group_id, name)
+);
+"""
+
+
+class SQLiteBroker(Broker):
+    """Broker on a SQLite database shared by worker processes on one host.
+
+    Claims take the database's write lock (BEGIN IMMEDIATE), so two
+    workers never lease the same delivery. Done tasks keep their key so it
+    stays deduplicated; `purge()` drops old ones.
+    """
+
+    def __init__(self, path: str = "data/queue/broker.db"):
+        self.logger = logging.getLogger(__name__)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        atexit.register(self.close)
+
+    def _transaction(self, work: Callable[[sqlite3.Connection], Any]) -> Any:
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(self.conn)
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+            return result
+
+    def put(self, stage: str, payload: Dict, key: Optional[str] = None, delay: float = 0) -> bool:
+        now = time.time()
+        cursor = self._transaction(lambda conn: conn.execute(
+            "INSERT OR IGNORE INTO tasks (stage, key, payload, status, available_at, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (stage, key, json.dumps(payload, default=str), QUEUED, now + delay, now)
+        ))
+        return cursor.rowcount == 1
+
+    def claim(self, stage: str, max_tasks: int = 1, lease_seconds: float = 300) -> List[Task]:
+        def work(conn):
+            now = time.time()
+            rows = conn.execute(
+                "SELECT id, key, payload, attempts FROM tasks WHERE stage = ? AND "
+                "((status = ? AND available_at <= ?) OR (status = ? AND lease_until <= ?)) ORDER BY id LIMIT ?",
+                (stage, QUEUED, now, LEASED, now, max_tasks)
+            ).fetchall()
+            claimed = []
+            for row in rows:
+                token = uuid.uuid4().hex
+                conn.execute(
+                    "UPDATE tasks SET status = ?, lease_until = ?, token = ?, attempts = attempts + 1 WHERE id = ?",
+                    (LEASED, now + lease_seconds, token, row['id'])
+                )
+                claimed.append(Task(stage, json.loads(row['payload']), row['id'], row['key'],
+                                    row['attempts'] + 1, token))
+            return claimed
+        return self._transaction(work)
+
+    def _settle(self, task: Task, assignments: str, params: tuple) -> bool:
+        cursor = self._transaction(lambda conn: conn.execute(
+            f"UPDATE tasks SET {assignments} WHERE id = ? AND status = ? AND token = ?",
+            (*params, task.id, LEASED, task.token)
+        ))
+        return cursor.rowcount == 1
+
+    def ack(self, task: Task) -> bool:
+        return self._settle(task, "status = ?, payload = 'null'", (DONE,))
+
+    def retry(self, task: Task, delay: float = 0, error: Optional[str] = None) -> bool:
+        return self._settle(task, "status = ?, available_at = ?, error = ?", (QUEUED, time.time() + delay, error))
+
+    def fail(self, task: Task, error: Optional[str] = None) -> bool:
+        return self._settle(task, "status = ?, error = ?", (FAILED, error))
+
+    def counts(self, stage: Optional[str] = None) -> Dict[str, int]:
+        counts = {QUEUED: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        with self._lock:
+            if stage is None:
+                rows = self.conn.execute("SELECT status, COUNT(*) AS n FROM tasks GROUP BY status")
+            else:
+                rows = self.conn.execute("SELECT status, COUNT(*) AS n FROM tasks WHERE stage = ? GROUP BY status",
+                                         (stage,))
+            counts.update({row['status']: row['n'] for row in rows})
+        return counts
+
+    def save_result(self, group: str, name: str, value: Any) -> int:
+        def work(conn):
+            conn.execute("INSERT OR REPLACE INTO results (group_id, name, value) VALUES (?, ?, ?)",
+                         (group, name, json.dumps(value, default=str)))
+            return conn.execute("SELECT COUNT(*) FROM results WHERE group_id = ?", (group,)).fetchone()[0]
+        return self._transaction(work)
+
+    def results(self, group: str) -> Dict[str, Any]:
+        with self._lock:
+            rows = self.conn.execute("SELECT name, value FROM results WHERE group_id = ?", (group,)).fetchall()
+        return {row['name']: json.loads(row['value']) for row in rows}
+
+    def purge(self, older_than_seconds: float = 7 * 86400) -> int:
+        """Delete done and failed tasks created more than `older_than_seconds` ago; returns how many."""
+        cursor = self._transaction(lambda conn: conn.execute(
+            "DELETE FROM tasks WHERE status IN (?, ?) AND created_at < ?",
+            (DONE, FAILED, time.time() - older_than_seconds)
+        ))
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            try:
+                self.conn.close()
+            except sqlite3.ProgrammingError:
+                pass
+
+
+@dataclass
+class Stage:
+    """One pipeline stage: its handler and how it is run.
+
+    `handler` takes a list of up to `batch_size` tasks and may be a
+    coroutine function. If it raises, every task in the batch is retried
+    with exponential backoff; after `max_attempts` deliveries a task is
+    failed and `on_give_up(task, error)` is called.
+    """
+    name: str
+    handler: Callable[[List[Task]], Any]
+    workers: int = 1
+    batch_size: int = 1
+    max_attempts: int = 3
+    lease_seconds: float = 300
+    retry_delay: float = 1.0
+    on_give_up: Optional[Callable[[Task, Exception], None]] = None
+
+
+class StageWorkers:
+    """Worker threads pulling tasks for each stage from a broker.
+
+    Each stage gets its own `workers` threads, so a process can run many
+    fetch workers and a single NLP worker, or only some of the stages;
+    start more processes (on more machines, with a shared broker) to add
+    capacity to whichever stage is behind.
+    """
+
+    def __init__(self, broker: Broker, stages: List[Stage], poll_seconds: float = 0.5):
+        self.logger = logging.getLogger(__name__)
+        self.broker = broker
+        self.stages = stages
+        self.poll_seconds = poll_seconds
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        self._stop.clear()
+        for stage in self.stages:
+            for i in range(stage.workers):
+                thread = threading.Thread(target=self._work, args=(stage,), name=f"{stage.name}-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop claiming new tasks and wait for the ones in progress."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def run_forever(self):
+        self.start()
+        try:
+            while any(thread.is_alive() for thread in self._threads):
+                time.sleep(self.poll_seconds)
+        finally:
+            self.stop()
+
+    def _work(self, stage: Stage):
+        # Async handlers (the scraper) run on this thread's own event loop
+        loop = asyncio.new_event_loop()
+        try:
+            while not self._stop.is_set():
+                try:
+                    tasks = self.broker.claim(stage.name, stage.batch_size, stage.lease_seconds)
+                except Exception as e:
+                    self.logger.error(f"Error claiming {stage.name} tasks: {str(e)}")
+                    tasks = []
+                if not tasks:
+                    self._stop.wait(self.poll_seconds)
+                    continue
+                self.run_batch(stage, tasks, loop)
+        finally:
+            loop.close()
+
+    def run_batch(self, stage: Stage, tasks: List[Task], loop: asyncio.AbstractEventLoop):
+        try:
+            with metrics.span('stage', stage=stage.name, tasks=len(tasks)):
+                result = stage.handler(tasks)
+                if inspect.isawaitable(result):
+                    loop.run_until_complete(result)
+        except Exception as e:
+            self.logger.error(f"Error in {stage.name} stage: {str(e)}")
+            for task in tasks:
+                self._retry_or_fail(stage, task, e)
+            return
+        for task in tasks:
+            if not self.broker.ack(task):
+                # The lease ran out first; the task was handed out again
+                metrics.incr('queue.late_ack')
+        metrics.incr(f'queue.{stage.name}.done', len(tasks))
+
+    def _retry_or_fail(self, stage: Stage, task: Task, error: Exception):
+        if task.attempts < stage.max_attempts:
+            metrics.incr(f'queue.{stage.name}.retried')
+            self.broker.retry(task, stage.retry_delay * 2 ** (task.attempts - 1), str(error))
+            return
+        metrics.incr(f'queue.{stage.name}.failed')
+        if self.broker.fail(task, str(error)) and stage.on_give_up is not None:
+            try:
+                stage.on_give_up(task, error)
+            except Exception as e:
+                self.logger.error(f"Error giving up on {stage.name} task {task.id}: {str(e)}")
@@ -1,25 +1,44 @@
-from scraper import WebScraper
-from nlp_processor import NLPProcessor
+from startup import StartupProfile
+
+profile = StartupProfile("cli")
+with profile.phase("import pipeline modules"):
+    from scraper import WebScraper
+    from nlp_processor import NLPProcessor
+    from query_index import QueryIndex
+    from result_cache import ResultCache
+    from memory_store import MemoryStore
+    from result_store import ResultStore
+    from corpus_store import CorpusStore
+    from entity_index import EntityIndex
+    from instrumentation import metrics, run_in_context
+    from deadline import Deadline
+    from events import (
+        ResearchEvent, SEARCH_COMPLETE, ARTICLE_FETCHED, ARTICLE_PROCESSED, ANALYSIS_COMPLETE, ERROR
+    )
 import logging
-from typing import Dict, List
+from typing import AsyncIterator, Dict, List, Optional
 import json
 from datetime import datetime
 import os
+import time
 import asyncio
 from pathlib import Path
-import pandas as pd
-from collections import defaultdict
-import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from concurrent.futures import ThreadPoolExecutor
 
 class ResearchAggregator:
-    def __init__(self):
+    # Share of the time remaining when each stage starts; combine gets whatever is left
+    DEADLINE_SHARES = {'search': 0.2, 'articles': 0.75}
+
+    def __init__(self, scraper: WebScraper = None, nlp_processor: NLPProcessor = None):
         self.setup_logging()
-        self.scraper = WebScraper()
-        self.nlp_processor = NLPProcessor()
+        self.scraper = scraper or WebScraper()
+        self.nlp_processor = nlp_processor or NLPProcessor()
+        # NLP models are not safe to share across threads; run them one at a time off the event loop
+        self.nlp_executor = ThreadPoolExecutor(max_workers=1)
         self.setup_output_directory()
         self.setup_memory()
+        self.setup_result_cache()
+        self.setup_corpus_store()
 
     def setup_logging(self):
         logging.basicConfig(
@@ -29,50 +48,61 @@ class ResearchAggregator:
         self.logger = logging.getLogger(__name__)
 
     def setup_output_directory(self):
-        """Create output directory if it doesn't exist."""
+        """Create the result store if it doesn't exist."""
         self.output_dir = Path("data/research_outputs")
-        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.result_store = ResultStore(self.output_dir)
 
     def setup_memory(self):
         """Initialize memory components."""
-        self.query_history = []
-        self.topic_memory = defaultdict(list)
-        self.source_effectiveness = defaultdict(lambda: {'success': 0, 'total': 0})
-        self.vectorizer = TfidfVectorizer()
-        self.query_vectors = None
-        self.query_texts = []
-
-    def save_results(self, results: Dict, query: str):
-        """Save research results to a JSON file."""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = self.output_dir / f"research_{timestamp}.json"
-        
-        output = {
-            'query': query,
-            'timestamp': timestamp,
-            'results': results
+        self.memory_dir = Path("data/memory")
+        self.memory_dir.mkdir(parents=True, exist_ok=True)
+        self.memory = MemoryStore(self.memory_dir / "memory.db")
+        # Historical per-domain success rates inform which hosts the scraper tries first
+        self.scraper.host_stats.seed(self.memory.get_source_stats())
+        self.query_index = QueryIndex(self.memory_dir / "query_index.jsonl")
+        # Entities and key phrases of every article processed, across runs
+        self.entity_index = EntityIndex(self.memory_dir / "entity_index.jsonl")
+        self.nlp_processor.entity_index = self.entity_index
+
+    def setup_result_cache(self, **cache_options):
+        """Initialize the semantic result cache (see ResultCache for options)."""
+        self.result_cache = ResultCache(**cache_options)
+
+    def setup_corpus_store(self):
+        """Every fetched article and its analysis is also kept in a columnar corpus for bulk reprocessing."""
+        self.corpus = CorpusStore("data/corpus")
+
+    def record_corpus(self, processed_articles: List[Dict]):
+        """Append newly processed articles to the corpus store."""
+        try:
+            self.corpus.add_processed(processed_articles, self.nlp_processor.model_version)
+            # One small file per run; the store merges a day's files once they pile up
+            self.corpus.flush()
+        except Exception as e:
+            # The corpus is for later analytics; never fail a research run over it
+            self.logger.error(f"Error writing to the corpus store: {str(e)}")
+
+    def save_results(self, results: Dict, query: str) -> str:
+        """Append research results to the result store and return their id."""
+        record_id = self.result_store.append(query, results)
+        self.logger.info(f"Results saved to {self.output_dir} as {record_id}")
+        return record_id
+
+    def format_article(self, article: Dict) -> Dict:
+        """Format a processed article for output."""
+        return {
+            'title': article['original_data']['title'],
+            'url': article['original_data']['url'],
+            'summary': article['summary'],
+            'key_phrases': article['key_phrases'],
+            'sentiment': article['sentiment']
         }
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(output, f, indent=2, ensure_ascii=False)
-        
-        self.logger.info(f"Results saved to {filename}")
-        return filename
 
     def format_output(self, combined_analysis: Dict, processed_articles: List[Dict]) -> Dict:
         """Format the final output in a readable structure."""
         return {
             'comprehensive_analysis': combined_analysis,
-            'source_articles': [
-                {
-                    'title': article['original_data']['title'],
-                    'url': article['original_data']['url'],
-                    'summary': article['summary'],
-                    'key_phrases': article['key_phrases'],
-                    'sentiment': article['sentiment']
-                }
-                for article in processed_articles
-            ],
+            'source_articles': [self.format_article(article) for article in processed_articles],
             'metadata': {
                 'total_sources': len(processed_articles),
                 'generation_timestamp': datetime.now().isoformat()
@@ -82,27 +112,24 @@ class ResearchAggregator:
     def update_memory(self, query: str, results: Dict):
         """Update memory with new research results."""
         # Update query history
-        self.query_history.append({
-            'query': query,
-            'timestamp': datetime.now().isoformat(),
-            'result_count': len(results.get('source_articles', []))
-        })
+        self.memory.record_query(query, len(results.get('source_articles', [])))
         
         # Update topic memory
         if results.get('comprehensive_analysis'):
-            self.topic_memory[query].append({
-                'summary': results['comprehensive_analysis'].get('comprehensive_summary', ''),
-                'themes': results['comprehensive_analysis'].get('key_themes', []),
-                'topics': results['comprehensive_analysis'].get('topics', []),
-                'timestamp': datetime.now().isoformat()
-            })
+            self.memory.record_topic(
+                query,
+                results['comprehensive_analysis'].get('comprehensive_summary', ''),
+                results['comprehensive_analysis'].get('key_themes', []),
+                results['comprehensive_analysis'].get('topics', [])
+            )
         
         # Update source effectiveness
         for article in results.get('source_articles', []):
             domain = self.extract_domain(article['url'])
-            self.source_effectiveness[domain]['total'] += 1
-            if article.get('summary'):
-                self.source_effectiveness[domain]['success'] += 1
+            self.memory.record_source(domain, bool(article.get('summary')))
+        
+        # Tag the articles with the query so its top entities can be looked up
+        self.entity_index.tag(query, [article['url'] for article in results.get('source_articles', [])])
         
         # Update query vectors for similarity search
         self.update_query_vectors(query)
@@ -113,40 +140,42 @@ class ResearchAggregator:
         return urlparse(url).netloc
 
     def update_query_vectors(self, query: str):
-        """Update TF-IDF vectors for query similarity search."""
-        self.query_texts.append(query)
-        if len(self.query_texts) > 1:
-            self.query_vectors = self.vectorizer.fit_transform(self.query_texts)
-
-    def find_similar_queries(self, query: str, threshold: float = 0.3) -> List[str]:
-        """Find similar previous queries."""
-        if not self.query_vectors or len(self.query_texts) < 2:
-            return []
-        
-        query_vector = self.vectorizer.transform([query])
-        similarities = cosine_similarity(query_vector, self.query_vectors)[0]
-        similar_indices = np.where(similarities > threshold)[0]
-        
-        return [self.query_texts[i] for i in similar_indices]
+        """Append the query to the incremental similarity index."""
+        self.query_index.add(query)
+
+    def find_similar_queries(self, query: str, threshold: float = 0.3, k: int = 10) -> List[str]:
+        """Find the most similar previous queries, best match first."""
+        matches = self.query_index.search(query, k=k, threshold=threshold)
+        return [self.query_index.texts[i] for i, _ in matches]
+
+    def get_topic_entities(self, query: str, n: int = 10) -> List[Dict]:
+        """Entities mentioned by the most articles found for `query`, over all its runs."""
+        return self.entity_index.top(n, kind='entity', query=query)
 
     def get_effective_sources(self, query: str) -> List[str]:
         """Get most effective sources based on historical performance."""
-        if not self.source_effectiveness:
+        # Sorted by success rate in the store
+        source_stats = self.memory.get_source_stats(limit=5)
+        if not source_stats:
             return self.scraper.get_relevant_sources(query)
-        
-        # Calculate success rate for each source
-        source_scores = {
-            domain: stats['success'] / stats['total']
-            for domain, stats in self.source_effectiveness.items()
-            if stats['total'] > 0
-        }
-        
-        # Sort sources by success rate
-        sorted_sources = sorted(source_scores.items(), key=lambda x: x[1], reverse=True)
-        return [source for source, _ in sorted_sources[:5]]
+        return list(source_stats)
+
+    async def research_topic_stream(self, query: str, num_sources: int = 5, use_cache: bool = True,
+                                    budget: Optional[float] = None) -> AsyncIterator[ResearchEvent]:
+        """Research a topic, yielding an event as each stage produces output.
 
-    async def research_topic(self, query: str, num_sources: int = 5) -> Dict:
-        """Main method to research a topic."""
+        Articles are processed as soon as they are fetched, so the first
+        ARTICLE_PROCESSED event depends only on the fastest source. The last
+        event is ANALYSIS_COMPLETE with the full output, or ERROR.
+
+        `budget` bounds the whole run in seconds. Each stage gets a share of
+        the remaining time (DEADLINE_SHARES); a stage that runs out keeps what
+        it has, and the output's metadata['completeness'] says which stages
+        finished.
+        """
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        deadline = Deadline(budget)
         try:
             self.logger.info(f"Starting research on topic: {query}")
             
@@ -154,63 +183,194 @@ class ResearchAggregator:
             similar_queries = self.find_similar_queries(query)
             if similar_queries:
                 self.logger.info(f"Found similar previous queries: {similar_queries}")
+
+            # Reuse a cached result for a sufficiently similar recent query
+            lookup = self.result_cache.lookup(query, num_sources) if use_cache else None
+            if lookup:
+                metrics.incr(f"result_cache.{lookup.mode}")
+            if lookup and lookup.mode == 'full':
+                self.logger.info(f"Serving cached result for '{lookup.matched_query}' "
+                                 f"(similarity {lookup.similarity:.2f})")
+                lookup.output['metadata']['cache'] = lookup.metadata()
+                metrics.observe('research.ms', (time.perf_counter() - started) * 1000)
+                yield ResearchEvent(ANALYSIS_COMPLETE, {'output': lookup.output})
+                return
+            reused_articles = lookup.articles if lookup else []
+            if reused_articles:
+                self.logger.info(f"Reusing {len(reused_articles)} cached article analyses "
+                                 f"from '{lookup.matched_query}'")
             
             # Get effective sources based on history
             effective_sources = self.get_effective_sources(query)
             self.logger.info(f"Using effective sources: {effective_sources}")
             
-            # Step 1: Scrape relevant sources
-            self.logger.info("Scraping sources...")
-            articles = await self.scraper.scrape_multiple_sources(query, num_sources)
+            # Step 1: Search for sources
+            self.logger.info("Searching sources...")
+            try:
+                urls = await asyncio.wait_for(
+                    self.scraper.search_sources(
+                        query,
+                        num_sources,
+                        exclude_urls=[a['original_data']['url'] for a in reused_articles],
+                        preferred_domains=effective_sources
+                    ),
+                    deadline.child(self.DEADLINE_SHARES['search']).timeout()
+                )
+                deadline.mark('search')
+            except asyncio.TimeoutError:
+                self.logger.warning("Search ran out of time; continuing without new sources")
+                deadline.mark('search', 'timed_out')
+                urls = []
+            yield ResearchEvent(SEARCH_COMPLETE, {'urls': urls, 'reused_articles': len(reused_articles)})
+            for article in reused_articles:
+                yield ResearchEvent(ARTICLE_PROCESSED, {**self.format_article(article), 'cached': True})
+
+            # Steps 2 and 3: Scrape and process each article as it arrives
+            self.logger.info("Scraping and processing articles...")
+            processed_articles = list(reused_articles)
+            events = asyncio.Queue()
+
+            async def process(article: Dict):
+                processed = await loop.run_in_executor(
+                    self.nlp_executor, run_in_context(self.nlp_processor.process_article, article)
+                )
+                if processed:
+                    processed_articles.append(processed)
+                    await events.put(ResearchEvent(ARTICLE_PROCESSED, self.format_article(processed)))
+
+            async def fetch_and_process():
+                wanted = num_sources - len(reused_articles)
+                processing = []
+                try:
+                    if wanted > 0:
+                        # Stop fetching once enough articles are in; the rest are cancelled
+                        stream = self.scraper.iter_scraped_articles(urls)
+                        try:
+                            async for article in stream:
+                                await events.put(ResearchEvent(ARTICLE_FETCHED, {
+                                    'title': article['title'],
+                                    'url': article['url']
+                                }))
+                                processing.append(asyncio.ensure_future(process(article)))
+                                if len(processing) >= wanted:
+                                    break
+                        finally:
+                            await stream.aclose()
+                    await asyncio.gather(*processing)
+                finally:
+                    await events.put(None)
+
+            articles_deadline = deadline.child(self.DEADLINE_SHARES['articles'])
+            producer = asyncio.ensure_future(fetch_and_process())
+            try:
+                while True:
+                    try:
+                        event = await asyncio.wait_for(events.get(), articles_deadline.timeout())
+                    except asyncio.TimeoutError:
+                        # Cancelling the producer also cancels in-flight fetches
+                        self.logger.warning(f"Article stage ran out of time with "
+                                            f"{len(processed_articles)} articles processed")
+                        deadline.mark('articles', 'partial' if processed_articles else 'timed_out')
+                        break
+                    if event is None:
+                        await producer
+                        deadline.mark('articles')
+                        break
+                    yield event
+            finally:
+                producer.cancel()
             
-            if not articles:
+            if not processed_articles:
                 self.logger.warning("No articles found for the query")
-                return {}
+                yield ResearchEvent(ERROR, {
+                    'message': "No articles found for the query",
+                    'completeness': deadline.completeness()
+                })
+                return
             
-            # Step 2: Process each article
-            self.logger.info("Processing articles...")
-            processed_articles = [
-                self.nlp_processor.process_article(article)
-                for article in articles
-            ]
-            
-            # Step 3: Combine and analyze all summaries
+            # Step 4: Combine and analyze all summaries
             self.logger.info("Combining and analyzing summaries...")
-            combined_analysis = self.nlp_processor.combine_summaries(processed_articles)
+            combined_analysis = None
+            if deadline.expired():
+                deadline.mark('combine', 'skipped')
+            else:
+                try:
+                    # A timed-out combine keeps running in the NLP thread; only its result is dropped
+                    combined_analysis = await asyncio.wait_for(
+                        loop.run_in_executor(
+                            self.nlp_executor,
+                            run_in_context(self.nlp_processor.combine_summaries, processed_articles)
+                        ),
+                        deadline.timeout()
+                    )
+                    deadline.mark('combine')
+                except asyncio.TimeoutError:
+                    deadline.mark('combine', 'timed_out')
+            if combined_analysis is None:
+                self.logger.warning("No time left to combine summaries; merging article results instead")
+                combined_analysis = self.nlp_processor.quick_combine(processed_articles)
             
-            # Step 4: Format the final output
+            # Step 5: Format the final output
             final_output = self.format_output(combined_analysis, processed_articles)
+            final_output['metadata']['completeness'] = deadline.completeness()
+            if lookup:
+                final_output['metadata']['cache'] = lookup.metadata()
             
-            # Step 5: Update memory
-            self.update_memory(query, final_output)
-            
-            # Step 6: Save results
-            self.save_results(final_output, query)
+            with metrics.span('persistence'):
+                # Step 6: Update memory
+                self.update_memory(query, final_output)
+                # A partial run is cached for its article analyses only, never served as a full hit
+                complete = final_output['metadata']['completeness']['complete']
+                self.result_cache.put(query, num_sources if complete else 0, final_output, processed_articles)
+                
+                # Step 7: Save results
+                self.save_results(final_output, query)
+                self.record_corpus(processed_articles[len(reused_articles):])
             
-            return final_output
+            if not final_output['metadata']['completeness']['complete']:
+                metrics.incr('research.partial')
+            metrics.observe('research.ms', (time.perf_counter() - started) * 1000)
+            yield ResearchEvent(ANALYSIS_COMPLETE, {'output': final_output})
             
         except Exception as e:
             self.logger.error(f"Error in research process: {str(e)}")
-            return {}
+            yield ResearchEvent(ERROR, {'message': str(e)})
 
-    def get_research_history(self) -> Dict:
-        """Get the research history and insights."""
+    async def research_topic(self, query: str, num_sources: int = 5, use_cache: bool = True,
+                             budget: Optional[float] = None) -> Dict:
+        """Main method to research a topic, optionally within `budget` seconds."""
+        async for event in self.research_topic_stream(query, num_sources, use_cache, budget):
+            if event.type == ANALYSIS_COMPLETE:
+                return event.data['output']
+        return {}
+
+    def get_research_history(self, limit: int = 100) -> Dict:
+        """Get the most recent research history and insights."""
         return {
-            'query_history': self.query_history,
-            'topic_memory': dict(self.topic_memory),
-            'source_effectiveness': dict(self.source_effectiveness),
-            'total_queries': len(self.query_history)
+            'query_history': self.memory.get_query_history(limit=limit),
+            'topic_memory': self.memory.get_topic_memory(limit=limit),
+            'source_effectiveness': self.memory.get_source_stats(),
+            'total_queries': self.memory.count_queries()
         }
 
 async def main():
     # Example usage
-    aggregator = ResearchAggregator()
+    with profile.phase("construct aggregator"):
+        aggregator = ResearchAggregator()
+    profile.log_if_enabled()
     
     # Get query from user
     query = input("Enter your research query: ")
     
-    # Perform research
-    results = await aggregator.research_topic(query)
+    # Perform research, reporting progress as each stage completes
+    results = {}
+    async for event in aggregator.research_topic_stream(query):
+        if event.type == SEARCH_COMPLETE:
+            print(f"Found {len(event.data['urls'])} candidate sources")
+        elif event.type == ARTICLE_PROCESSED:
+            print(f"Analyzed: {event.data['title']}")
+        elif event.type == ANALYSIS_COMPLETE:
+            results = event.data['output']
     
     # Print results
     if results:
@@ -236,5 +396,10 @@ async def main():
     else:
         print("No results found for the query.")
 
+    print("\nStage Timings:")
+    print(metrics.report())
+    print("\nMemory:")
+    print(aggregator.nlp_processor.memory.report())
+
 if __name__ == "__main__":
     asyncio.run(main()) 
\ No newline at end of file
@@ -0,0 +1,148 @@
+import gc
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from instrumentation import metrics
+
+
+def rss_bytes() -> Optional[int]:
+    """Current resident set size of this process, where /proc is available."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def model_nbytes(model) -> Optional[int]:
+    """Bytes held by a torch-backed model's parameters and buffers, or None if it has none.
+
+    Works on transformers pipelines (through `.model`) and on
+    sentence-transformers models, which are torch modules themselves.
+    """
+    module = getattr(model, 'model', model)
+    if not hasattr(module, 'parameters'):
+        return None
+    try:
+        tensors = list(module.parameters()) + list(module.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    except Exception:
+        return None
+
+
+class MemoryGovernor:
+    """Keep a process's models and indexes within a memory budget.
+
+    Components register with a function that reports their current size
+    and, if they can be dropped and rebuilt later (models), a function
+    that unloads them. `touch()` marks a component as used. Before and
+    after a model loads, `make_room()` unloads the least recently used
+    unloadable components until the total fits `budget_bytes`; the model
+    being loaded is never the one evicted. Without a budget nothing is
+    unloaded and the governor only reports usage.
+    """
+
+    def __init__(self, budget_bytes: Optional[int] = None):
+        self.logger = logging.getLogger(__name__)
+        self.budget_bytes = budget_bytes
+        self._lock = threading.RLock()
+        self._components: Dict[str, Dict] = {}
+        # Sizes of unloaded models, to make room before they load again
+        self._last_sizes: Dict[str, int] = {}
+
+    @classmethod
+    def from_env(cls) -> 'MemoryGovernor':
+        """Budget from NLP_MEMORY_BUDGET_MB; unset or 0 means unlimited."""
+        budget_mb = float(os.getenv("NLP_MEMORY_BUDGET_MB", "0"))
+        return cls(int(budget_mb * 1024 * 1024) if budget_mb > 0 else None)
+
+    def register(self, name: str, size: Callable[[], int], unload: Optional[Callable[[], None]] = None):
+        with self._lock:
+            self._components[name] = {'size': size, 'unload': unload, 'last_used': time.monotonic()}
+
+    def unregister(self, name: str):
+        with self._lock:
+            self._components.pop(name, None)
+
+    def touch(self, name: str):
+        component = self._components.get(name)
+        if component is not None:
+            component['last_used'] = time.monotonic()
+
+    def expected_size(self, name: str) -> int:
+        """What `name` took the last time it was loaded (0 if never)."""
+        return self._last_sizes.get(name, 0)
+
+    def sizes(self) -> Dict[str, int]:
+        with self._lock:
+            components = list(self._components.items())
+        sizes = {}
+        for name, component in components:
+            try:
+                sizes[name] = int(component['size']() or 0)
+            except Exception as e:
+                self.logger.error(f"Error measuring {name}: {str(e)}")
+                sizes[name] = 0
+        return sizes
+
+    def total(self) -> int:
+        return sum(self.sizes().values())
+
+    def make_room(self, incoming_bytes: int = 0, keep: Optional[str] = None) -> int:
+        """Unload least recently used components until `incoming_bytes` more fits; returns bytes freed."""
+        if self.budget_bytes is None:
+            return 0
+        with self._lock:
+            sizes = self.sizes()
+            total = sum(sizes.values()) + incoming_bytes
+            freed = 0
+            candidates = sorted(
+                (name for name, component in self._components.items()
+                 if component['unload'] is not None and name != keep),
+                key=lambda name: self._components[name]['last_used']
+            )
+            for name in candidates:
+                if total <= self.budget_bytes:
+                    break
+                self.evict(name)
+                total -= sizes[name]
+                freed += sizes[name]
+            if total > self.budget_bytes:
+                self.logger.warning(f"Memory budget of {self.budget_bytes / 2 ** 20:.0f} MB exceeded "
+                                    f"({total / 2 ** 20:.0f} MB) with nothing left to unload")
+            return freed
+
+    def evict(self, name: str):
+        with self._lock:
+            component = self._components.pop(name, None)
+            if component is None:
+                return
+            self._last_sizes[name] = int(component['size']() or 0)
+            component['unload']()
+        gc.collect()
+        metrics.incr('memory.evictions')
+        self.logger.info(f"Unloaded {name} ({self._last_sizes[name] / 2 ** 20:.0f} MB) to stay within budget")
+
+    def usage(self) -> Dict:
+        """Per-component bytes, their total, the budget and the process RSS."""
+        sizes = self.sizes()
+        return {
+            'components': sizes,
+            'total_bytes': sum(sizes.values()),
+            'budget_bytes': self.budget_bytes,
+            'rss_bytes': rss_bytes()
+        }
+
+    def report(self) -> str:
+        usage = self.usage()
+        lines = [f"{name:<20} {size / 2 ** 20:>9.1f} MB"
+                 for name, size in sorted(usage['components'].items(), key=lambda item: -item[1])]
+        lines.append(f"{'total':<20} {usage['total_bytes'] / 2 ** 20:>9.1f} MB")
+        if usage['budget_bytes'] is not None:
+            lines.append(f"{'budget':<20} {usage['budget_bytes'] / 2 ** 20:>9.1f} MB")
+        if usage['rss_bytes'] is not None:
+            lines.append(f"{'process rss':<20} {usage['rss_bytes'] / 2 ** 20:>9.1f} MB")
+        return "\n".join(lines)
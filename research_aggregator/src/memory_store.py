@@ -0,0 +1,230 @@
+import atexit
+import json
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS query_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    query TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    result_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_query_history_timestamp ON query_history (timestamp);
+CREATE INDEX IF NOT EXISTS idx_query_history_query ON query_history (query);
+
+CREATE TABLE IF NOT EXISTS topic_memory (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    query TEXT NOT NULL,
+    summary TEXT,
+    themes TEXT,
+    topics TEXT,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_topic_memory_query ON topic_memory (query, timestamp);
+CREATE INDEX IF NOT EXISTS idx_topic_memory_timestamp ON topic_memory (timestamp);
+
+CREATE TABLE IF NOT EXISTS source_stats (
+    domain TEXT PRIMARY KEY,
+    success INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT NOT NULL
+);
+"""
+
+
+class MemoryStore:
+    """SQLite-backed research memory shared by every worker on a host.
+
+    Writes are buffered and flushed in a single transaction once
+    `batch_size` operations are pending or `flush_interval` seconds have
+    passed; reads flush first so callers always see their own writes. The
+    database runs in WAL mode so several processes can read while one writes.
+    Old history is dropped by `compact()`, which also runs automatically every
+    `compact_every` flushes.
+    """
+
+    def __init__(self, path: str, batch_size: int = 50, flush_interval: float = 5.0,
+                 retention_days: Optional[int] = 90, max_topic_entries: int = 20,
+                 compact_every: int = 100):
+        self.logger = logging.getLogger(__name__)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self.max_topic_entries = max_topic_entries
+        self.compact_every = compact_every
+
+        self._lock = threading.Lock()
+        self._pending = {'query_history': [], 'topic_memory': [], 'source_stats': []}
+        self._pending_count = 0
+        self._last_flush = time.monotonic()
+        self._flushes = 0
+
+        self.conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        atexit.register(self.close)
+
+    # Writes
+
+    def _enqueue(self, table: str, row: tuple):
+        with self._lock:
+            self._pending[table].append(row)
+            self._pending_count += 1
+            due = (self._pending_count >= self.batch_size
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def record_query(self, query: str, result_count: int, timestamp: Optional[str] = None):
+        self._enqueue('query_history', (query, timestamp or datetime.now().isoformat(), result_count))
+
+    def record_topic(self, query: str, summary: str, themes: List, topics: List,
+                     timestamp: Optional[str] = None):
+        self._enqueue('topic_memory', (
+            query,
+            summary,
+            json.dumps(themes, ensure_ascii=False),
+            json.dumps(topics, ensure_ascii=False),
+            timestamp or datetime.now().isoformat()
+        ))
+
+    def record_source(self, domain: str, success: bool):
+        self._enqueue('source_stats', (domain, int(success), datetime.now().isoformat()))
+
+    def flush(self):
+        """Write all buffered operations in one transaction."""
+        with self._lock:
+            pending = self._pending
+            self._pending = {'query_history': [], 'topic_memory': [], 'source_stats': []}
+            self._pending_count = 0
+            self._last_flush = time.monotonic()
+            if not any(pending.values()):
+                return
+            try:
+                with self.conn:
+                    self.conn.executemany(
+                        "INSERT INTO query_history (query, timestamp, result_count) VALUES (?, ?, ?)",
+                        pending['query_history']
+                    )
+                    self.conn.executemany(
+                        "INSERT INTO topic_memory (query, summary, themes, topics, timestamp) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        pending['topic_memory']
+                    )
+                    self.conn.executemany(
+                        "INSERT INTO source_stats (domain, success, total, updated_at) VALUES (?, ?, 1, ?) "
+                        "ON CONFLICT(domain) DO UPDATE SET success = success + excluded.success, "
+                        "total = total + 1, updated_at = excluded.updated_at",
+                        pending['source_stats']
+                    )
+            except sqlite3.Error as e:
+                # Keep the batch for the next flush rather than lose it
+                self.logger.error(f"Error flushing memory store: {str(e)}")
+                self._pending = pending
+                self._pending_count = sum(len(rows) for rows in pending.values())
+                return
+            self._flushes += 1
+            due_for_compaction = self.compact_every and self._flushes % self.compact_every == 0
+        if due_for_compaction:
+            self.compact(vacuum=False)
+
+    # Reads
+
+    def get_query_history(self, limit: int = 100, offset: int = 0) -> List[Dict]:
+        """Most recent queries first."""
+        self.flush()
+        rows = self.conn.execute(
+            "SELECT query, timestamp, result_count FROM query_history "
+            "ORDER BY timestamp DESC LIMIT ? OFFSET ?",
+            (limit, offset)
+        ).fetchall()
+        return [{'query': q, 'timestamp': ts, 'result_count': n} for q, ts, n in rows]
+
+    def count_queries(self) -> int:
+        self.flush()
+        return self.conn.execute("SELECT COUNT(*) FROM query_history").fetchone()[0]
+
+    def get_topic_memory(self, query: Optional[str] = None, limit: int = 20) -> Dict[str, List[Dict]]:
+        """Latest topic entries, for one query or across all queries."""
+        self.flush()
+        if query is None:
+            rows = self.conn.execute(
+                "SELECT query, summary, themes, topics, timestamp FROM topic_memory "
+                "ORDER BY timestamp DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        else:
+            rows = self.conn.execute(
+                "SELECT query, summary, themes, topics, timestamp FROM topic_memory "
+                "WHERE query = ? ORDER BY timestamp DESC LIMIT ?",
+                (query, limit)
+            ).fetchall()
+
+        memory = {}
+        for q, summary, themes, topics, ts in rows:
+            memory.setdefault(q, []).append({
+                'summary': summary,
+                'themes': json.loads(themes or '[]'),
+                'topics': json.loads(topics or '[]'),
+                'timestamp': ts
+            })
+        return memory
+
+    def get_source_stats(self, limit: Optional[int] = None) -> Dict[str, Dict]:
+        """Per-domain success counts, best success rate first."""
+        self.flush()
+        sql = ("SELECT domain, success, total FROM source_stats WHERE total > 0 "
+               "ORDER BY CAST(success AS REAL) / total DESC, total DESC")
+        params = ()
+        if limit is not None:
+            sql += " LIMIT ?"
+            params = (limit,)
+        return {
+            domain: {'success': success, 'total': total}
+            for domain, success, total in self.conn.execute(sql, params).fetchall()
+        }
+
+    # Maintenance
+
+    def compact(self, vacuum: bool = True):
+        """Apply retention policies and optionally reclaim free pages."""
+        self.flush()
+        with self._lock:
+            try:
+                with self.conn:
+                    if self.retention_days is not None:
+                        cutoff = (datetime.now() - timedelta(days=self.retention_days)).isoformat()
+                        self.conn.execute("DELETE FROM query_history WHERE timestamp < ?", (cutoff,))
+                        self.conn.execute("DELETE FROM topic_memory WHERE timestamp < ?", (cutoff,))
+                    # Keep only the newest entries per topic
+                    self.conn.execute(
+                        "DELETE FROM topic_memory WHERE id IN ("
+                        " SELECT id FROM ("
+                        "  SELECT id, ROW_NUMBER() OVER (PARTITION BY query ORDER BY timestamp DESC) AS rn"
+                        "  FROM topic_memory"
+                        " ) WHERE rn > ?"
+                        ")",
+                        (self.max_topic_entries,)
+                    )
+                if vacuum:
+                    self.conn.execute("VACUUM")
+                self.conn.execute("PRAGMA optimize")
+            except sqlite3.Error as e:
+                self.logger.error(f"Error compacting memory store: {str(e)}")
+
+    def close(self):
+        try:
+            self.flush()
+            self.conn.close()
+        except sqlite3.ProgrammingError:
+            # Already closed
+            pass
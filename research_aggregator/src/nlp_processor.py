@@ -1,24 +1,48 @@
-from transformers import pipeline, AutoModelForSeq2SeqLM, AutoTokenizer
-import nltk
-from nltk.tokenize import sent_tokenize
 from typing import List, Dict
-import torch
 import logging
+import threading
 from collections import Counter
-import spacy
-from sentence_transformers import SentenceTransformer
-import numpy as np
-from gensim import corpora, models
 import os
 import json
-from sklearn.neighbors import NearestNeighbors
+import hashlib
+from entity_index import EntityIndex
+from instrumentation import metrics
+from memory_governor import MemoryGovernor, model_nbytes, rss_bytes
+from startup import ensure_nltk_resource, spacy_model_available
+from vector_store import VectorStore
+
+# transformers, sentence-transformers, spaCy, gensim and NLTK take seconds to
+# import, so they are imported where first used and models load on first use
+
+_MISSING = object()
 
 class NLPProcessor:
-    def __init__(self):
+    # Recorded with stored analyses, so outputs of older models can be found and redone
+    MODEL_NAMES = {
+        'summarizer': "facebook/bart-large-cnn",
+        'sentence_model': "all-MiniLM-L6-v2",
+        'ner': "dbmdz/bert-large-cased-finetuned-conll03-english",
+        'sentiment_analyzer': "distilbert-base-uncased-finetuned-sst-2-english",
+        'nlp': "en_core_web_sm",
+    }
+    def __init__(self, preload: bool = False, memory: MemoryGovernor = None, vector_dtype: str = None):
+        """Models load the first time they are used; pass preload=True (or
+        call setup_models) to load them all up front.
+
+        `memory` keeps models and the vector store within a budget (by
+        default NLP_MEMORY_BUDGET_MB, unlimited if unset): least recently
+        used models are unloaded when over it and load again when next
+        needed. Embeddings are stored as `vector_dtype` (NLP_VECTOR_DTYPE,
+        default float16; int8 to save more)."""
         self.setup_logging()
-        self.setup_models()
-        self.setup_vector_store()
-        self.nlp = spacy.load("en_core_web_sm")
+        self._models = {}
+        self._models_lock = threading.Lock()
+        self.memory = memory or MemoryGovernor.from_env()
+        # Processed articles' entities and key phrases, aggregated by combine_summaries
+        self.entity_index = EntityIndex()
+        self.setup_vector_store(vector_dtype or os.getenv("NLP_VECTOR_DTYPE", "float16"))
+        if preload:
+            self.setup_models()
 
     def setup_logging(self):
         logging.basicConfig(
@@ -27,46 +51,123 @@ class NLPProcessor:
         )
         self.logger = logging.getLogger(__name__)
 
+    def _load_summarizer(self):
+        from transformers import pipeline
+        # Using smaller models for better performance on CPU
+        return pipeline(
+            "summarization",
+            model=self.MODEL_NAMES['summarizer'],
+            device=-1  # Use CPU
+        )
+
+    def _load_sentence_model(self):
+        from sentence_transformers import SentenceTransformer
+        # Using sentence transformers for semantic search
+        return SentenceTransformer(self.MODEL_NAMES['sentence_model'])
+
+    def _load_ner(self):
+        from transformers import pipeline
+        # For named entity recognition
+        return pipeline(
+            "ner",
+            model=self.MODEL_NAMES['ner'],
+            device=-1
+        )
+
+    def _load_sentiment_analyzer(self):
+        from transformers import pipeline
+        # For sentiment analysis
+        return pipeline(
+            "sentiment-analysis",
+            model=self.MODEL_NAMES['sentiment_analyzer'],
+            device=-1
+        )
+
+    def _load_nlp(self):
+        # For entities and noun chunks
+        name = self.MODEL_NAMES['nlp']
+        if not spacy_model_available(name):
+            raise RuntimeError(f"spaCy model {name} is not installed; "
+                               f"run `python -m spacy download {name}`")
+        import spacy
+        return spacy.load(name)
+
+    MODELS = ('summarizer', 'sentence_model', 'ner', 'sentiment_analyzer', 'nlp')
+
+    def _model(self, name: str):
+        """The named model, loaded on first use and again after the memory governor unloaded it."""
+        model = self._models.get(name, _MISSING)
+        if model is _MISSING:
+            with self._models_lock:
+                model = self._models.get(name, _MISSING)
+                if model is _MISSING:
+                    model = self._load_model(name)
+        self.memory.touch(name)
+        return model
+
+    def _load_model(self, name: str):
+        self.memory.make_room(self.memory.expected_size(name), keep=name)
+        rss_before = rss_bytes()
+        with metrics.span('model_load', model=name):
+            model = getattr(self, f'_load_{name}')()
+        size = model_nbytes(model)
+        if size is None:
+            # No tensors to count (spaCy); what loading it added to the process will do
+            rss_after = rss_bytes()
+            size = max(0, rss_after - rss_before) if rss_before is not None and rss_after is not None else 0
+        self._models[name] = model
+        self.memory.register(name, lambda: size, lambda: self._models.pop(name, None))
+        self.memory.make_room(keep=name)
+        return model
+
+    def _set_model(self, name: str, model):
+        # An assigned model (e.g. a stub) can't be reloaded, so the governor leaves it alone
+        self.memory.unregister(name)
+        self._models[name] = model
+
+    def _lazy_model(name: str):
+        # Assigning the attribute (e.g. a stub model) replaces the lazy load
+        return property(lambda self: self._model(name),
+                        lambda self, model: self._set_model(name, model))
+
+    summarizer = _lazy_model('summarizer')
+    sentence_model = _lazy_model('sentence_model')
+    ner = _lazy_model('ner')
+    sentiment_analyzer = _lazy_model('sentiment_analyzer')
+    nlp = _lazy_model('nlp')
+    del _lazy_model
+
     def setup_models(self):
-        """Initialize the necessary NLP models."""
+        """Load all the NLP models now instead of on first use."""
         try:
-            # Using smaller models for better performance on CPU
-            self.summarizer = pipeline(
-                "summarization",
-                model="facebook/bart-large-cnn",
-                device=-1  # Use CPU
-            )
-            
-            # Using sentence transformers for semantic search
-            self.sentence_model = SentenceTransformer('all-MiniLM-L6-v2')
-            
-            # For named entity recognition
-            self.ner = pipeline(
-                "ner",
-                model="dbmdz/bert-large-cased-finetuned-conll03-english",
-                device=-1
-            )
-            
-            # For sentiment analysis
-            self.sentiment_analyzer = pipeline(
-                "sentiment-analysis",
-                model="distilbert-base-uncased-finetuned-sst-2-english",
-                device=-1
-            )
-            
+            for name in self.MODELS:
+                self._model(name)
         except Exception as e:
             self.logger.error(f"Error setting up models: {str(e)}")
             raise
 
-    def setup_vector_store(self):
-        """Setup NearestNeighbors for semantic search."""
+    @property
+    def model_version(self) -> str:
+        return "+".join(self.MODEL_NAMES[name] for name in self.MODELS)
+
+    def loaded_models(self) -> List[str]:
+        return [name for name in self.MODELS if name in self._models]
+
+    def memory_usage(self) -> Dict:
+        """Bytes held by each loaded model and the vector store (see MemoryGovernor.usage)."""
+        return self.memory.usage()
+
+    def setup_vector_store(self, dtype: str = 'float16'):
+        """Setup the vector store for semantic search."""
         self.vector_dimension = 384  # Dimension for all-MiniLM-L6-v2
-        self.embeddings = []
-        self.texts = []
-        self.nn_model = None
+        self.vector_store = VectorStore(self.vector_dimension, dtype=dtype)
+        self.memory.register('vector_store', lambda: self.vector_store.nbytes)
 
+    @metrics.timed('chunking')
     def chunk_text(self, text: str, max_length: int = 1024) -> List[str]:
         """Split text into chunks that can be processed by the model."""
+        from nltk.tokenize import sent_tokenize
+        ensure_nltk_resource('punkt', 'tokenizers/punkt')
         sentences = sent_tokenize(text)
         chunks = []
         current_chunk = []
@@ -87,6 +188,7 @@ class NLPProcessor:
 
         return chunks
 
+    @metrics.timed('summarization')
     def summarize_text(self, text: str, max_length: int = 150, min_length: int = 50) -> str:
         """Generate a summary of the input text."""
         try:
@@ -107,23 +209,37 @@ class NLPProcessor:
             self.logger.error(f"Error in summarization: {str(e)}")
             return ""
 
+    def entities_from_doc(self, doc) -> List[Dict]:
+        """Named entities of an already parsed spaCy doc."""
+        return [
+            {
+                'text': ent.text,
+                'label': ent.label_,
+                'start': ent.start_char,
+                'end': ent.end_char
+            }
+            for ent in doc.ents
+        ]
+
+    def key_phrases_from_doc(self, doc, num_phrases: int = 5) -> List[str]:
+        """Most frequent noun chunks and entities of an already parsed spaCy doc."""
+        # Get noun chunks and named entities
+        phrases = [chunk.text for chunk in doc.noun_chunks]
+        phrases.extend([ent.text for ent in doc.ents])
+        
+        # Return most common phrases
+        return [phrase for phrase, _ in Counter(phrases).most_common(num_phrases)]
+
+    @metrics.timed('ner')
     def extract_entities(self, text: str) -> List[Dict]:
         """Extract named entities from the text."""
         try:
-            doc = self.nlp(text)
-            entities = []
-            for ent in doc.ents:
-                entities.append({
-                    'text': ent.text,
-                    'label': ent.label_,
-                    'start': ent.start_char,
-                    'end': ent.end_char
-                })
-            return entities
+            return self.entities_from_doc(self.nlp(text))
         except Exception as e:
             self.logger.error(f"Error in entity extraction: {str(e)}")
             return []
 
+    @metrics.timed('sentiment')
     def analyze_sentiment(self, text: str) -> Dict:
         """Analyze the sentiment of the text."""
         try:
@@ -136,26 +252,21 @@ class NLPProcessor:
             self.logger.error(f"Error in sentiment analysis: {str(e)}")
             return {'label': 'NEUTRAL', 'score': 0.0}
 
+    @metrics.timed('key_phrases')
     def extract_key_phrases(self, text: str, num_phrases: int = 5) -> List[str]:
         """Extract key phrases from the text."""
         try:
-            doc = self.nlp(text)
-            # Get noun chunks and named entities
-            phrases = [chunk.text for chunk in doc.noun_chunks]
-            phrases.extend([ent.text for ent in doc.ents])
-            
-            # Count frequency
-            phrase_freq = Counter(phrases)
-            
-            # Return most common phrases
-            return [phrase for phrase, _ in phrase_freq.most_common(num_phrases)]
+            return self.key_phrases_from_doc(self.nlp(text), num_phrases)
         except Exception as e:
             self.logger.error(f"Error in key phrase extraction: {str(e)}")
             return []
 
+    @metrics.timed('topics')
     def extract_topics(self, texts: List[str], num_topics: int = 5) -> List[Dict]:
         """Extract topics using LDA."""
         try:
+            from gensim import corpora, models
+
             # Prepare texts
             texts = [text.split() for text in texts]
             
@@ -186,60 +297,156 @@ class NLPProcessor:
             self.logger.error(f"Error in topic extraction: {str(e)}")
             return []
 
+    @metrics.timed('embedding')
     def add_to_vector_store(self, text: str):
-        """Add text to vector store for semantic search."""
+        """Add text to vector store for semantic search; returns its embedding."""
         try:
             # Get text embedding
             embedding = self.sentence_model.encode([text])[0]
             
-            # Add to embeddings and texts
-            self.embeddings.append(embedding)
-            self.texts.append(text)
-            
-            # Re-fit the NearestNeighbors model whenever new data is added
-            if len(self.embeddings) > 0:
-                self.nn_model = NearestNeighbors(n_neighbors=min(5, len(self.embeddings)), metric='cosine')
-                self.nn_model.fit(np.array(self.embeddings))
+            # Add to the vector store; nothing needs refitting
+            self.vector_store.add([embedding], [text])
+            return embedding
+        except Exception as e:
+            self.logger.error(f"Error adding to vector store: {str(e)}")
+            return None
+
+    def add_many_to_vector_store(self, texts: List[str], batch_size: int = 32):
+        """Add several texts to the vector store with one encode; returns their embeddings."""
+        try:
+            embeddings = self.sentence_model.encode(texts, batch_size=batch_size)
+            self.vector_store.add(embeddings, texts)
+            return list(embeddings)
         except Exception as e:
             self.logger.error(f"Error adding to vector store: {str(e)}")
+            return [None] * len(texts)
 
+    @metrics.timed('semantic_search')
     def semantic_search(self, query: str, k: int = 5) -> List[str]:
         """Perform semantic search in vector store."""
         try:
-            if not self.nn_model or len(self.embeddings) == 0:
+            if len(self.vector_store) == 0:
                 return []
             
             # Get query embedding
             query_embedding = self.sentence_model.encode([query])[0]
             
-            # Search using NearestNeighbors
-            distances, indices = self.nn_model.kneighbors(np.array([query_embedding]))
-            
             # Return matching texts
-            return [self.texts[i] for i in indices[0]]
+            return self.vector_store.search_items(query_embedding, k)
         except Exception as e:
             self.logger.error(f"Error in semantic search: {str(e)}")
             return []
 
+    @metrics.timed('process_article')
     def process_article(self, article_data: Dict) -> Dict:
         """Process a single article with all NLP tasks."""
         try:
             text = article_data['text']
             
             # Add to vector store
-            self.add_to_vector_store(text)
+            embedding = self.add_to_vector_store(text)
             
-            return {
+            processed = {
                 'summary': self.summarize_text(text),
                 'entities': self.extract_entities(text),
                 'sentiment': self.analyze_sentiment(text),
                 'key_phrases': self.extract_key_phrases(text),
+                'embedding': embedding,
                 'original_data': article_data
             }
+            self.index_articles([processed])
+            return processed
         except Exception as e:
             self.logger.error(f"Error processing article: {str(e)}")
             return {}
 
+    @metrics.timed('process_articles')
+    def process_articles(self, articles: List[Dict], batch_size: int = 8) -> List[Dict]:
+        """Process many articles at once, batching every model call across them.
+
+        Produces the same output as calling process_article on each article,
+        but runs the summarizer over all chunks of all articles together and
+        feeds the sentiment model, sentence encoder and spaCy in batches.
+        """
+        if not articles:
+            return []
+        try:
+            texts = [article['text'] for article in articles]
+
+            # Summaries: chunk every article, then summarize all chunks in batches
+            chunk_owners, chunks = [], []
+            for owner, text in enumerate(texts):
+                for chunk in self.chunk_text(text):
+                    chunk_owners.append(owner)
+                    chunks.append(chunk)
+            summaries = [[] for _ in texts]
+            with metrics.span('summarization', batch=len(chunks)):
+                outputs = self.summarizer(
+                    chunks,
+                    max_length=150,
+                    min_length=50,
+                    do_sample=False,
+                    batch_size=batch_size
+                ) if chunks else []
+            for owner, output in zip(chunk_owners, outputs):
+                summaries[owner].append(output['summary_text'])
+
+            with metrics.span('sentiment', batch=len(texts)):
+                sentiments = self.sentiment_analyzer(texts, batch_size=batch_size, truncation=True)
+
+            with metrics.span('ner', batch=len(texts)):
+                docs = list(self.nlp.pipe(texts, batch_size=batch_size))
+
+            with metrics.span('embedding', batch=len(texts)):
+                embeddings = self.add_many_to_vector_store(texts, batch_size=batch_size)
+
+            processed = [
+                {
+                    'summary': " ".join(summaries[i]),
+                    'entities': self.entities_from_doc(docs[i]),
+                    'sentiment': {'label': sentiments[i]['label'], 'score': sentiments[i]['score']},
+                    'key_phrases': self.key_phrases_from_doc(docs[i]),
+                    'embedding': embeddings[i],
+                    'original_data': article
+                }
+                for i, article in enumerate(articles)
+            ]
+            self.index_articles(processed)
+            return processed
+        except Exception as e:
+            self.logger.error(f"Error in batch processing, falling back to per-article: {str(e)}")
+            return [self.process_article(article) for article in articles]
+
+    @staticmethod
+    def article_id(processed: Dict) -> str:
+        """Key of a processed article in the entity index: its URL, or a hash of its text."""
+        original = processed.get('original_data') or {}
+        if original.get('url'):
+            return original['url']
+        text = original.get('text') or processed.get('summary', '')
+        return "text:" + hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def index_articles(self, processed_articles: List[Dict], replace: bool = True) -> List[str]:
+        """Add processed articles' entities and key phrases to the entity index; returns their ids.
+
+        With replace=False, articles already indexed (e.g. reused from a
+        cache) are left as they are.
+        """
+        ids = []
+        for processed in processed_articles:
+            if not processed:
+                continue
+            article_id = self.article_id(processed)
+            if replace or article_id not in self.entity_index:
+                self.entity_index.add(article_id, processed.get('entities', []), processed.get('key_phrases', []))
+            ids.append(article_id)
+        return ids
+
+    def aggregate_terms(self, processed_articles: List[Dict]) -> Dict:
+        """common_entities and key_themes of the articles, from the entity index rather than another spaCy pass."""
+        return self.entity_index.aggregate(self.index_articles(processed_articles, replace=False))
+
+    @metrics.timed('combine_summaries')
     def combine_summaries(self, processed_articles: List[Dict]) -> Dict:
         """Combine multiple article summaries into a comprehensive analysis."""
         try:
@@ -248,14 +455,73 @@ class NLPProcessor:
             # Extract topics from all articles
             topics = self.extract_topics([article['summary'] for article in processed_articles])
             
+            # Entities and themes are ranked by how many articles mention them
+            terms = self.aggregate_terms(processed_articles)
             return {
                 'comprehensive_summary': self.summarize_text(all_text, max_length=300, min_length=100),
-                'common_entities': self.extract_entities(all_text),
+                'common_entities': terms['common_entities'],
                 'overall_sentiment': self.analyze_sentiment(all_text),
-                'key_themes': self.extract_key_phrases(all_text, num_phrases=10),
+                'key_themes': terms['key_themes'],
                 'topics': topics,
                 'source_count': len(processed_articles)
             }
         except Exception as e:
             self.logger.error(f"Error combining summaries: {str(e)}")
-            return {} 
\ No newline at end of file
+            return {}
+
+    @metrics.timed('update_combined')
+    def update_combined(self, previous: Dict, changed_articles: List[Dict], processed_articles: List[Dict]) -> Dict:
+        """Bring a combine_summaries result up to date without redoing it from scratch.
+
+        `processed_articles` is the current article set and `changed_articles`
+        the ones new or changed since `previous` was made. Entities, themes and
+        sentiment are merged from the per-article results without a model.
+        The summary is re-summarized from the current articles' summaries in
+        one call, so text from dropped or since-changed articles doesn't
+        linger in it, and topics are refit on the same summaries. When no
+        article changed or dropped out, `previous` is returned as is.
+        Without a previous result this is combine_summaries.
+        """
+        if not previous or not previous.get('comprehensive_summary'):
+            return self.combine_summaries(processed_articles)
+        if not changed_articles and previous.get('source_count') == len(processed_articles):
+            return previous
+        try:
+            combined = self.quick_combine(processed_articles)
+            # Falls back to quick_combine's concatenated summaries, which are current, rather than the stale one
+            combined['comprehensive_summary'] = self.summarize_text(
+                combined['comprehensive_summary'], max_length=300, min_length=100
+            ) or combined['comprehensive_summary']
+            combined['topics'] = self.extract_topics([article['summary'] for article in processed_articles])
+            return combined
+        except Exception as e:
+            self.logger.error(f"Error updating combined analysis: {str(e)}")
+            return previous
+
+    def quick_combine(self, processed_articles: List[Dict]) -> Dict:
+        """Combine per-article results without running any model.
+
+        Used when there is no time left for combine_summaries: the article
+        summaries are concatenated, entities and key phrases aggregated from
+        the entity index and sentiments merged, and no topics are extracted.
+        """
+        terms = self.aggregate_terms(processed_articles)
+        signed_scores = []
+        for article in processed_articles:
+            sentiment = article.get('sentiment') or {}
+            if sentiment.get('label') in ('POSITIVE', 'NEGATIVE'):
+                sign = 1 if sentiment['label'] == 'POSITIVE' else -1
+                signed_scores.append(sign * sentiment.get('score', 0.0))
+
+        balance = sum(signed_scores) / len(signed_scores) if signed_scores else 0.0
+        return {
+            'comprehensive_summary': " ".join(article['summary'] for article in processed_articles),
+            'common_entities': terms['common_entities'],
+            'overall_sentiment': {
+                'label': 'NEUTRAL' if not signed_scores else ('POSITIVE' if balance >= 0 else 'NEGATIVE'),
+                'score': abs(balance)
+            },
+            'key_themes': terms['key_themes'],
+            'topics': [],
+            'source_count': len(processed_articles)
+        } 
\ No newline at end of file
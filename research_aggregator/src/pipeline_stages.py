@@ -0,0 +1,221 @@
+import argparse
+import json
+import logging
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from main import ResearchAggregator
+from job_queue import Broker, SQLiteBroker, Stage, StageWorkers, Task
+from instrumentation import metrics, run_in_context
+
+SEARCH = 'search'
+FETCH = 'fetch'
+ANALYZE = 'analyze'
+COMBINE = 'combine'
+STAGES = (SEARCH, FETCH, ANALYZE, COMBINE)
+
+
+class StagedPipeline:
+    """ResearchAggregator's pipeline as queue-connected stages.
+
+    search -> fetch (one task per URL) -> analyze -> combine. Every URL
+    ends as one named result in its run's group: the article's analysis,
+    or None if it could not be fetched or processed. Whichever step stores
+    the last of them enqueues the run's combine task; its key makes that
+    happen once even when two workers finish together or a task is
+    redelivered. Task keys are derived from the run id and URL throughout,
+    so every stage can be replayed safely. A replayed combine skips a run
+    that already has its output, and records each side effect (memory,
+    result store, corpus) as done so a retry after a crash doesn't repeat
+    it. A run whose search or combine step is given up on gets an error as
+    its output, so wait() returns.
+
+    Fetch workers are I/O-bound and cheap; analyze workers load the NLP
+    models. Run them in separate processes (see `main`) and scale each on
+    its own. Within one process NLP calls still go through the
+    aggregator's single NLP thread. Each process builds its own aggregator
+    over the same data directory; its result, entity, query and corpus
+    stores lock their files, so several writers don't lose each other's
+    records.
+    """
+
+    def __init__(self, broker: Broker, aggregator: Optional[ResearchAggregator] = None):
+        self.logger = logging.getLogger(__name__)
+        self.broker = broker
+        self.aggregator = aggregator or ResearchAggregator()
+
+    def submit(self, query: str, num_sources: int = 5, run_id: Optional[str] = None) -> str:
+        """Start a research run; returns its id for wait()."""
+        run_id = run_id or uuid.uuid4().hex
+        self.broker.put(SEARCH, {'run_id': run_id, 'query': query, 'num_sources': num_sources},
+                        key=f"{run_id}:{SEARCH}")
+        return run_id
+
+    def wait(self, run_id: str, timeout: Optional[float] = None, poll_seconds: float = 0.5) -> Optional[Dict]:
+        """The run's output once combined, or None if `timeout` passes first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            output = self.broker.results(f"{run_id}:output").get('output')
+            if output is not None:
+                return output
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(poll_seconds)
+
+    def stages(self, search_workers: int = 1, fetch_workers: int = 8, analyze_workers: int = 1,
+               combine_workers: int = 1, analyze_batch: int = 8, only: Optional[List[str]] = None) -> List[Stage]:
+        """Stage definitions with per-stage worker counts; `only` limits them to some stages."""
+        stages = [
+            Stage(SEARCH, self.search, workers=search_workers, on_give_up=self.search_failed),
+            Stage(FETCH, self.fetch, workers=fetch_workers, lease_seconds=120, on_give_up=self.fetch_failed),
+            Stage(ANALYZE, self.analyze, workers=analyze_workers, batch_size=analyze_batch,
+                  on_give_up=self.analyze_failed),
+            Stage(COMBINE, self.combine, workers=combine_workers, on_give_up=self.combine_failed)
+        ]
+        return [stage for stage in stages if only is None or stage.name in only]
+
+    # Stage handlers
+
+    async def search(self, tasks: List[Task]):
+        for task in tasks:
+            run_id, query = task.payload['run_id'], task.payload['query']
+            urls = await self.aggregator.scraper.search_sources(
+                query, task.payload['num_sources'], preferred_domains=self.aggregator.get_effective_sources(query)
+            )
+            # Fetch failures are tolerated rather than backfilled from the extra candidates. Fetch tasks
+            # are keyed by URL, so a repeated URL would be fetched once and the run never complete
+            urls = list(dict.fromkeys(urls))[:task.payload['num_sources']]
+            if not urls:
+                self.logger.warning(f"No sources found for '{query}'")
+                self.broker.put(COMBINE, {'run_id': run_id, 'query': query}, key=f"{run_id}:{COMBINE}")
+            for url in urls:
+                self.broker.put(FETCH, {'run_id': run_id, 'query': query, 'url': url, 'expected': len(urls)},
+                                key=f"{run_id}:{FETCH}:{url}")
+
+    async def fetch(self, tasks: List[Task]):
+        for task in tasks:
+            payload = task.payload
+            article = await self.aggregator.scraper.scrape_article_async(payload['url'])
+            if article is None:
+                self.finish(payload, None)
+                continue
+            self.broker.put(ANALYZE, {**payload, 'article': article},
+                            key=f"{payload['run_id']}:{ANALYZE}:{payload['url']}")
+
+    def analyze(self, tasks: List[Task]):
+        articles = [task.payload['article'] for task in tasks]
+        processed = self.aggregator.nlp_executor.submit(
+            run_in_context(self.aggregator.nlp_processor.process_articles, articles)
+        ).result()
+        for task, result in zip(tasks, processed):
+            if result:
+                # JSON-friendly for the broker; the corpus store takes the embedding back as a list
+                embedding = result.get('embedding')
+                result = {**result, 'embedding': embedding.tolist() if hasattr(embedding, 'tolist') else embedding}
+            self.finish(task.payload, result or None)
+
+    def finish(self, payload: Dict, analysis: Optional[Dict]):
+        """Record one URL's outcome; the last one in enqueues the combine step."""
+        done = self.broker.save_result(payload['run_id'], payload['url'], analysis)
+        if done >= payload['expected']:
+            self.broker.put(COMBINE, {'run_id': payload['run_id'], 'query': payload['query']},
+                            key=f"{payload['run_id']}:{COMBINE}")
+
+    def fetch_failed(self, task: Task, error: Exception):
+        self.finish(task.payload, None)
+
+    def analyze_failed(self, task: Task, error: Exception):
+        self.finish(task.payload, None)
+
+    def search_failed(self, task: Task, error: Exception):
+        self.save_output(task.payload['run_id'], {'error': f"Search failed: {str(error)}"})
+
+    def combine_failed(self, task: Task, error: Exception):
+        self.save_output(task.payload['run_id'], {'error': f"Combining the analyses failed: {str(error)}"})
+
+    def save_output(self, run_id: str, output: Dict):
+        output.setdefault('metadata', {})['run_id'] = run_id
+        self.broker.save_result(f"{run_id}:output", 'output', output)
+
+    def once(self, run_id: str, effect: str, action: Callable[[], Any]):
+        """Run one of a run's side effects unless an earlier attempt at its combine step already did."""
+        group = f"{run_id}:effects"
+        if effect in self.broker.results(group):
+            return
+        action()
+        self.broker.save_result(group, effect, True)
+
+    def combine(self, tasks: List[Task]):
+        for task in tasks:
+            run_id, query = task.payload['run_id'], task.payload['query']
+            if self.broker.results(f"{run_id}:output").get('output') is not None:
+                # Redelivered after its output was saved, e.g. when the lease ran out before the ack
+                continue
+            processed = [analysis for analysis in self.broker.results(run_id).values() if analysis]
+            if processed:
+                combined = self.aggregator.nlp_executor.submit(
+                    run_in_context(self.aggregator.nlp_processor.combine_summaries, processed)
+                ).result()
+                output = self.aggregator.format_output(combined, processed)
+                self.once(run_id, 'memory', lambda: self.aggregator.update_memory(query, output))
+                self.once(run_id, 'saved', lambda: self.aggregator.save_results(output, query))
+                self.once(run_id, 'corpus', lambda: self.aggregator.record_corpus(processed))
+            else:
+                output = {'error': "No articles found for the query"}
+            self.save_output(run_id, output)
+            metrics.incr('pipeline.runs_combined')
+
+
+def parse_stage_workers(text: str) -> Dict[str, int]:
+    """'fetch=16,analyze' -> {'fetch': 16, 'analyze': 1}."""
+    workers = {}
+    for part in filter(None, text.split(',')):
+        name, _, count = part.partition('=')
+        if name not in STAGES:
+            raise ValueError(f"Unknown stage '{name}'; expected one of {', '.join(STAGES)}")
+        workers[name] = int(count or 1)
+    return workers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the research pipeline as queue-connected stages.")
+    parser.add_argument("--broker", default="data/queue/broker.db", help="SQLite broker database")
+    commands = parser.add_subparsers(dest="command", required=True)
+    worker = commands.add_parser("worker", help="Run workers for some or all stages")
+    worker.add_argument("--stages", default="search,fetch=8,analyze,combine",
+                        help="Stages to run, each with an optional worker count, e.g. fetch=16")
+    worker.add_argument("--analyze-batch", type=int, default=8, help="Articles per NLP batch")
+    submit = commands.add_parser("submit", help="Queue a research query")
+    submit.add_argument("query")
+    submit.add_argument("--num-sources", type=int, default=5)
+    submit.add_argument("--wait", action="store_true", help="Wait for the result and print it")
+    submit.add_argument("--timeout", type=float, default=600, help="Seconds to wait for the result")
+    commands.add_parser("status", help="Show task counts per stage")
+    args = parser.parse_args()
+
+    broker = SQLiteBroker(args.broker)
+    if args.command == "status":
+        for stage in STAGES:
+            print(stage, json.dumps(broker.counts(stage)))
+        return
+    pipeline = StagedPipeline(broker)
+    if args.command == "submit":
+        run_id = pipeline.submit(args.query, args.num_sources)
+        print(run_id)
+        if args.wait:
+            output = pipeline.wait(run_id, timeout=args.timeout)
+            if output is None:
+                raise SystemExit(f"Run {run_id} did not finish within {args.timeout:g}s; check the workers")
+            print(json.dumps(output, indent=2))
+        return
+    workers = parse_stage_workers(args.stages)
+    stages = pipeline.stages(
+        search_workers=workers.get(SEARCH, 1), fetch_workers=workers.get(FETCH, 1),
+        analyze_workers=workers.get(ANALYZE, 1), combine_workers=workers.get(COMBINE, 1),
+        analyze_batch=args.analyze_batch, only=list(workers)
+    )
+    StageWorkers(broker, stages).run_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+
+from file_lock import file_lock
+
+
+class QueryIndex:
+    """Append-only similarity index over past research queries.
+
+    Queries are embedded with a stateless hashing vectorizer, so adding a
+    query never requires refitting over the history. Rows are kept in a small
+    number of sparse blocks that are merged log-structured style, which keeps
+    inserts amortized O(log n) and lets a lookup score every stored query
+    with a handful of sparse matrix-vector products.
+
+    Several processes may append to the same log: each append holds an
+    flock on it and first picks up the queries other processes added.
+    """
+
+    def __init__(self, path: Optional[str] = None, n_features: int = 2 ** 18):
+        self.logger = logging.getLogger(__name__)
+        self.path = Path(path) if path else None
+        self._lock_path = self.path.with_name(f".{self.path.name}.lock") if self.path else None
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features,
+            ngram_range=(1, 2),
+            stop_words='english',
+            alternate_sign=False,
+            norm='l2',
+            dtype=np.float32
+        )
+        self.texts: List[str] = []
+        self.timestamps: List[str] = []
+        self._blocks: List[sp.csr_matrix] = []
+        self._pending: List[sp.csr_matrix] = []
+        # Bytes of the log already read into the index
+        self._log_offset = 0
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def embed(self, queries: List[str]) -> sp.csr_matrix:
+        """Embed queries into L2-normalised hashed feature vectors."""
+        return self.vectorizer.transform(queries).tocsr()
+
+    def load(self):
+        """Rebuild the index from the on-disk query log, if any."""
+        if not self.path or not self.path.exists():
+            return
+        with file_lock(self._lock_path):
+            self._catch_up()
+        self.logger.info(f"Loaded {len(self.texts)} queries into query index")
+
+    def _catch_up(self):
+        """Read queries appended to the log since this process last read it; call under the log lock."""
+        size = self.path.stat().st_size if self.path.exists() else 0
+        if size < self._log_offset:
+            # Cleared by another process
+            self.texts, self.timestamps = [], []
+            self._blocks, self._pending = [], []
+            self._log_offset = 0
+        if size == self._log_offset:
+            return
+        texts, timestamps = [], []
+        with open(self.path, 'rb') as f:
+            f.seek(self._log_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # A torn final line from a crash; the next append cuts it off
+                    break
+                self._log_offset += len(line)
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                texts.append(record['query'])
+                timestamps.append(record.get('timestamp', ''))
+        if texts:
+            self.texts += texts
+            self.timestamps += timestamps
+            self._pending.append(self.embed(texts))
+
+    def add(self, query: str, timestamp: Optional[str] = None) -> int:
+        """Append a query to the index and the on-disk log. Returns its id."""
+        timestamp = timestamp or datetime.now().isoformat()
+        if not self.path:
+            self._append(query, timestamp)
+            return len(self.texts) - 1
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        line = (json.dumps({'query': query, 'timestamp': timestamp}, ensure_ascii=False) + "\n").encode('utf-8')
+        with file_lock(self._lock_path):
+            self._catch_up()
+            with open(self.path, 'ab') as f:
+                if f.tell() > self._log_offset:
+                    f.truncate(self._log_offset)
+                f.write(line)
+            self._log_offset += len(line)
+            self._append(query, timestamp)
+            return len(self.texts) - 1
+
+    def _append(self, query: str, timestamp: str):
+        self.texts.append(query)
+        self.timestamps.append(timestamp)
+        self._pending.append(self.embed([query]))
+
+    def _flush_pending(self):
+        """Seal pending rows into a block and merge blocks of similar size."""
+        if not self._pending:
+            return
+        self._blocks.append(sp.vstack(self._pending, format='csr'))
+        self._pending = []
+        while len(self._blocks) > 1 and self._blocks[-1].shape[0] >= self._blocks[-2].shape[0]:
+            newest = self._blocks.pop()
+            self._blocks[-1] = sp.vstack([self._blocks[-1], newest], format='csr')
+
+    def scores(self, query: str) -> np.ndarray:
+        """Cosine similarity of `query` against every stored query, in id order."""
+        self._flush_pending()
+        if not self._blocks:
+            return np.zeros(0, dtype=np.float32)
+        query_vector = self.embed([query]).T
+        return np.concatenate([
+            np.asarray((block @ query_vector).todense()).ravel()
+            for block in self._blocks
+        ])
+
+    def search(self, query: str, k: int = 5, threshold: float = 0.0) -> List[Tuple[int, float]]:
+        """Return up to `k` (query id, similarity) pairs above `threshold`, best first."""
+        similarities = self.scores(query)
+        if similarities.size == 0 or k <= 0:
+            return []
+        k = min(k, similarities.size)
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top])]
+        return [(int(i), float(similarities[i])) for i in top if similarities[i] > threshold]
+
+    def compact(self):
+        """Merge all blocks into one, e.g. before a long read-heavy phase."""
+        self._flush_pending()
+        if len(self._blocks) > 1:
+            self._blocks = [sp.vstack(self._blocks, format='csr')]
+
+    def clear(self):
+        """Drop every stored query, including the on-disk log."""
+        self.texts, self.timestamps = [], []
+        self._blocks, self._pending = [], []
+        self._log_offset = 0
+        if self.path and self.path.exists():
+            with file_lock(self._lock_path):
+                os.remove(self.path)
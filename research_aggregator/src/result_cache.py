@@ -0,0 +1,134 @@
+import copy
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+from query_index import QueryIndex
+
+
+class CacheLookup:
+    """Outcome of a result cache lookup.
+
+    `mode` is 'full' when the cached output can be returned as is, 'partial'
+    when only some cached article analyses are still usable, and 'miss'
+    otherwise.
+    """
+
+    def __init__(self, mode: str = 'miss', matched_query: Optional[str] = None,
+                 similarity: float = 0.0, output: Optional[Dict] = None,
+                 articles: Optional[List[Dict]] = None):
+        self.mode = mode
+        self.matched_query = matched_query
+        self.similarity = similarity
+        self.output = output
+        self.articles = articles or []
+
+    def metadata(self) -> Dict:
+        return {
+            'mode': self.mode,
+            'matched_query': self.matched_query,
+            'similarity': round(self.similarity, 4),
+            'reused_articles': len(self.articles)
+        }
+
+
+class ResultCache:
+    """Semantic cache of research outputs keyed by query similarity.
+
+    A new query whose similarity to a recent one is at least
+    `full_threshold` gets the saved output back, provided the entry is within
+    `ttl_seconds` and every source article is still fresh. Queries above
+    `partial_threshold` (or full matches with stale sources) reuse the fresh
+    processed articles and only scrape the remainder.
+    """
+
+    def __init__(self, full_threshold: float = 0.9, partial_threshold: float = 0.6,
+                 ttl_seconds: int = 6 * 3600, source_ttls: Optional[Dict[str, int]] = None,
+                 max_entries: int = 1000):
+        self.logger = logging.getLogger(__name__)
+        self.full_threshold = full_threshold
+        self.partial_threshold = partial_threshold
+        self.ttl_seconds = ttl_seconds
+        # Per-domain freshness limits, e.g. {'reuters.com': 3600}. Matches subdomains.
+        self.source_ttls = source_ttls or {}
+        self.max_entries = max_entries
+        self.index = QueryIndex()
+        self.entries = OrderedDict()
+        self.stats = {'full': 0, 'partial': 0, 'miss': 0}
+
+    def source_ttl(self, url: str) -> int:
+        """Freshness limit in seconds for the domain serving `url`."""
+        domain = urlparse(url).netloc.lower()
+        for source, ttl in self.source_ttls.items():
+            if domain == source or domain.endswith('.' + source):
+                return ttl
+        return self.ttl_seconds
+
+    def is_fresh(self, article: Dict, now: float) -> bool:
+        url = article.get('original_data', {}).get('url', '')
+        return now - article.get('_cached_at', 0) <= self.source_ttl(url)
+
+    def put(self, query: str, num_sources: int, output: Dict, processed_articles: List[Dict]):
+        """Store the output and processed articles of a completed research run."""
+        now = time.time()
+        articles = []
+        for article in processed_articles:
+            if not article.get('original_data'):
+                continue
+            article = dict(article)
+            article.setdefault('_cached_at', now)
+            articles.append(article)
+
+        entry_id = self.index.add(query)
+        self.entries[entry_id] = {
+            'query': query,
+            'num_sources': num_sources,
+            'created_at': now,
+            'output': output,
+            'articles': articles
+        }
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        if len(self.index) > 2 * self.max_entries:
+            self._rebuild_index()
+
+    def _rebuild_index(self):
+        """Re-index live entries so evicted ones stop occupying the index."""
+        entries = list(self.entries.values())
+        self.index = QueryIndex()
+        self.entries = OrderedDict()
+        for entry in entries:
+            self.entries[self.index.add(entry['query'])] = entry
+
+    def lookup(self, query: str, num_sources: int) -> CacheLookup:
+        """Find the best reusable entry for `query`."""
+        now = time.time()
+        for entry_id, similarity in self.index.search(query, k=10, threshold=self.partial_threshold):
+            entry = self.entries.get(entry_id)
+            # Evicted or expired entries stay in the append-only index; skip them
+            if entry is None or now - entry['created_at'] > self.ttl_seconds:
+                continue
+
+            fresh = [a for a in entry['articles'] if self.is_fresh(a, now)]
+            if not fresh:
+                continue
+
+            if (similarity >= self.full_threshold
+                    and len(fresh) == len(entry['articles'])
+                    and entry['num_sources'] >= num_sources):
+                self.stats['full'] += 1
+                return CacheLookup('full', entry['query'], similarity,
+                                   output=copy.deepcopy(entry['output']))
+
+            self.stats['partial'] += 1
+            return CacheLookup('partial', entry['query'], similarity,
+                               articles=fresh[:num_sources])
+
+        self.stats['miss'] += 1
+        return CacheLookup()
+
+    def clear(self):
+        self.index.clear()
+        self.entries.clear()
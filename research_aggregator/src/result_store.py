@@ -0,0 +1,283 @@
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import struct
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from file_lock import file_lock
+
+# Every record is stored as a 4-byte big-endian length followed by a
+# zlib-compressed JSON document, so a single result can be read back with one
+# seek without decompressing its neighbours.
+FRAME_HEADER = struct.Struct(">I")
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id TEXT PRIMARY KEY,
+    query TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    segment INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_results_query ON results (query, timestamp);
+CREATE INDEX IF NOT EXISTS idx_results_timestamp ON results (timestamp);
+"""
+
+
+class ResultStore:
+    """Append-only store for research results in compressed log segments.
+
+    Results are appended to the active segment file and indexed by id,
+    query and timestamp in a small SQLite database next to the segments.
+    The active segment is sealed and a new one started once it exceeds
+    `max_segment_bytes` or `max_segment_age` seconds; a background thread
+    checks the age limit so quiet stores still rotate.
+
+    Several processes may share a directory: appends, rotation and
+    recovery hold an flock on `segments.lock`, take offsets from the
+    segment's size on disk and follow a rotation done by another process.
+    """
+
+    def __init__(self, directory: str, max_segment_bytes: int = 64 * 1024 * 1024,
+                 max_segment_age: float = 24 * 3600, compression_level: int = 6,
+                 rotation_check_interval: float = 60.0):
+        self.logger = logging.getLogger(__name__)
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_age = max_segment_age
+        self.compression_level = compression_level
+
+        self._lock = threading.Lock()
+        self._lock_path = self.directory / "segments.lock"
+        self.index = sqlite3.connect(str(self.directory / "index.db"), timeout=30, check_same_thread=False)
+        self.index.execute("PRAGMA journal_mode=WAL")
+        self.index.executescript(INDEX_SCHEMA)
+
+        segments = self.list_segments()
+        self.active_segment = segments[-1] if segments else 1
+        self._open_active_segment()
+        self.recover()
+
+        self._stop = threading.Event()
+        self._rotator = threading.Thread(
+            target=self._rotation_loop,
+            args=(rotation_check_interval,),
+            name="result-store-rotator",
+            daemon=True
+        )
+        self._rotator.start()
+
+    def segment_path(self, segment: int) -> Path:
+        return self.directory / f"segment-{segment:06d}.log"
+
+    def list_segments(self) -> List[int]:
+        return sorted(
+            int(path.stem.split("-")[1])
+            for path in self.directory.glob("segment-*.log")
+        )
+
+    def _open_active_segment(self):
+        self._active_file = open(self.segment_path(self.active_segment), 'ab')
+        self._active_opened_at = time.time()
+
+    def _active_size(self) -> int:
+        # Other processes append to the same file, so our own position means nothing
+        return os.fstat(self._active_file.fileno()).st_size
+
+    def _follow_rotation_locked(self):
+        """Switch to the newest segment if another process has rotated since."""
+        if not self.segment_path(self.active_segment + 1).exists():
+            return
+        self._active_file.close()
+        while self.segment_path(self.active_segment + 1).exists():
+            self.active_segment += 1
+        self._open_active_segment()
+
+    # Writing
+
+    def append(self, query: str, results: Dict) -> str:
+        """Append a result and return its id."""
+        record_id = uuid.uuid4().hex
+        timestamp = datetime.now().isoformat()
+        record = {
+            'id': record_id,
+            'query': query,
+            'timestamp': timestamp,
+            'results': results
+        }
+        payload = zlib.compress(
+            json.dumps(record, ensure_ascii=False, default=str).encode('utf-8'),
+            self.compression_level
+        )
+
+        with self._lock, file_lock(self._lock_path):
+            self._follow_rotation_locked()
+            if self._active_size() >= self.max_segment_bytes:
+                self._rotate_locked()
+            # A writer that died mid-frame leaves a torn tail to cut off first
+            self._recover_locked()
+            offset = self._active_size() + FRAME_HEADER.size
+            self._active_file.write(FRAME_HEADER.pack(len(payload)) + payload)
+            self._active_file.flush()
+            with self.index:
+                self.index.execute(
+                    "INSERT INTO results (id, query, timestamp, segment, offset, length) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (record_id, query, timestamp, self.active_segment, offset, len(payload))
+                )
+        return record_id
+
+    def rotate(self):
+        """Seal the active segment and start a new one."""
+        with self._lock, file_lock(self._lock_path):
+            self._follow_rotation_locked()
+            self._rotate_locked()
+
+    def _rotate_locked(self):
+        if self._active_size() == 0:
+            return
+        self._active_file.close()
+        self.logger.info(f"Sealed result segment {self.segment_path(self.active_segment).name}")
+        self.active_segment += 1
+        self._open_active_segment()
+
+    def _rotation_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            if time.time() - self._active_opened_at >= self.max_segment_age:
+                try:
+                    self.rotate()
+                except (OSError, ValueError) as e:
+                    self.logger.error(f"Error rotating result segment: {str(e)}")
+
+    def recover(self):
+        """Index frames written after the last indexed one and drop a torn tail."""
+        with self._lock, file_lock(self._lock_path):
+            self._follow_rotation_locked()
+            self._recover_locked()
+
+    def _recover_locked(self):
+        # Writers hold the file lock from the frame write to its index row,
+        # so anything unindexed here was left by a writer that died
+        row = self.index.execute(
+            "SELECT MAX(offset + length) FROM results WHERE segment = ?",
+            (self.active_segment,)
+        ).fetchone()
+        position = row[0] if row and row[0] is not None else 0
+        path = self.segment_path(self.active_segment)
+        size = self._active_size()
+        if position >= size:
+            return
+
+        recovered = 0
+        with open(path, 'rb') as f:
+            f.seek(position)
+            while True:
+                frame = self._read_frame(f)
+                if frame is None:
+                    break
+                offset, payload = frame
+                try:
+                    record = json.loads(zlib.decompress(payload))
+                except (zlib.error, ValueError):
+                    break
+                with self.index:
+                    self.index.execute(
+                        "INSERT OR IGNORE INTO results (id, query, timestamp, segment, offset, length) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (record['id'], record['query'], record['timestamp'],
+                         self.active_segment, offset, len(payload))
+                    )
+                recovered += 1
+                position = offset + len(payload)
+
+        if position < size:
+            self._active_file.truncate(position)
+            self.logger.warning(f"Truncated torn record at end of {path.name}")
+        if recovered:
+            self.logger.info(f"Recovered {recovered} unindexed results from {path.name}")
+
+    # Reading
+
+    @staticmethod
+    def _read_frame(f):
+        """Read one frame, returning (payload offset, payload) or None at EOF/torn tail."""
+        header = f.read(FRAME_HEADER.size)
+        if len(header) < FRAME_HEADER.size:
+            return None
+        (length,) = FRAME_HEADER.unpack(header)
+        offset = f.tell()
+        payload = f.read(length)
+        if len(payload) < length:
+            return None
+        return offset, payload
+
+    def get(self, record_id: str) -> Optional[Dict]:
+        """Load a single result by id."""
+        row = self.index.execute(
+            "SELECT segment, offset, length FROM results WHERE id = ?",
+            (record_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        segment, offset, length = row
+        with open(self.segment_path(segment), 'rb') as f:
+            f.seek(offset)
+            return json.loads(zlib.decompress(f.read(length)))
+
+    def find(self, query: Optional[str] = None, since: Optional[str] = None,
+             until: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """List result metadata matching the filters, newest first."""
+        clauses, params = [], []
+        if query is not None:
+            clauses.append("query = ?")
+            params.append(query)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self.index.execute(
+            f"SELECT id, query, timestamp FROM results {where} ORDER BY timestamp DESC LIMIT ?",
+            params + [limit]
+        ).fetchall()
+        return [{'id': i, 'query': q, 'timestamp': ts} for i, q, ts in rows]
+
+    def iter_results(self) -> Iterator[Dict]:
+        """Stream every stored result in write order, one segment at a time."""
+        with self._lock:
+            self._active_file.flush()
+        for segment in self.list_segments():
+            with open(self.segment_path(segment), 'rb') as f:
+                while True:
+                    frame = self._read_frame(f)
+                    if frame is None:
+                        break
+                    yield json.loads(zlib.decompress(frame[1]))
+
+    def export_jsonl(self, path: str) -> int:
+        """Stream all results into a gzipped JSON Lines file. Returns the count."""
+        count = 0
+        with gzip.open(path, 'wt', encoding='utf-8') as out:
+            for record in self.iter_results():
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                count += 1
+        return count
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            if not self._active_file.closed:
+                self._active_file.close()
+        self.index.close()
@@ -1,7 +1,7 @@
 import requests
 from bs4 import BeautifulSoup
 from newspaper import Article
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict
 import time
 import logging
 from urllib.parse import urlparse
@@ -11,12 +11,23 @@ import asyncio
 from concurrent.futures import ThreadPoolExecutor
 import json
 import os
+import hashlib
+from instrumentation import metrics, run_in_context
+from host_stats import HostStats
 
 class WebScraper:
-    def __init__(self):
+    def __init__(self, search_url: str = "https://html.duckduckgo.com/html/",
+                 hedging: bool = True, overprovision: float = 2.0, request_timeout: float = 20.0):
+        self.search_url = search_url
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
+        # Send a backup request when a host is slower than its usual p95
+        self.hedging = hedging
+        # Search for this many times the wanted sources so stragglers can be dropped
+        self.overprovision = overprovision
+        self.request_timeout = request_timeout
+        self.host_stats = HostStats()
         self.setup_logging()
         self.setup_cache()
         self.executor = ThreadPoolExecutor(max_workers=5)
@@ -35,7 +46,8 @@ class WebScraper:
 
     def get_cache_path(self, url: str) -> str:
         """Get cache file path for a URL."""
-        url_hash = hash(url)
+        # hash() is salted per process, so use a stable digest to keep the cache valid across runs
+        url_hash = hashlib.sha1(url.encode('utf-8')).hexdigest()
         return os.path.join(self.cache_dir, f"{url_hash}.json")
 
     def load_from_cache(self, url: str) -> Dict:
@@ -50,7 +62,8 @@ class WebScraper:
         """Save content to cache."""
         cache_path = self.get_cache_path(url)
         with open(cache_path, 'w', encoding='utf-8') as f:
-            json.dump(content, f, ensure_ascii=False)
+            # publish_date is a datetime
+            json.dump(content, f, ensure_ascii=False, default=str)
 
     def is_valid_url(self, url: str) -> bool:
         """Check if the URL is valid and accessible."""
@@ -71,54 +84,99 @@ class WebScraper:
     async def fetch_url(self, session: aiohttp.ClientSession, url: str) -> str:
         """Fetch URL content asynchronously."""
         try:
-            async with session.get(url, headers=self.headers) as response:
-                return await response.text()
+            with metrics.span('fetch', url=url):
+                async with session.get(url, headers=self.headers) as response:
+                    if response.status >= 400:
+                        self.logger.warning(f"Error fetching {url}: HTTP {response.status}")
+                        return ""
+                    html = await response.text()
+            metrics.incr('scraper.bytes_fetched', len(html.encode('utf-8')))
+            return html
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             self.logger.error(f"Error fetching {url}: {str(e)}")
             return ""
 
-    async def scrape_article_async(self, url: str) -> Dict:
-        """Scrape a single article asynchronously."""
+    async def fetch_hedged(self, session: aiohttp.ClientSession, url: str) -> str:
+        """Fetch a URL, racing a backup request if the host is slower than usual."""
+        host = self.host_stats.host_of(url)
+        started = time.monotonic()
+        pending = {asyncio.ensure_future(self.fetch_url(session, url))}
+        html = ""
+        try:
+            if self.hedging:
+                done, _ = await asyncio.wait(pending, timeout=self.host_stats.hedge_delay(host))
+                if not done:
+                    metrics.incr('scraper.hedged_requests')
+                    pending.add(asyncio.ensure_future(self.fetch_url(session, url)))
+            while pending and not html:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                html = next((task.result() for task in done if task.result()), "")
+        finally:
+            for task in pending:
+                task.cancel()
+        self.host_stats.record(host, time.monotonic() - started, bool(html))
+        return html
+
+    def parse_article(self, url: str, html: str) -> Dict:
+        """Extract article fields from fetched HTML."""
+        with metrics.span('parse', url=url):
+            article = Article(url)
+            article.set_html(html)
+            article.parse()
+            article.nlp()
+
+        return {
+            'title': article.title,
+            'text': self.clean_text(article.text),
+            'summary': article.summary,
+            'keywords': article.keywords,
+            'url': url,
+            'publish_date': article.publish_date,
+            'authors': article.authors
+        }
+
+    async def scrape_article_async(self, url: str, use_cache: bool = True) -> Dict:
+        """Scrape a single article asynchronously.
+
+        With use_cache=False the page is always fetched again (and the
+        cache refreshed), e.g. to see whether it changed.
+        """
         # Check cache first
-        cached_content = self.load_from_cache(url)
+        cached_content = self.load_from_cache(url) if use_cache else None
         if cached_content:
+            metrics.incr('scraper.cache_hit')
             return cached_content
+        metrics.incr('scraper.cache_miss' if use_cache else 'scraper.refetch')
 
         try:
-            async with aiohttp.ClientSession() as session:
-                html = await self.fetch_url(session, url)
-                if not html:
-                    return None
-
-                article = Article(url)
-                article.set_html(html)
-                article.parse()
-                article.nlp()
-
-                content = {
-                    'title': article.title,
-                    'text': self.clean_text(article.text),
-                    'summary': article.summary,
-                    'keywords': article.keywords,
-                    'url': url,
-                    'publish_date': article.publish_date,
-                    'authors': article.authors
-                }
-
-                # Save to cache
-                self.save_to_cache(url, content)
-                return content
+            timeout = aiohttp.ClientTimeout(total=self.request_timeout)
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                html = await self.fetch_hedged(session, url)
+            if not html:
+                return None
+
+            # Parsing is CPU-bound; keep it off the event loop
+            loop = asyncio.get_running_loop()
+            content = await loop.run_in_executor(self.executor, run_in_context(self.parse_article, url, html))
+
+            # Save to cache
+            self.save_to_cache(url, content)
+            return content
 
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             self.logger.error(f"Error scraping {url}: {str(e)}")
             return None
 
+    @metrics.timed('search')
     def search_duckduckgo(self, query: str, num_results: int = 10) -> List[str]:
         """Search DuckDuckGo for relevant URLs (free alternative to Google)."""
         try:
             # Using DuckDuckGo's HTML interface
-            search_url = f"https://html.duckduckgo.com/html/?q={query}"
-            response = requests.get(search_url, headers=self.headers)
+            response = requests.get(self.search_url, params={'q': query}, headers=self.headers)
             soup = BeautifulSoup(response.text, 'html.parser')
             
             urls = []
@@ -152,27 +210,55 @@ class WebScraper:
             "aljazeera.com"
         ]
 
-    async def scrape_multiple_sources(self, query: str, num_sources: int = 5) -> List[Dict]:
-        """Scrape multiple sources for a given query asynchronously."""
-        # Get URLs from DuckDuckGo
-        urls = self.search_duckduckgo(query, num_sources)
-        
-        # Add academic and news sources
-        academic_sources = self.get_academic_sources()
-        news_sources = self.get_news_sources()
-        
-        # Create tasks for async scraping
-        tasks = []
-        async with aiohttp.ClientSession() as session:
-            for url in urls:
-                if self.is_valid_url(url):
-                    tasks.append(self.scrape_article_async(url))
-            
-            # Wait for all tasks to complete
-            results = await asyncio.gather(*tasks)
-        
-        # Filter out None results
-        return [r for r in results if r is not None]
+    async def search_sources(self, query: str, num_sources: int = 5, exclude_urls: List[str] = None,
+                             preferred_domains: List[str] = None) -> List[str]:
+        """Search for candidate URLs without blocking the event loop.
+
+        Returns up to `overprovision` times `num_sources` candidates, best
+        host first, so callers can stop once enough articles have arrived.
+        """
+        loop = asyncio.get_running_loop()
+        num_candidates = max(num_sources, int(round(num_sources * self.overprovision)))
+        urls = await loop.run_in_executor(self.executor, run_in_context(self.search_duckduckgo, query, num_candidates))
+        # Skip any URLs the caller already has
+        excluded = set(exclude_urls or [])
+        urls = [url for url in urls if self.is_valid_url(url) and url not in excluded]
+        return self.host_stats.rank(urls, preferred_domains)
+
+    async def iter_scraped_articles(self, urls: List[str], use_cache: bool = True) -> AsyncIterator[Dict]:
+        """Scrape URLs concurrently, yielding each article as soon as it is ready."""
+        tasks = [asyncio.ensure_future(self.scrape_article_async(url, use_cache)) for url in urls]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                article = await next_done
+                if article is not None:
+                    yield article
+        finally:
+            # Consumers may stop early; cancel the stragglers
+            stragglers = [task for task in tasks if not task.done()]
+            if stragglers:
+                metrics.incr('scraper.stragglers_cancelled', len(stragglers))
+            for task in stragglers:
+                task.cancel()
+
+    async def scrape_multiple_sources(self, query: str, num_sources: int = 5, exclude_urls: List[str] = None,
+                                      preferred_domains: List[str] = None) -> List[Dict]:
+        """Scrape multiple sources for a given query asynchronously.
+
+        Stops as soon as `num_sources` articles have been scraped, cancelling
+        the slower fetches.
+        """
+        urls = await self.search_sources(query, num_sources, exclude_urls, preferred_domains)
+        articles = []
+        stream = self.iter_scraped_articles(urls)
+        try:
+            async for article in stream:
+                articles.append(article)
+                if len(articles) >= num_sources:
+                    break
+        finally:
+            await stream.aclose()
+        return articles
 
     def get_relevant_sources(self, query: str) -> List[str]:
         """Get a list of relevant sources based on the query."""
@@ -0,0 +1,133 @@
+import functools
+import importlib.util
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# With FAST_START=1, missing NLTK data and spaCy models are reported instead of
+# downloaded, so a pod never blocks on the network while starting
+FAST_START = os.getenv("FAST_START", "0") == "1"
+
+
+class StartupProfile:
+    """Wall time and modules imported for each phase of an entry point's startup.
+
+    Wrap imports and initialisation in `phase()`; `report()` then shows
+    where the startup time went. Set STARTUP_PROFILE=1 to have entry points
+    log it once they are up.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.phases: List[Dict] = []
+
+    @contextmanager
+    def phase(self, label: str):
+        modules = len(sys.modules)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append({
+                'phase': label,
+                'seconds': round(time.perf_counter() - start, 3),
+                'modules_imported': len(sys.modules) - modules
+            })
+
+    def report(self) -> Dict:
+        return {
+            'entry_point': self.name,
+            'total_seconds': round(time.perf_counter() - self.started, 3),
+            'phases': sorted(self.phases, key=lambda phase: phase['seconds'], reverse=True)
+        }
+
+    def format(self) -> str:
+        report = self.report()
+        lines = [f"Startup profile for {self.name}: {report['total_seconds']:.2f}s"]
+        lines += [
+            f"  {phase['seconds']:7.3f}s  {phase['modules_imported']:5d} modules  {phase['phase']}"
+            for phase in report['phases']
+        ]
+        return "\n".join(lines)
+
+    def log_if_enabled(self):
+        if os.getenv("STARTUP_PROFILE", "0") == "1":
+            logger.info(self.format())
+
+
+class Readiness:
+    """Warm-up status of the heavy components behind an entry point.
+
+    Components are 'pending', 'loading', 'ready' or 'failed'; the process is
+    ready once every registered component is ready.
+    """
+
+    def __init__(self):
+        self.components: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def set(self, component: str, status: str, detail: Optional[str] = None):
+        with self._lock:
+            self.components[component] = {'status': status, 'detail': detail, 'updated': time.time()}
+
+    @property
+    def ready(self) -> bool:
+        with self._lock:
+            return all(state['status'] == 'ready' for state in self.components.values())
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            components = {name: dict(state) for name, state in self.components.items()}
+        return {'ready': all(state['status'] == 'ready' for state in components.values()),
+                'components': components}
+
+    def warm_up(self, component: str, load: Callable[[], object]) -> threading.Thread:
+        """Run `load` on a background thread, tracking it as `component`."""
+        self.set(component, 'pending')
+
+        def run():
+            self.set(component, 'loading')
+            started = time.perf_counter()
+            try:
+                load()
+                self.set(component, 'ready', f"loaded in {time.perf_counter() - started:.1f}s")
+            except Exception as e:
+                logger.error(f"Warm-up of {component} failed: {str(e)}")
+                self.set(component, 'failed', str(e))
+
+        thread = threading.Thread(target=run, name=f'warm-up-{component}', daemon=True)
+        thread.start()
+        return thread
+
+
+@functools.lru_cache(maxsize=None)
+def ensure_nltk_resource(package: str, resource_path: str) -> bool:
+    """Make sure an NLTK resource (e.g. 'punkt', 'tokenizers/punkt') is available.
+
+    The local NLTK data directories are checked first; the resource is only
+    downloaded when it is missing there and FAST_START is off. The outcome
+    is remembered, so callers can check on every use.
+    """
+    import nltk
+    try:
+        nltk.data.find(resource_path)
+        return True
+    except LookupError:
+        pass
+    if FAST_START:
+        logger.error(f"NLTK resource '{package}' not found locally; install it with "
+                     f"`python -m nltk.downloader {package}`")
+        return False
+    return bool(nltk.download(package, quiet=True))
+
+
+def spacy_model_available(name: str) -> bool:
+    """Whether a spaCy model package is installed, without loading spaCy."""
+    return importlib.util.find_spec(name) is not None
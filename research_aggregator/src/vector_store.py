@@ -0,0 +1,150 @@
+import logging
+import sys
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+DTYPES = ('float32', 'float16', 'int8')
+
+
+class VectorStore:
+    """Cosine-similarity index over embeddings kept at reduced precision.
+
+    Vectors are L2-normalised and stored in one preallocated matrix that
+    doubles as it fills, so adding never refits anything. With
+    dtype='float16' each vector takes half the memory of float32 and
+    scores are computed in float32 block by block. With dtype='int8' each
+    vector is quantized with its own scale (a quarter of float32): the
+    whole matrix is scored with integer dot products, then the best
+    `rescore_factor * k` candidates are dequantized and rescored against
+    the full-precision query. Only the stored vectors' rounding error is
+    left, about 0.001 in cosine, so just near-ties can swap places.
+
+    With `max_items` set, the oldest items are dropped once it is exceeded.
+    """
+
+    def __init__(self, dimension: int = 384, dtype: str = 'float16', capacity: int = 256,
+                 rescore_factor: int = 4, max_items: Optional[int] = None, block_rows: int = 8192):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported dtype '{dtype}'; expected one of {', '.join(DTYPES)}")
+        self.logger = logging.getLogger(__name__)
+        self.dimension = dimension
+        self.dtype = dtype
+        self.rescore_factor = rescore_factor
+        self.max_items = max_items
+        self.block_rows = block_rows
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((capacity, dimension), dtype=np.dtype(dtype))
+        self._scales = np.zeros(capacity, dtype=np.float32) if dtype == 'int8' else None
+        self._size = 0
+        self.items: List[str] = []
+        self._item_bytes = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the vectors and the stored items."""
+        scales = self._scales.nbytes if self._scales is not None else 0
+        return self._vectors.nbytes + scales + self._item_bytes
+
+    def _normalize(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def _quantize(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def _grow(self, needed: int):
+        capacity = len(self._vectors)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        vectors = np.zeros((capacity, self.dimension), dtype=self._vectors.dtype)
+        vectors[:self._size] = self._vectors[:self._size]
+        self._vectors = vectors
+        if self._scales is not None:
+            scales = np.zeros(capacity, dtype=np.float32)
+            scales[:self._size] = self._scales[:self._size]
+            self._scales = scales
+
+    def add(self, vectors: np.ndarray, items: List[str]):
+        """Add embeddings (one row per item) and the items they stand for."""
+        vectors = self._normalize(vectors)
+        if len(vectors) != len(items):
+            raise ValueError(f"Got {len(vectors)} vectors for {len(items)} items")
+        with self._lock:
+            self._grow(self._size + len(vectors))
+            end = self._size + len(vectors)
+            if self._scales is not None:
+                self._vectors[self._size:end], self._scales[self._size:end] = self._quantize(vectors)
+            else:
+                self._vectors[self._size:end] = vectors
+            self._size = end
+            self.items.extend(items)
+            self._item_bytes += sum(sys.getsizeof(item) for item in items)
+            if self.max_items is not None and self._size > self.max_items:
+                self._drop_oldest(self._size - self.max_items)
+
+    def _drop_oldest(self, count: int):
+        keep = self._size - count
+        self._vectors[:keep] = self._vectors[count:self._size]
+        if self._scales is not None:
+            self._scales[:keep] = self._scales[count:self._size]
+        self._item_bytes -= sum(sys.getsizeof(item) for item in self.items[:count])
+        del self.items[:count]
+        self._size = keep
+
+    def _dequantize(self, rows: np.ndarray) -> np.ndarray:
+        if self._scales is None:
+            return self._vectors[rows].astype(np.float32)
+        return self._vectors[rows].astype(np.float32) * self._scales[rows, None]
+
+    def _coarse_scores(self, query: np.ndarray) -> np.ndarray:
+        """Scores of every stored vector, computed a block at a time in the storage's cheapest form."""
+        scores = np.empty(self._size, dtype=np.float32)
+        if self._scales is not None:
+            codes, scale = self._quantize(query[None, :])
+            codes = codes[0].astype(np.int32)
+        for start in range(0, self._size, self.block_rows):
+            end = min(start + self.block_rows, self._size)
+            if self._scales is not None:
+                raw = self._vectors[start:end].astype(np.int32) @ codes
+                scores[start:end] = raw * self._scales[start:end] * scale[0]
+            else:
+                scores[start:end] = self._vectors[start:end].astype(np.float32) @ query
+        return scores
+
+    def _search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        if self._size == 0 or k <= 0:
+            return []
+        query = self._normalize(query)[0]
+        scores = self._coarse_scores(query)
+        candidates = min(self._size, k * self.rescore_factor if self._scales is not None else k)
+        top = np.argpartition(-scores, candidates - 1)[:candidates]
+        if self._scales is not None:
+            # Rescore the shortlist against the full-precision query
+            top_scores = self._dequantize(top) @ query
+        else:
+            top_scores = scores[top]
+        order = np.argsort(-top_scores, kind='stable')[:k]
+        return [(int(top[i]), float(top_scores[i])) for i in order]
+
+    def search(self, query: np.ndarray, k: int = 5) -> List[Tuple[int, float]]:
+        """The k most similar stored vectors as (position, cosine similarity), best first."""
+        with self._lock:
+            return self._search(query, k)
+
+    def search_items(self, query: np.ndarray, k: int = 5) -> List[str]:
+        with self._lock:
+            return [self.items[i] for i, _ in self._search(query, k)]
+
+    def clear(self):
+        with self._lock:
+            self._size = 0
+            self.items = []
+            self._item_bytes = 0
@@ -0,0 +1,318 @@
+import argparse
+import asyncio
+import atexit
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from main import ResearchAggregator
+from instrumentation import metrics, run_in_context
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS watches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    query TEXT NOT NULL UNIQUE,
+    num_sources INTEGER NOT NULL,
+    interval_seconds REAL NOT NULL,
+    next_run_at REAL NOT NULL,
+    last_run_at REAL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_watches_next_run ON watches (next_run_at);
+
+CREATE TABLE IF NOT EXISTS watch_articles (
+    watch_id INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    analysis TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_changed REAL NOT NULL,
+    PRIMARY KEY (watch_id, url)
+);
+
+CREATE TABLE IF NOT EXISTS watch_state (
+    watch_id INTEGER PRIMARY KEY,
+    combined TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+def fingerprint(article: Dict) -> str:
+    """Content fingerprint of a scraped article: its title and text with whitespace and case normalized."""
+    content = f"{article.get('title') or ''}\n{article.get('text') or ''}"
+    return hashlib.sha256(re.sub(r'\s+', ' ', content).strip().lower().encode('utf-8')).hexdigest()
+
+
+def stored_analysis(processed: Dict) -> Dict:
+    """A processed article as kept between runs: without its embedding or full text."""
+    original = {key: value for key, value in processed['original_data'].items() if key != 'text'}
+    analysis = {key: value for key, value in processed.items() if key not in ('embedding', 'original_data')}
+    return {**analysis, 'original_data': original}
+
+
+class WatchlistStore:
+    """Standing queries, the articles last seen for each, and each one's combined analysis."""
+
+    def __init__(self, path: str = "data/memory/watchlist.db"):
+        self.logger = logging.getLogger(__name__)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        atexit.register(self.close)
+
+    def add(self, query: str, num_sources: int = 5, interval_seconds: float = 86400) -> int:
+        """Watch a query (or change an existing watch's settings); it is due immediately."""
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO watches (query, num_sources, interval_seconds, next_run_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT(query) DO UPDATE SET "
+                "num_sources = excluded.num_sources, interval_seconds = excluded.interval_seconds",
+                (query, num_sources, interval_seconds, now, now)
+            )
+            return self.conn.execute("SELECT id FROM watches WHERE query = ?", (query,)).fetchone()['id']
+
+    def remove(self, query: str) -> bool:
+        with self._lock, self.conn:
+            row = self.conn.execute("SELECT id FROM watches WHERE query = ?", (query,)).fetchone()
+            if row is None:
+                return False
+            for table in ('watch_articles', 'watch_state'):
+                self.conn.execute(f"DELETE FROM {table} WHERE watch_id = ?", (row['id'],))
+            self.conn.execute("DELETE FROM watches WHERE id = ?", (row['id'],))
+            return True
+
+    def watches(self) -> List[Dict]:
+        with self._lock:
+            return [dict(row) for row in self.conn.execute("SELECT * FROM watches ORDER BY next_run_at")]
+
+    def due(self, now: Optional[float] = None) -> List[Dict]:
+        with self._lock:
+            return [dict(row) for row in self.conn.execute(
+                "SELECT * FROM watches WHERE next_run_at <= ? ORDER BY next_run_at", (now or time.time(),)
+            )]
+
+    def articles(self, watch_id: int) -> Dict[str, Dict]:
+        """url -> {'fingerprint', 'analysis', 'first_seen', 'last_changed'} for the articles last seen."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT url, fingerprint, analysis, first_seen, last_changed FROM watch_articles WHERE watch_id = ?",
+                (watch_id,)
+            ).fetchall()
+        return {row['url']: {**dict(row), 'analysis': json.loads(row['analysis'])} for row in rows}
+
+    def combined(self, watch_id: int) -> Optional[Dict]:
+        with self._lock:
+            row = self.conn.execute("SELECT combined FROM watch_state WHERE watch_id = ?", (watch_id,)).fetchone()
+        return json.loads(row['combined']) if row else None
+
+    def save_run(self, watch: Dict, current: Dict[str, Dict], dropped: List[str], combined: Optional[Dict]):
+        """Record one refresh in a single transaction and schedule the next.
+
+        `current` maps url -> {'fingerprint', 'analysis', 'changed'} for every
+        article in this run; only changed ones are rewritten.
+        """
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO watch_articles (watch_id, url, fingerprint, analysis, first_seen, last_changed) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(watch_id, url) DO UPDATE SET "
+                "fingerprint = excluded.fingerprint, analysis = excluded.analysis, last_changed = excluded.last_changed",
+                [
+                    (watch['id'], url, entry['fingerprint'],
+                     json.dumps(entry['analysis'], ensure_ascii=False, default=str), now, now)
+                    for url, entry in current.items() if entry['changed']
+                ]
+            )
+            self.conn.executemany(
+                "DELETE FROM watch_articles WHERE watch_id = ? AND url = ?", [(watch['id'], url) for url in dropped]
+            )
+            if combined is not None:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO watch_state (watch_id, combined, updated_at) VALUES (?, ?, ?)",
+                    (watch['id'], json.dumps(combined, ensure_ascii=False, default=str), now)
+                )
+            self.conn.execute(
+                "UPDATE watches SET last_run_at = ?, next_run_at = ? WHERE id = ?",
+                (now, now + watch['interval_seconds'], watch['id'])
+            )
+
+    def close(self):
+        with self._lock:
+            try:
+                self.conn.close()
+            except sqlite3.ProgrammingError:
+                pass
+
+
+class WatchlistRunner:
+    """Re-crawl watched queries on their schedule, reprocessing only what changed.
+
+    Each refresh searches again and fetches the pages fresh. An article
+    whose content fingerprint matches the last run keeps its stored
+    analysis; only new and changed articles go through the NLP models,
+    in one batch. The combined analysis is then updated with
+    NLPProcessor.update_combined, which reuses the stored per-article
+    results instead of rerunning combine_summaries, and left as is when
+    nothing changed.
+    """
+
+    def __init__(self, aggregator: Optional[ResearchAggregator] = None, store: Optional[WatchlistStore] = None,
+                 nlp_batch_size: int = 8):
+        self.logger = logging.getLogger(__name__)
+        self.aggregator = aggregator or ResearchAggregator()
+        self.store = store or WatchlistStore()
+        self.nlp_batch_size = nlp_batch_size
+
+    async def fetch(self, watch: Dict) -> List[Dict]:
+        urls = await self.aggregator.scraper.search_sources(watch['query'], watch['num_sources'])
+        articles = []
+        stream = self.aggregator.scraper.iter_scraped_articles(urls, use_cache=False)
+        try:
+            async for article in stream:
+                articles.append(article)
+                if len(articles) >= watch['num_sources']:
+                    break
+        finally:
+            await stream.aclose()
+        return articles
+
+    async def refresh(self, watch: Dict) -> Dict:
+        """Re-crawl one watch; returns the research output, with change counts in metadata['watch']."""
+        loop = asyncio.get_running_loop()
+        known = self.store.articles(watch['id'])
+        articles = await self.fetch(watch)
+        if not articles:
+            # Keep the last good state rather than wipe it over a failed search
+            self.logger.warning(f"Watch '{watch['query']}': no articles fetched; keeping the previous state")
+            self.store.save_run(watch, {}, [], None)
+            return {}
+
+        current, delta = {}, []
+        for article in articles:
+            digest = fingerprint(article)
+            previous = known.get(article['url'])
+            if previous and previous['fingerprint'] == digest:
+                current[article['url']] = {'fingerprint': digest, 'analysis': previous['analysis'], 'changed': False}
+            else:
+                current[article['url']] = {'fingerprint': digest, 'analysis': None, 'changed': True}
+                delta.append(article)
+        dropped = [url for url in known if url not in current]
+        counts = {
+            'new': sum(1 for a in delta if a['url'] not in known),
+            'changed': sum(1 for a in delta if a['url'] in known),
+            'unchanged': len(articles) - len(delta),
+            'dropped': len(dropped)
+        }
+        metrics.incr('watchlist.articles_reprocessed', len(delta))
+        metrics.incr('watchlist.articles_reused', counts['unchanged'])
+
+        processed = []
+        if delta:
+            processed = await loop.run_in_executor(
+                self.aggregator.nlp_executor,
+                run_in_context(self.aggregator.nlp_processor.process_articles, delta, self.nlp_batch_size)
+            )
+        changed_analyses = []
+        for processed_article in processed:
+            if processed_article:
+                entry = current[processed_article['original_data']['url']]
+                entry['analysis'] = stored_analysis(processed_article)
+                changed_analyses.append(entry['analysis'])
+        # Articles whose processing failed are left out of this run
+        current = {url: entry for url, entry in current.items() if entry['analysis'] is not None}
+        analyses = [entry['analysis'] for entry in current.values()]
+
+        previous_combined = self.store.combined(watch['id'])
+        if previous_combined and not changed_analyses and not dropped:
+            combined = previous_combined
+        else:
+            combined = await loop.run_in_executor(
+                self.aggregator.nlp_executor,
+                run_in_context(self.aggregator.nlp_processor.update_combined,
+                               previous_combined, changed_analyses, analyses)
+            )
+
+        output = self.aggregator.format_output(combined, analyses)
+        output['metadata']['watch'] = counts
+        self.store.save_run(watch, current, dropped, combined)
+        if changed_analyses or dropped:
+            self.aggregator.update_memory(watch['query'], output)
+            self.aggregator.save_results(output, watch['query'])
+            self.aggregator.record_corpus([p for p in processed if p])
+        self.logger.info(f"Watch '{watch['query']}': {counts}")
+        return output
+
+    async def run_due(self) -> Dict[str, Dict]:
+        """Refresh every watch that is due; returns each one's change counts."""
+        results = {}
+        for watch in self.store.due():
+            try:
+                with metrics.span('watchlist.refresh', query=watch['query']):
+                    output = await self.refresh(watch)
+                results[watch['query']] = output.get('metadata', {}).get('watch', {})
+            except Exception as e:
+                self.logger.error(f"Error refreshing watch '{watch['query']}': {str(e)}")
+                results[watch['query']] = {'error': str(e)}
+        return results
+
+    async def run_forever(self, poll_seconds: float = 60):
+        while True:
+            await self.run_due()
+            await asyncio.sleep(poll_seconds)
+
+
+def parse_interval(text: str) -> float:
+    """'30m', '6h', '1d' or plain seconds."""
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    if text[-1:] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Manage and run research watchlists.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="Watch a query")
+    add.add_argument("query")
+    add.add_argument("--every", default="1d", help="Re-crawl interval, e.g. 30m, 6h, 1d")
+    add.add_argument("--num-sources", type=int, default=5)
+    remove = commands.add_parser("remove", help="Stop watching a query")
+    remove.add_argument("query")
+    commands.add_parser("list", help="Show watched queries")
+    run = commands.add_parser("run", help="Refresh due watches")
+    run.add_argument("--forever", action="store_true", help="Keep running, checking for due watches")
+    run.add_argument("--poll", type=float, default=60, help="Seconds between checks with --forever")
+    args = parser.parse_args()
+
+    store = WatchlistStore()
+    if args.command == "add":
+        store.add(args.query, args.num_sources, parse_interval(args.every))
+    elif args.command == "remove":
+        print("Removed" if store.remove(args.query) else "Not watched")
+    elif args.command == "list":
+        for watch in store.watches():
+            print(json.dumps(watch))
+    else:
+        runner = WatchlistRunner(store=store)
+        if args.forever:
+            await runner.run_forever(args.poll)
+        else:
+            print(json.dumps(await runner.run_due(), indent=2))
+            print("\nStage Timings:")
+            print(metrics.report())
+
+if __name__ == "__main__":
+    asyncio.run(main())
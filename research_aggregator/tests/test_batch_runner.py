@@ -0,0 +1,141 @@
+import sys
+import os
+import asyncio
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Add the src directory (ahead of the API's main.py) and the benchmarks (for the stub models) to the Python path
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(root, 'src'))
+sys.path.append(os.path.join(root, 'benchmarks'))
+
+from main import ResearchAggregator
+from batch_runner import BatchRunner, load_queries
+from stub_models import StubNLPProcessor
+
+TEXTS = [
+    "Acme Energy opened a plant. The battery storage market grew faster than expected. " * 40,
+    "Grid Corp warned of fragile supply. A new milestone was approved in Texas. " * 3,
+    "Solar Power Inc reported savings. " * 300,
+]
+
+class Processor(StubNLPProcessor):
+    """Stub models, with a regex sentence splitter so chunking needs no NLTK data."""
+
+    def chunk_text(self, text, max_length=1024):
+        chunks, current = [], []
+        for sentence in re.split(r"(?<=[.!?])\s+", text.strip()):
+            if current and len(" ".join(current + [sentence]).split()) > max_length:
+                chunks.append(" ".join(current))
+                current = []
+            current.append(sentence)
+        return chunks + [" ".join(current)] if current else chunks
+
+def comparable(processed):
+    return [{key: value for key, value in p.items() if key != 'embedding'} for p in processed]
+
+def check_process_articles():
+    articles = [{'url': f"https://site.example/{i}", 'title': f"Article {i}", 'text': text}
+                for i, text in enumerate(TEXTS)]
+
+    processor = Processor()
+    one_by_one = [processor.process_article(article) for article in articles]
+    batched = processor.process_articles(articles, batch_size=2)
+    assert comparable(batched) == comparable(one_by_one)
+    assert np.allclose(np.stack([p['embedding'] for p in batched]), np.stack([p['embedding'] for p in one_by_one]))
+    assert all(p['summary'] and p['entities'] and p['key_phrases'] for p in batched)
+
+    # A failing batched call falls back to processing each article on its own
+    class SingleOnlySentiment:
+        def __init__(self, model):
+            self.model = model
+
+        def __call__(self, texts, **kwargs):
+            if isinstance(texts, list) and len(texts) > 1:
+                raise RuntimeError("batch too large")
+            return self.model(texts, **kwargs)
+
+    processor.sentiment_analyzer = SingleOnlySentiment(processor.sentiment_analyzer)
+    assert comparable(processor.process_articles(articles)) == comparable(one_by_one)
+    assert processor.process_articles([]) == []
+
+class FakeScraper:
+    def __init__(self, results):
+        self.results = results
+        self.fetched = []
+
+    async def search_sources(self, query, num_sources=5, **kwargs):
+        return self.results[query]
+
+    async def scrape_article_async(self, url, use_cache=True):
+        self.fetched.append(url)
+        return {'url': url, 'title': url, 'text': f"Article at {url}."}
+
+class FakeNLP:
+    def __init__(self):
+        self.batches = []
+
+    def process_articles(self, articles, batch_size=8):
+        self.batches.append([article['url'] for article in articles])
+        return [{'summary': article['text'], 'entities': [], 'key_phrases': [],
+                 'sentiment': {'label': "POSITIVE", 'score': 1.0}, 'original_data': article}
+                for article in articles]
+
+    def combine_summaries(self, processed_articles):
+        return {'comprehensive_summary': " ".join(a['summary'] for a in processed_articles)}
+
+class FakeAggregator(ResearchAggregator):
+    def __init__(self, scraper):
+        self.scraper = scraper
+        self.nlp_processor = FakeNLP()
+        self.nlp_executor = ThreadPoolExecutor(max_workers=1)
+        self.saved = []
+
+    def update_memory(self, query, results):
+        pass
+
+    def save_results(self, results, query):
+        self.saved.append(query)
+        return f"result-{len(self.saved)}"
+
+    def record_corpus(self, processed_articles):
+        pass
+
+def test_batch_runner():
+    print("Testing batch processing...")
+    print("-" * 50)
+
+    check_process_articles()
+
+    with tempfile.TemporaryDirectory() as directory:
+        queries_path = os.path.join(directory, "queries.txt")
+        with open(queries_path, 'w', encoding='utf-8') as f:
+            f.write("# comment\nbattery storage\n\n{\"query\": \"grid prices\", \"num_sources\": 1}\nsolar\n")
+        queries = load_queries(queries_path)
+        assert queries == [{'id': "2", 'query': "battery storage"},
+                           {'query': "grid prices", 'num_sources': 1, 'id': "4"},
+                           {'id': "5", 'query': "solar"}]
+
+        scraper = FakeScraper({"battery storage": ["a", "b"], "grid prices": ["b", "c"], "solar": ["a", "d"]})
+        aggregator = FakeAggregator(scraper)
+        checkpoint = os.path.join(directory, "checkpoint.jsonl")
+        runner = BatchRunner(aggregator, chunk_size=2, num_sources=2, checkpoint_path=checkpoint)
+        stats = asyncio.run(runner.run(queries))
+
+        # Shared URLs are fetched once; each chunk's new articles go through one NLP batch
+        assert sorted(scraper.fetched) == ["a", "b", "d"]
+        assert aggregator.nlp_processor.batches == [["a", "b"], ["d"]]
+        assert stats == {'queries': 3, 'skipped': 0, 'failed': 0, 'urls_fetched': 3, 'url_reuses': 2}
+        assert aggregator.saved == ["battery storage", "grid prices", "solar"]
+
+        # A rerun skips everything in the checkpoint
+        rerun = BatchRunner(FakeAggregator(scraper), checkpoint_path=checkpoint)
+        assert asyncio.run(rerun.run(queries))['skipped'] == 3
+
+    print("Batch runner test passed!")
+
+if __name__ == "__main__":
+    test_batch_runner()
@@ -0,0 +1,119 @@
+import sys
+import os
+import tempfile
+from concurrent.futures import Future
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.chat import ResearchChat
+from agent.llm_cache import LLMCache
+
+class Response:
+    def __init__(self, text):
+        self.text = text
+
+class FakeClient:
+    """Answers chat requests from a list of replies; summary requests wait on futures the test resolves."""
+
+    def __init__(self):
+        self.replies = []
+        self.requests = []
+        self.summaries = []
+
+    def generate(self, contents, stage='generate'):
+        self.requests.append(contents)
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return Response(reply)
+
+    def stream(self, contents, stage='generate'):
+        self.requests.append(contents)
+        for piece in self.replies.pop(0):
+            if isinstance(piece, Exception):
+                raise piece
+            yield piece
+
+    def submit(self, prompt, stage='generate'):
+        future = Future()
+        self.summaries.append((prompt, future))
+        return future
+
+def turn_texts(turns):
+    return [" ".join(turn['parts']) for turn in turns]
+
+def test_chat():
+    print("Testing chat history compaction...")
+    print("-" * 50)
+
+    os.environ.setdefault("GOOGLE_API_KEY", "test-key")
+    with tempfile.TemporaryDirectory() as directory:
+        client = FakeClient()
+        chat = ResearchChat(cache=LLMCache(os.path.join(directory, "llm_cache.db")), client=client,
+                            max_history_tokens=100)
+        padding = "x" * 120
+
+        # Turns accumulate until the window is over budget, then the oldest pairs are folded
+        for i in range(3):
+            client.replies.append(f"answer {i} {padding}")
+            assert chat.send_message(f"question {i} {padding}") == f"answer {i} {padding}"
+        assert len(client.summaries) == 1
+        prompt, future = client.summaries[0]
+        folded = chat._folding[0]
+        assert turn_texts(folded) == [f"question 0 {padding}", f"answer 0 {padding}"]
+        assert f"question 0 {padding}" in prompt and "(none yet)" in prompt
+        # Another fold waits for this one, so the window stays over budget meanwhile
+        assert turn_texts(chat.window)[::2] == [f"question 1 {padding}", f"question 2 {padding}"]
+        assert len(chat.transcript) == 6
+
+        # While the summary is in flight, the folded turns still go out verbatim
+        contents = chat.build_contents("next")
+        assert turn_texts(contents[:len(folded)]) == turn_texts(folded)
+        assert turn_texts(contents[-1:]) == ["next"]
+
+        # A failed summary puts the turns back at the front of the window
+        window = list(chat.window)
+        future.set_exception(RuntimeError("quota"))
+        chat._apply_folded_summary()
+        assert chat._folding is None and chat.summary == ""
+        assert chat.window == folded + window
+
+        # A successful one replaces them with the summary on the next message
+        client.replies.append("answer 3")
+        chat.send_message(f"question 3 {padding}")
+        prompt, future = client.summaries[-1]
+        assert all(f"question {i} {padding}" in prompt for i in range(3))
+        future.set_result(Response(" The user asked about questions 0-2. "))
+        client.replies.append("answer 4")
+        chat.send_message("question 4")
+        assert chat.summary == "The user asked about questions 0-2."
+        sent = client.requests[-1]
+        assert "Summary of the earlier conversation:\nThe user asked about questions 0-2." in sent[-1]['parts'][0]
+        assert turn_texts(sent[:-1]) == [f"question 3 {padding}", "answer 3"]
+        assert turn_texts(chat.window) == [f"question 3 {padding}", "answer 3", "question 4", "answer 4"]
+        assert chat._window_tokens() <= chat.max_history_tokens
+
+        # A stream that fails part way yields an error and leaves no turn behind
+        transcript, window = list(chat.transcript), list(chat.window)
+        client.replies.append(["The grid ", RuntimeError("connection reset")])
+        pieces = list(chat.stream_message("question 5"))
+        assert pieces == ["The grid ", "Error: connection reset"]
+        assert chat.transcript == transcript and chat.window == window
+
+        # A complete stream adds the turn
+        client.replies.append(["Battery ", "storage."])
+        assert "".join(chat.stream_message("question 6")) == "Battery storage."
+        assert turn_texts(chat.transcript[-2:]) == ["question 6", "Battery storage."]
+        assert turn_texts(chat.window[-2:]) == ["question 6", "Battery storage."]
+
+        # Nor does a failed request, which returns the error instead
+        client.replies.append(RuntimeError("timeout"))
+        assert chat.send_message("question 7") == "Error: timeout"
+        assert turn_texts(chat.transcript[-2:]) == ["question 6", "Battery storage."]
+        chat.cache.close()
+
+    print("Chat test passed!")
+
+if __name__ == "__main__":
+    test_chat()
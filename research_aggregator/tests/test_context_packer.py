@@ -0,0 +1,40 @@
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.context_packer import ContextPacker
+
+def test_context_packer():
+    print("Testing context packer...")
+    print("-" * 50)
+
+    packer = ContextPacker(max_tokens=120, passage_tokens=40)
+    relevant = ("Subscribe to our newsletter for updates.\n\n"
+                "Surface codes are the leading approach to quantum error correction.\n\n"
+                + "Each logical qubit in a surface code needs many physical qubits. " * 3)
+    short = "Short source about quantum computing."
+    filler = "Unrelated sports results from the weekend. " * 30
+
+    packed = packer.pack("quantum error correction surface codes", [relevant, short, filler])
+    print(f"Tokens per source: {packed.tokens}, dropped passages: {packed.dropped_passages}")
+
+    # The budget holds, and the short source keeps everything it needs
+    assert packed.total_tokens <= 120
+    assert packed.sources[1] == short
+    # Query-relevant passages win over boilerplate
+    assert "Surface codes are the leading approach" in packed.sources[0]
+    assert "newsletter" not in packed.sources[0]
+    assert packed.truncated_sources == [0, 2]
+
+    # Numbering follows the input order even when a source is packed to nothing
+    numbered = packer.pack("quantum", ["", short]).numbered()
+    print(numbered)
+    assert numbered.startswith("Source 2:")
+
+    assert ContextPacker.allocate([10, 100, 50], 90) == [10, 40, 40]
+    print("Context packer test passed!")
+
+if __name__ == "__main__":
+    test_context_packer()
@@ -0,0 +1,111 @@
+import sys
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+# Add the src directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import numpy as np
+import pyarrow.compute as pc
+from corpus_store import ANALYSES, ARTICLES, CorpusStore
+
+def processed_article(i):
+    return {
+        'summary': f"summary {i}",
+        'entities': [{'text': "ACME", 'label': "ORG", 'start': 0, 'end': 4}],
+        'sentiment': {'label': "POSITIVE", 'score': 0.9},
+        'key_phrases': ["battery storage"],
+        'embedding': np.full(384, i, dtype=np.float32),
+        'original_data': {
+            'url': f"https://site{i % 3}.example/article-{i}",
+            'title': f"Article {i}",
+            'text': "Battery storage costs keep falling. " * 20,
+            'authors': ["A. Writer"],
+            'keywords': ["battery"],
+            'publish_date': datetime(2024, 5, 1)
+        }
+    }
+
+def test_corpus_store():
+    print("Testing columnar corpus store...")
+    print("-" * 50)
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = CorpusStore(directory, flush_rows=4)
+        store.add_processed([processed_article(i) for i in range(10)], model_version="v1")
+        store.flush()
+        assert store.count(ARTICLES) == 10 and store.count(ANALYSES) == 10
+
+        # Only the requested columns come back
+        texts = store.read(ARTICLES, columns=['url_hash', 'text'])
+        assert texts.column_names == ['url_hash', 'text'] and texts.num_rows == 10
+        embeddings = np.stack(store.read(ANALYSES, ['embedding']).column('embedding').to_numpy(zero_copy_only=False))
+        assert embeddings.shape == (10, 384)
+
+        # Day partitions prune scans
+        today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+        assert sum(batch.num_rows for batch in store.scan(ARTICLES, ['url'], pc.field('fetch_date') == today)) == 10
+        assert store.count(ARTICLES, pc.field('fetch_date') < '2000-01-01') == 0
+
+        # Reprocessing appends new analyses; latest() returns the newest per article
+        later = datetime.now(timezone.utc) + timedelta(seconds=1)
+        url = processed_article(0)['original_data']['url']
+        store.add_analysis(url, {'summary': "better summary"}, model_version="v2", processed_at=later)
+        store.flush()
+        assert store.count(ANALYSES) == 11
+        latest = store.latest(ANALYSES, ['url', 'summary', 'model_version'])
+        assert latest.num_rows == 10
+        assert latest.filter(pc.field('url') == url).to_pylist() == [
+            {'url': url, 'summary': "better summary", 'model_version': "v2"}
+        ]
+
+        # Compaction merges small files without losing rows
+        assert store.compact(ANALYSES, min_files=2) == 1
+        assert store.count(ANALYSES) == 11
+        partition = os.path.join(directory, ARTICLES, f"fetch_date={today}")
+        assert [name for name in os.listdir(os.path.join(directory, ANALYSES)) if not name.startswith(".")] == [
+            f"processed_date={today}"
+        ]
+
+        # Partitions are merged automatically once they reach compact_files files
+        store = CorpusStore(directory, compact_files=3)
+        assert len(os.listdir(partition)) == 3
+        store.add_article(processed_article(10)['original_data'])
+        store.flush()
+        assert len(os.listdir(partition)) == 1
+        assert store.count(ARTICLES) == 11
+
+        # ... but not while a write (here standing in for another process's) holds the table
+        with store._table_lock(ARTICLES, shared=True):
+            for i in range(11, 13):
+                store.add_article(processed_article(i)['original_data'])
+                store.flush()
+        assert len(os.listdir(partition)) == 3
+        store.add_article(processed_article(13)['original_data'])
+        store.flush()
+        assert len(os.listdir(partition)) == 1
+        assert store.count(ARTICLES) == 14
+
+        # A scan in progress keeps the files it listed in place until it finishes
+        batches = store.scan(ARTICLES, columns=['url'], batch_size=1)
+        rows = next(batches).num_rows
+        for i in range(14, 16):
+            store.add_article(processed_article(i)['original_data'])
+            store.flush()
+        assert len(os.listdir(partition)) == 3
+        assert rows + sum(batch.num_rows for batch in batches) == 14
+        store.add_article(processed_article(16)['original_data'])
+        store.flush()
+        assert len(os.listdir(partition)) == 1
+        assert store.count(ARTICLES) == 17
+
+        # Hidden directories, like a partition being swapped in, are not scanned
+        shutil.copytree(partition, os.path.join(directory, ARTICLES, f".fetch_date={today}.compact-test"))
+        assert store.count(ARTICLES) == 17
+
+    print("Corpus store test passed!")
+
+if __name__ == "__main__":
+    test_corpus_store()
@@ -0,0 +1,45 @@
+import sys
+import os
+import time
+
+# Add the src directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from deadline import Deadline, DeadlineExceeded
+
+def test_deadline():
+    print("Testing deadline budgets...")
+    print("-" * 50)
+
+    # No budget: never expires and reports no timeout
+    unlimited = Deadline()
+    assert not unlimited.expired()
+    assert unlimited.timeout() is None
+    assert unlimited.child(0.5).timeout() is None
+
+    deadline = Deadline(0.2)
+    stage = deadline.child(0.25)
+    print(f"Remaining: {deadline.remaining():.3f}s, stage: {stage.remaining():.3f}s")
+    assert stage.remaining() <= 0.05 + 1e-3
+    stage.mark('search')
+
+    time.sleep(0.06)
+    assert stage.expired() and not deadline.expired()
+    try:
+        stage.check('fetch')
+        assert False, "expired stage should raise"
+    except DeadlineExceeded:
+        pass
+
+    # Stage outcomes recorded on children show up on the root
+    report = deadline.completeness()
+    print(f"Completeness: {report}")
+    assert report['stages'] == {'search': 'complete', 'fetch': 'timed_out'}
+    assert not report['complete']
+
+    time.sleep(0.15)
+    assert deadline.expired() and deadline.remaining() == 0.0
+    print("Deadline test passed!")
+
+if __name__ == "__main__":
+    test_deadline()
@@ -0,0 +1,122 @@
+import sys
+import os
+import tempfile
+import time
+
+# Add the src directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from entity_index import EntityIndex, normalize_term
+
+ARTICLES = {
+    "https://a.example/1": ([("Tesla", "ORG"), ("Elon Musk", "PERSON"), ("Tesla", "ORG")],
+                            ["battery storage", "the Megapack"]),
+    "https://b.example/2": ([("tesla", "ORG"), ("Texas", "GPE")], ["Battery  storage", "grid prices"]),
+    "https://c.example/3": ([("Texas", "GPE"), ("ERCOT", "ORG")], ["grid prices"]),
+}
+
+def build(index):
+    for url, (entities, phrases) in ARTICLES.items():
+        index.add(url, [{'text': text, 'label': label, 'start': 0, 'end': 1} for text, label in entities], phrases)
+
+def test_entity_index():
+    print("Testing entity index...")
+    print("-" * 50)
+
+    assert normalize_term("The  E.U.'s") == "e.u."
+    assert normalize_term(" Battery\nStorage, ") == "battery storage"
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "entity_index.jsonl")
+        index = EntityIndex(path)
+        build(index)
+
+        # Lookups ignore case and spacing; the most mentioning article comes first
+        assert index.articles("TESLA") == ["https://a.example/1", "https://b.example/2"]
+        assert index.articles("battery storage", label="PHRASE") == ["https://a.example/1", "https://b.example/2"]
+        assert index.articles("megapack") == ["https://a.example/1"]
+        assert index.articles("nobody") == []
+
+        top = index.top(2, kind='entity')
+        assert [(t['text'], t['label'], t['articles']) for t in top] == [("Tesla", "ORG", 2), ("Texas", "GPE", 2)]
+        assert top[0]['mentions'] == 3
+        cooccurring = index.cooccurring("Texas", entities_only=True)
+        assert {t['text']: t['shared_articles'] for t in cooccurring} == {'ERCOT': 1, 'Tesla': 1}
+
+        # Aggregation over a subset, and by research query
+        aggregate = index.aggregate(["https://b.example/2", "https://c.example/3"])
+        assert aggregate['common_entities'][0]['text'] == "Texas"
+        assert aggregate['key_themes'][0] == "grid prices"
+        index.tag("grid storage", ["https://c.example/3"])
+        assert [t['text'] for t in index.top(5, kind='ORG', query="grid storage")] == ["ERCOT"]
+
+        # Re-adding replaces an article's terms; removing drops them
+        index.add("https://c.example/3", [{'text': "Tesla", 'label': "ORG"}], [])
+        assert len(index.articles("Tesla")) == 3 and index.articles("ERCOT") == []
+        assert index.cooccurring("ERCOT") == []
+        index.remove("https://a.example/1")
+        assert index.articles("Elon Musk") == []
+
+        # The log replays to the same state
+        reloaded = EntityIndex(path)
+        assert len(reloaded) == 2
+        assert reloaded.top(3) == index.top(3)
+        assert reloaded.top(3, query="grid storage") == index.top(3, query="grid storage")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "entity_index.jsonl")
+        index = EntityIndex(path, min_compact_records=5)
+        index.add("https://y.example/1", [{'text': "Acme Corp", 'label': "ORG"}] * 2, ["grid prices"])
+
+        # Re-adding an article doesn't inflate its surface forms
+        for _ in range(10):
+            index.add("https://x.example/1", [{'text': "ACME corp", 'label': "ORG"}], ["Grid prices"])
+        assert index.top(1, kind='ORG')[0]['text'] == "Acme Corp"
+        assert index._surface_forms[("ORG", "acme corp")] == {'Acme Corp': 2, 'ACME corp': 1}
+        index.remove("https://y.example/1")
+        assert index.top(1, kind='ORG')[0]['text'] == "ACME corp"
+        assert index._surface_forms[("PHRASE", "grid prices")] == {'Grid prices': 1}
+
+        # The log is rewritten once it is mostly replaced entries, and replays to the same state
+        with open(path, encoding='utf-8') as f:
+            assert len(f.readlines()) <= 5
+        reloaded = EntityIndex(path)
+        assert len(reloaded) == 1 and reloaded.top(5) == index.top(5)
+        assert reloaded._surface_forms == index._surface_forms
+
+    # Two processes sharing the log: neither one's compaction drops the other's records
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "entity_index.jsonl")
+        workers = [EntityIndex(path, min_compact_records=5), EntityIndex(path, min_compact_records=5)]
+        for i in range(20):
+            workers[i % 2].add(f"https://w.example/{i % 6}", [{'text': f"Org {i}", 'label': "ORG"}], [])
+        workers[1].tag("grid storage", ["https://w.example/0"])
+        workers[0].compact()
+        workers[1].remove("https://w.example/5")
+        with open(path, "a", encoding="utf-8") as f:
+            f.write('{"article_id": "torn')
+        workers[0].add("https://w.example/6", [{'text': "Org 20", 'label': "ORG"}], [])
+        reloaded = EntityIndex(path)
+        assert sorted(reloaded._article_terms) == [f"https://w.example/{i}" for i in (0, 1, 2, 3, 4, 6)]
+        assert reloaded.articles("Org 18") == ["https://w.example/0"]
+        assert reloaded._query_articles == {"grid storage": {"https://w.example/0"}}
+        assert reloaded.top(10) == workers[0].top(10)
+
+    # Lookups stay fast on a larger corpus
+    index = EntityIndex()
+    for i in range(5000):
+        index.add(f"article-{i}", [{'text': f"Company {i % 400}", 'label': "ORG"},
+                                   {'text': f"Person {i % 1000}", 'label': "PERSON"}], [f"topic {i % 50}"])
+    index.top(10)
+    started = time.perf_counter()
+    for i in range(1000):
+        index.articles(f"Company {i % 400}")
+        index.top(10, kind='PERSON')
+    elapsed_ms = (time.perf_counter() - started) * 1000 / 1000
+    print(f"Lookup + corpus-wide top: {elapsed_ms:.3f} ms")
+    assert elapsed_ms < 1
+
+    print("Entity index test passed!")
+
+if __name__ == "__main__":
+    test_entity_index()
@@ -0,0 +1,221 @@
+import sys
+import os
+import asyncio
+import time
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.gemini_client import (GEMINI_MODEL, GeminiClient, RateLimitException, TokenBucketLimiter,
+                                 is_rate_limited, retry_after)
+from src.deadline import Deadline, DeadlineExceeded
+
+class FakeClock:
+    """Simulated time: sleeping advances the clock instantly."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+class ResourceExhausted(Exception):
+    pass
+
+class Response:
+    def __init__(self, text, total_tokens=None):
+        self.text = text
+        if total_tokens is not None:
+            self.usage_metadata = type('Usage', (), {'prompt_token_count': 0, 'candidates_token_count': 0,
+                                                     'total_token_count': total_tokens})()
+
+class Stream:
+    def __init__(self, pieces, error=None):
+        self.pieces = pieces
+        self.error = error
+
+    async def __aiter__(self):
+        for piece in self.pieces:
+            yield Response(piece)
+        if self.error:
+            raise self.error
+
+class FakeModel:
+    """Replays a script of responses, exceptions and delays (seconds before answering), one per call."""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.calls = 0
+        self.timeouts = []
+        self.cancelled = 0
+
+    async def generate_content_async(self, contents, generation_config=None, stream=False, request_options=None):
+        self.calls += 1
+        self.timeouts.append((request_options or {}).get('timeout'))
+        outcome = self.script.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        if isinstance(outcome, float):
+            try:
+                await asyncio.sleep(outcome)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+            return Response("late")
+        return outcome
+
+def make_client(script, clock, max_retries=2):
+    client = GeminiClient(api_key="test-key", max_retries=max_retries, expected_output_tokens=100)
+    client.models[GEMINI_MODEL] = FakeModel(script)
+    client.limiter = TokenBucketLimiter(60, 100_000, clock=clock, sleep=clock.sleep)
+    client.in_flight = asyncio.Semaphore(2)
+    return client
+
+def check_limiter():
+    # Requests: two per minute, so the third waits 30s for one to refill
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(2, 1000, clock=clock, sleep=clock.sleep)
+    for _ in range(3):
+        asyncio.run(limiter.acquire(100))
+    assert clock.sleeps == [30.0]
+    assert limiter.requests == 0 and limiter.tokens == 900
+
+    # Tokens: the wait is for the missing tokens; a request bigger than a minute's allowance waits for a full bucket
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(100, 600, clock=clock, sleep=clock.sleep)
+    asyncio.run(limiter.acquire(500))
+    assert limiter.wait_time(500) == 40.0
+    assert limiter.wait_time(10_000) == 50.0
+    limiter.settle(estimated=500, actual=200)
+    assert limiter.tokens == 400
+    clock.now += 6
+    assert limiter.tokens == 400 and limiter.wait_time(450) == 0 and limiter.tokens == 460
+
+    # Waits that would overrun the deadline fail at once instead of sleeping
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(1, 1000, clock=clock, sleep=clock.sleep)
+    asyncio.run(limiter.acquire(10))
+    try:
+        asyncio.run(limiter.acquire(10, deadline=Deadline(1)))
+        assert False, "expected RateLimitException"
+    except RateLimitException:
+        pass
+    assert clock.sleeps == []
+
+    # A 429 halves the rates and pauses for the server's delay; successes restore 5% each
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(100, 1000, clock=clock, sleep=clock.sleep)
+    limiter.on_rate_limited(5)
+    assert limiter.rpm == 50 and limiter.tpm == 500
+    assert limiter.wait_time(10) == 5.0
+    # Without a suggested delay, the pause is one request's interval at the new rate
+    clock.now = 10
+    limiter.on_rate_limited(None)
+    assert limiter.fraction == 0.25 and limiter.paused_until == 10 + 60 / 25
+    for _ in range(5):
+        limiter.on_rate_limited(None)
+    assert limiter.fraction == limiter.min_fraction
+    for _ in range(30):
+        limiter.on_success()
+    assert limiter.fraction == 1.0
+
+def check_retries():
+    assert is_rate_limited(ResourceExhausted("Resource has been exhausted"))
+    assert is_rate_limited(ValueError("429 Too Many Requests")) and not is_rate_limited(ValueError("400 Bad Request"))
+    assert retry_after(ValueError("429 quota exceeded. Please retry in 7.5s")) == 7.5
+    assert retry_after(ValueError("retry_delay { seconds: 12 }")) == 12.0
+    assert retry_after(ValueError("429")) is None
+
+    # A rate-limited request waits out the server's delay and is retried
+    clock = FakeClock()
+    client = make_client([ResourceExhausted("429 Please retry in 7s"), Response("answer", total_tokens=50)], clock)
+    response = asyncio.run(client._generate("prompt", GEMINI_MODEL, None, None, 'test'))
+    assert response.text == "answer" and client.models[GEMINI_MODEL].calls == 2
+    assert clock.now >= 7
+    assert client.limiter.fraction == 0.55
+    assert client.stats()['rate_fraction'] == 0.55
+
+    # Quota errors reported in the body of an older API's response are retried too
+    clock = FakeClock()
+    client = make_client([Response("quota_metric exceeded, see rate-limits"), Response("answer")], clock)
+    assert asyncio.run(client._generate("prompt", GEMINI_MODEL, None, None, 'test')).text == "answer"
+
+    # Retries stop after max_retries
+    clock = FakeClock()
+    client = make_client([ResourceExhausted("429")] * 3, clock, max_retries=2)
+    try:
+        asyncio.run(client._generate("prompt", GEMINI_MODEL, None, None, 'test'))
+        assert False, "expected RateLimitException"
+    except RateLimitException:
+        pass
+    assert client.models[GEMINI_MODEL].calls == 3
+
+    # ... or when the server's delay is past the deadline
+    clock = FakeClock()
+    client = make_client([ResourceExhausted("429 Please retry in 30s"), Response("late")], clock)
+    try:
+        asyncio.run(client._generate("prompt", GEMINI_MODEL, None, Deadline(5), 'test'))
+        assert False, "expected RateLimitException"
+    except RateLimitException:
+        pass
+    assert client.models[GEMINI_MODEL].calls == 1
+
+    # Other errors are not retried
+    client = make_client([ValueError("400 Bad Request"), Response("unused")], FakeClock())
+    try:
+        asyncio.run(client._generate("prompt", GEMINI_MODEL, None, None, 'test'))
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+    assert client.models[GEMINI_MODEL].calls == 1
+
+    # A stream is retried until it delivers, but not once chunks have reached the caller
+    chunks = []
+    client = make_client([ResourceExhausted("429"), Stream(["Hel", "lo"])], FakeClock())
+    asyncio.run(client._generate("prompt", GEMINI_MODEL, None, None, 'test', on_chunk=chunks.append))
+    assert chunks == ["Hel", "lo"]
+    chunks = []
+    client = make_client([Stream(["Hel"], error=ResourceExhausted("429")), Stream(["unused"])], FakeClock())
+    try:
+        asyncio.run(client._generate("prompt", GEMINI_MODEL, None, None, 'test', on_chunk=chunks.append))
+        assert False, "expected ResourceExhausted"
+    except ResourceExhausted:
+        pass
+    assert chunks == ["Hel"] and client.models[GEMINI_MODEL].calls == 1
+
+def check_deadline():
+    # Requests carry the time left as their timeout; without a deadline they have none
+    client = make_client([Response("fast"), Response("unbounded"), 5.0], FakeClock())
+    model = client.models[GEMINI_MODEL]
+    assert client.generate("prompt", deadline=Deadline(5)).text == "fast"
+    assert client.generate("prompt").text == "unbounded"
+    assert 4 < model.timeouts[0] <= 5 and model.timeouts[1] is None
+
+    # A request still running at the deadline is given up on and cancelled
+    started = time.monotonic()
+    try:
+        client.generate("prompt", deadline=Deadline(0.2))
+        assert False, "expected DeadlineExceeded"
+    except DeadlineExceeded:
+        pass
+    assert time.monotonic() - started < 1
+    time.sleep(0.1)
+    assert model.cancelled == 1
+
+def test_gemini_client():
+    print("Testing Gemini rate limiting and retries...")
+    print("-" * 50)
+
+    check_limiter()
+    check_retries()
+    check_deadline()
+
+    print("Gemini client test passed!")
+
+if __name__ == "__main__":
+    test_gemini_client()
@@ -0,0 +1,136 @@
+import sys
+import os
+import asyncio
+
+# Add the src directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from host_stats import HostStats
+from scraper import WebScraper
+
+class FakeScraper(WebScraper):
+    """Serves each fetch of a URL from a list of (delay, html) responses, without touching the network."""
+
+    def __init__(self, responses, **kwargs):
+        self.responses = responses
+        self.calls = []
+        self.cancelled = 0
+        super().__init__(**kwargs)
+        self.host_stats = HostStats(default_latency=0.05, min_hedge_delay=0.01)
+
+    def setup_cache(self):
+        pass
+
+    async def fetch_url(self, session, url):
+        delay, html = self.responses[len(self.calls)]
+        self.calls.append(url)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return html
+
+def check_ranking():
+    stats = HostStats(min_samples=3, probe_every=4)
+    for _ in range(3):
+        stats.record("fast.example", 0.5, True)
+        stats.record("slow.example", 3.0, True)
+        stats.record("flaky.example", 0.5, False)
+    stats.record("flaky.example", 0.5, True)
+
+    # Latency is an exponentially weighted mean; failures raise the expected time to a good fetch
+    assert abs(stats.expected_latency("fast.example") - 0.5) < 1e-9
+    assert stats.expected_latency("unknown.example") == stats.default_latency
+    assert abs(stats.hosts["flaky.example"]['failure_rate'] - 0.8 * (1 - 0.8 ** 3)) < 1e-9
+    assert stats.score("fast.example") < stats.score("flaky.example") < stats.score("slow.example")
+
+    urls = ["https://slow.example/a", "https://unknown.example/b", "https://FAST.example/c",
+            "https://flaky.example/d", "https://fast.example/e"]
+    assert stats.rank(urls) == ["https://FAST.example/c", "https://fast.example/e", "https://flaky.example/d",
+                                "https://unknown.example/b", "https://slow.example/a"]
+    # A preferred domain (or its subdomains) has its score halved
+    assert stats.rank(urls, preferred_domains=["example"])[0] == "https://FAST.example/c"
+    assert stats.rank(["https://fast.example/e", "https://flaky.example/d"],
+                      preferred_domains=["FLAKY.example"]) == ["https://flaky.example/d", "https://fast.example/e"]
+
+    # Seeded failure rates only apply to hosts without samples of their own
+    stats.seed({'fast.example': {'success': 0, 'total': 10}, 'new.example': {'success': 1, 'total': 4}})
+    assert stats.hosts["fast.example"]['failure_rate'] == 0.0
+    assert stats.hosts["new.example"]['failure_rate'] == 0.75
+
+def check_admission():
+    stats = HostStats(min_samples=3, max_failure_rate=0.5, probe_every=3, alpha=0.5)
+    url = "https://down.example/page"
+    for _ in range(2):
+        stats.record("down.example", 1.0, False)
+    # Too few samples to judge the host yet
+    assert stats.admit(url)
+    stats.record("down.example", 1.0, False)
+    # Rejected, except for every third request which probes the host
+    assert [stats.admit(url) for _ in range(6)] == [False, False, True, False, False, True]
+    assert stats.rank([url, "https://up.example/"]) == ["https://up.example/"]
+    for _ in range(3):
+        stats.record("down.example", 1.0, True)
+    assert stats.admit(url)
+
+def check_hedge_delay():
+    stats = HostStats(min_samples=3, window=20, default_latency=2.0, min_hedge_delay=0.25, max_hedge_delay=5.0)
+    assert stats.hedge_delay("unknown.example") == 2.0
+    stats.record("a.example", 0.1, True)
+    stats.record("a.example", 0.1, True)
+    assert stats.hedge_delay("a.example") == 2.0
+
+    # The p95 of the recent window, clamped to [min_hedge_delay, max_hedge_delay]
+    for latency in range(1, 21):
+        stats.record("b.example", latency / 10, True)
+    assert stats.hedge_delay("b.example") == 1.9
+    for _ in range(20):
+        stats.record("c.example", 0.01, True)
+        stats.record("d.example", 60.0, True)
+    assert stats.hedge_delay("c.example") == 0.25
+    assert stats.hedge_delay("d.example") == 5.0
+    assert stats.snapshot()["b.example"]['hedge_delay'] == 1.9
+
+def check_fetch_hedged():
+    url = "https://news.example/story"
+
+    # A response within the hedge delay needs no backup request
+    scraper = FakeScraper([(0, "<html>first</html>")])
+    assert asyncio.run(scraper.fetch_hedged(None, url)) == "<html>first</html>"
+    assert len(scraper.calls) == 1
+    assert scraper.host_stats.hosts["news.example"]['samples'] == 1
+
+    # A slow request gets a backup; the first good response wins and the other is cancelled
+    scraper = FakeScraper([(5, "<html>slow</html>"), (0, "<html>backup</html>")])
+    assert asyncio.run(scraper.fetch_hedged(None, url)) == "<html>backup</html>"
+    assert len(scraper.calls) == 2 and scraper.cancelled == 1
+
+    # An empty response from one request still waits for the other
+    scraper = FakeScraper([(0.1, ""), (0.2, "<html>backup</html>")])
+    assert asyncio.run(scraper.fetch_hedged(None, url)) == "<html>backup</html>"
+    assert scraper.cancelled == 0
+
+    # When every request fails the host is charged a failure
+    scraper = FakeScraper([(0.1, ""), (0, "")])
+    assert asyncio.run(scraper.fetch_hedged(None, url)) == ""
+    assert scraper.host_stats.hosts["news.example"]['failure_rate'] > 0
+
+    # Without hedging only one request is ever sent
+    scraper = FakeScraper([(0.1, "<html>only</html>")], hedging=False)
+    assert asyncio.run(scraper.fetch_hedged(None, url)) == "<html>only</html>"
+    assert len(scraper.calls) == 1
+
+def test_host_stats():
+    print("Testing host statistics and hedged fetches...")
+    print("-" * 50)
+
+    check_ranking()
+    check_admission()
+    check_hedge_delay()
+    check_fetch_hedged()
+
+    print("Host stats test passed!")
+
+if __name__ == "__main__":
+    test_host_stats()
@@ -0,0 +1,45 @@
+import sys
+import os
+import asyncio
+import time
+
+# Add the src directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from instrumentation import Metrics
+
+def test_instrumentation():
+    print("Testing instrumentation...")
+    print("-" * 50)
+
+    metrics = Metrics()
+
+    @metrics.timed('summarization')
+    def summarize():
+        time.sleep(0.001)
+
+    @metrics.timed('fetch')
+    async def fetch():
+        await asyncio.sleep(0.001)
+
+    with metrics.span('research', query="test"):
+        for _ in range(5):
+            summarize()
+        asyncio.run(fetch())
+        metrics.incr('scraper.bytes_fetched', 1024)
+
+    snapshot = metrics.snapshot()
+    print(metrics.report())
+    assert snapshot['histograms']['summarization.ms']['count'] == 5
+    assert snapshot['histograms']['summarization.ms']['p50'] >= 1.0
+    assert snapshot['counters']['scraper.bytes_fetched'] == 1024
+
+    # Spans nest under the enclosing span, including across asyncio.run
+    trace = metrics.recent_traces(1)[0]
+    assert trace['name'] == 'research'
+    assert [child['name'] for child in trace['children']] == ['summarization'] * 5 + ['fetch']
+
+    print("\nInstrumentation test passed!")
+
+if __name__ == "__main__":
+    test_instrumentation()
@@ -0,0 +1,95 @@
+import sys
+import os
+import tempfile
+import threading
+import time
+
+# Add the src directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from job_queue import Broker, MemoryBroker, SQLiteBroker, Stage, StageWorkers
+
+def check_broker(broker):
+    # Keys deduplicate, even after the task is done
+    assert broker.put('fetch', {'url': "a"}, key="run:a")
+    assert not broker.put('fetch', {'url': "a"}, key="run:a")
+    assert broker.put('fetch', {'url': "b"})
+    assert broker.put('fetch', {'url': "later"}, delay=60)
+
+    first = broker.claim('fetch', max_tasks=2, lease_seconds=0.2)
+    assert [task.payload['url'] for task in first] == ["a", "b"]
+    assert broker.claim('fetch') == []  # Leased, and the delayed one isn't ready
+    assert broker.claim('analyze') == []
+
+    # An unacked lease runs out and the task is delivered again; the old delivery can't ack it
+    assert broker.ack(first[0])
+    time.sleep(0.3)
+    second = broker.claim('fetch', max_tasks=5)
+    assert [(task.payload['url'], task.attempts) for task in second] == [("b", 2)]
+    assert not broker.ack(first[1])
+    assert broker.retry(second[0], delay=0, error="timeout")
+    third = broker.claim('fetch')
+    assert third[0].attempts == 3 and broker.fail(third[0], "gave up")
+    assert not broker.put('fetch', {'url': "a"}, key="run:a")
+    assert broker.counts('fetch') == {'queued': 1, 'leased': 0, 'done': 1, 'failed': 1}
+
+    # Results overwrite by name and report the group's size
+    assert broker.save_result("run", "a", {'summary': "x"}) == 1
+    assert broker.save_result("run", "a", {'summary': "y"}) == 1
+    assert broker.save_result("run", "b", None) == 2
+    assert broker.results("run") == {'a': {'summary': "y"}, 'b': None}
+
+def test_job_queue():
+    print("Testing job queue brokers and stage workers...")
+    print("-" * 50)
+
+    check_broker(MemoryBroker())
+    # A broker missing methods fails when created, not part way through a run
+    class PartialBroker(Broker):
+        def put(self, stage, payload, key=None, delay=0):
+            return True
+    try:
+        PartialBroker()
+        assert False, "expected TypeError"
+    except TypeError:
+        pass
+
+    with tempfile.TemporaryDirectory() as directory:
+        broker = SQLiteBroker(os.path.join(directory, "broker.db"))
+        check_broker(broker)
+        broker.close()
+
+    # Two stages, one batched and one async; a failing task is retried then given up on
+    broker = MemoryBroker()
+    batches, given_up, lock = [], [], threading.Lock()
+
+    async def double(tasks):
+        for task in tasks:
+            if task.payload['n'] == 13:
+                raise ValueError("unlucky")
+            broker.put('collect', {'n': task.payload['n'] * 2}, key=f"collect:{task.payload['n']}")
+
+    def collect(tasks):
+        with lock:
+            batches.append(sorted(task.payload['n'] for task in tasks))
+
+    for n in (1, 2, 3, 13):
+        broker.put('double', {'n': n})
+    workers = StageWorkers(broker, [
+        Stage('double', double, workers=2, max_attempts=2, retry_delay=0.01,
+              on_give_up=lambda task, error: given_up.append((task.payload['n'], str(error)))),
+        Stage('collect', collect, batch_size=10)
+    ], poll_seconds=0.01)
+    workers.start()
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline and (sum(len(b) for b in batches) < 3 or not given_up):
+        time.sleep(0.01)
+    workers.stop(5)
+    assert sorted(n for batch in batches for n in batch) == [2, 4, 6]
+    assert given_up == [(13, "unlucky")]
+    assert broker.counts('double') == {'queued': 0, 'leased': 0, 'done': 3, 'failed': 1}
+
+    print("Job queue test passed!")
+
+if __name__ == "__main__":
+    test_job_queue()
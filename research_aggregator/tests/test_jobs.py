@@ -0,0 +1,80 @@
+import sys
+import os
+import threading
+import time
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.jobs import JobManager, JobQueueFull
+
+def wait_for(job, timeout=5):
+    end = time.time() + timeout
+    while not job.finished and time.time() < end:
+        time.sleep(0.01)
+    return job
+
+def test_job_manager():
+    print("Testing background job manager...")
+    print("-" * 50)
+
+    manager = JobManager(workers=1, max_queued=2)
+
+    def write_report(job, words):
+        job.set_stage('writing')
+        for word in words:
+            job.append(word + " ")
+        return {'report': job.text.strip()}
+
+    job = wait_for(manager.submit("report", write_report, ["a", "short", "report"]))
+    assert job.status == 'done' and job.stage == 'writing'
+    assert job.result == {'report': "a short report"}
+    assert manager.get(job.id) is job
+
+    def fail(job):
+        raise RuntimeError("scrape failed")
+    job = wait_for(manager.submit("failing", fail))
+    assert job.status == 'failed' and job.error == "scrape failed"
+
+    # One worker busy and two jobs waiting: the next submit is turned away
+    release = threading.Event()
+    blocker = manager.submit("blocker", lambda job: release.wait(5))
+    time.sleep(0.1)
+    waiting = [manager.submit(f"waiting {i}", write_report, ["x"]) for i in range(2)]
+    assert manager.position(waiting[1].id) == 1
+    try:
+        manager.submit("one too many", write_report, ["x"])
+        assert False, "expected JobQueueFull"
+    except JobQueueFull:
+        pass
+
+    # A cancelled job never starts
+    assert manager.cancel(waiting[0].id)
+    release.set()
+    assert wait_for(blocker).status == 'done'
+    assert wait_for(waiting[0]).status == 'cancelled'
+    assert wait_for(waiting[1]).status == 'done'
+
+    # A running job stops at its next progress report
+    started = threading.Event()
+    def endless(job):
+        started.set()
+        while True:
+            job.append(".")
+            time.sleep(0.01)
+    job = manager.submit("endless", endless)
+    started.wait(5)
+    manager.cancel(job.id)
+    assert wait_for(job).status == 'cancelled'
+    print(manager.stats())
+
+    # Old finished jobs are forgotten
+    manager.retention_seconds = 0
+    time.sleep(0.01)
+    wait_for(manager.submit("last", write_report, ["x"]))
+    assert manager.get(job.id) is None
+
+    print("Job manager test passed!")
+
+if __name__ == "__main__":
+    test_job_manager()
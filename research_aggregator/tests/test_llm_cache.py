@@ -0,0 +1,50 @@
+import sys
+import os
+import tempfile
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.llm_cache import LLMCache
+
+def test_llm_cache():
+    print("Testing LLM response cache...")
+    print("-" * 50)
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = LLMCache(os.path.join(directory, "llm_cache.db"), max_entries=3)
+        greedy = {'temperature': 0, 'max_tokens': 100}
+
+        assert cache.get("model-a", "prompt", greedy) is None
+        cache.put("model-a", "prompt", greedy, {'text': "answer"})
+        assert cache.get("model-a", "prompt", greedy) == {'text': "answer"}
+
+        # Model, prompt and every parameter are part of the key
+        assert cache.get("model-b", "prompt", greedy) is None
+        assert cache.get("model-a", "prompt ", greedy) is None
+        assert cache.get("model-a", "prompt", {**greedy, 'max_tokens': 200}) is None
+
+        # Sampled calls bypass the cache unless the caller opts in
+        sampled = {'temperature': 0.7}
+        cache.put("model-a", "prompt", sampled, "sampled answer")
+        assert cache.get("model-a", "prompt", sampled, allow_sampled=True) is None
+        cache.put("model-a", "prompt", sampled, "sampled answer", allow_sampled=True)
+        assert cache.get("model-a", "prompt", sampled) is None
+        assert cache.get("model-a", "prompt", sampled, allow_sampled=True) == "sampled answer"
+
+        # Least recently used entries are evicted beyond max_entries
+        for i in range(3):
+            cache.put("model-a", f"prompt {i}", greedy, i)
+        assert cache.get("model-a", "prompt", greedy) is None
+        assert cache.get("model-a", "prompt 2", greedy) == 2
+
+        stats = cache.stats()
+        print(f"Stats: {stats}")
+        assert stats['entries'] == 3
+        assert stats['bypassed'] == 1 and stats['evictions'] == 2
+        assert 0 < stats['hit_rate'] < 1
+        cache.close()
+    print("LLM cache test passed!")
+
+if __name__ == "__main__":
+    test_llm_cache()
@@ -0,0 +1,74 @@
+import sys
+import os
+
+# Add the src directory and the benchmarks (for the stub models) to the Python path
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(root, 'src'))
+sys.path.append(os.path.join(root, 'benchmarks'))
+
+from memory_governor import MemoryGovernor
+from nlp_processor import NLPProcessor
+from stub_models import StubSentenceModel, StubSummarizer
+
+MB = 2 ** 20
+
+class BudgetedProcessor(NLPProcessor):
+    """Two fake 40 MB models that count their loads."""
+
+    def __init__(self, budget_mb):
+        self.loads = []
+        super().__init__(memory=MemoryGovernor(budget_mb * MB), vector_dtype='int8')
+
+    def _load_summarizer(self):
+        self.loads.append('summarizer')
+        return StubSummarizer()
+
+    def _load_sentence_model(self):
+        self.loads.append('sentence_model')
+        return StubSentenceModel()
+
+def test_memory_governor():
+    print("Testing the memory governor...")
+    print("-" * 50)
+
+    sizes = {'summarizer': 40 * MB, 'sentence_model': 40 * MB}
+    import nlp_processor
+    original = nlp_processor.model_nbytes
+    nlp_processor.model_nbytes = lambda model: sizes['summarizer' if isinstance(model, StubSummarizer)
+                                                     else 'sentence_model']
+    try:
+        processor = BudgetedProcessor(budget_mb=64)
+        processor.summarizer("The grid added more battery storage this year.")
+        assert processor.loaded_models() == ['summarizer']
+
+        # Loading the encoder pushes the total over budget; the idle summarizer goes
+        processor.add_many_to_vector_store(["battery storage", "solar panels", "wind farms"])
+        assert processor.loaded_models() == ['sentence_model']
+        usage = processor.memory_usage()
+        assert usage['components']['sentence_model'] == 40 * MB
+        assert 0 < usage['components']['vector_store'] < MB
+        assert usage['total_bytes'] <= usage['budget_bytes']
+
+        # It loads again on demand, and the governor made room for it beforehand
+        assert processor.semantic_search("battery", k=1) == ["battery storage"]
+        processor.summarizer("Prices fell again.")
+        assert processor.loads == ['summarizer', 'sentence_model', 'summarizer']
+        assert processor.loaded_models() == ['summarizer']
+        print(processor.memory.report())
+
+        # Assigned models are never unloaded
+        processor.sentence_model = StubSentenceModel()
+        processor.memory.make_room(100 * MB)
+        assert 'sentence_model' in processor.loaded_models()
+
+        # Without a budget nothing is unloaded
+        unlimited = NLPProcessor(memory=MemoryGovernor())
+        unlimited.memory.register('big', lambda: 10 ** 12, lambda: None)
+        assert unlimited.memory.make_room() == 0
+    finally:
+        nlp_processor.model_nbytes = original
+
+    print("Memory governor test passed!")
+
+if __name__ == "__main__":
+    test_memory_governor()
@@ -0,0 +1,77 @@
+import sys
+import os
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+
+# Add the src directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from memory_store import MemoryStore
+
+class FailingConnection:
+    """Wraps a connection so that writes fail, as with a locked or full database."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn.__enter__()
+
+    def __exit__(self, *exc):
+        return self.conn.__exit__(*exc)
+
+    def executemany(self, *args):
+        raise sqlite3.OperationalError("database is locked")
+
+def test_memory_store():
+    print("Testing memory store...")
+    print("-" * 50)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "memory.db")
+        store = MemoryStore(path, batch_size=100, flush_interval=3600, max_topic_entries=2)
+
+        # Writes are buffered until a flush; reads flush first
+        store.record_query("battery storage", 5)
+        store.record_query("solar panels", 3)
+        assert store.conn.execute("SELECT COUNT(*) FROM query_history").fetchone()[0] == 0
+        assert store.count_queries() == 2
+        assert [entry['query'] for entry in store.get_query_history()] == ["solar panels", "battery storage"]
+
+        now = datetime.now()
+        for i in range(3):
+            store.record_topic("battery storage", f"summary {i}", ["cost"], [{'topic_id': 0}],
+                               timestamp=(now + timedelta(seconds=i)).isoformat())
+        memory = store.get_topic_memory("battery storage")
+        assert [entry['summary'] for entry in memory["battery storage"]] == ["summary 2", "summary 1", "summary 0"]
+        assert memory["battery storage"][0]['themes'] == ["cost"]
+
+        # Source outcomes accumulate per domain, best success rate first
+        for domain, success in (("a.example", True), ("a.example", False), ("b.example", True)):
+            store.record_source(domain, success)
+        assert store.get_source_stats() == {'b.example': {'success': 1, 'total': 1},
+                                            'a.example': {'success': 1, 'total': 2}}
+
+        # A failed flush keeps its batch for the next one
+        store.record_query("wind farms", 2)
+        real_conn, store.conn = store.conn, FailingConnection(store.conn)
+        store.flush()
+        store.conn = real_conn
+        assert store._pending_count == 1
+        assert store.count_queries() == 3
+
+        # Compaction keeps only the newest entries per topic
+        store.compact()
+        assert len(store.get_topic_memory("battery storage")["battery storage"]) == 2
+        store.close()
+
+        # Everything flushed is there after reopening
+        reopened = MemoryStore(path)
+        assert reopened.count_queries() == 3
+        reopened.close()
+
+    print("Memory store test passed!")
+
+if __name__ == "__main__":
+    test_memory_store()
@@ -0,0 +1,82 @@
+import sys
+import os
+import asyncio
+import time
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.micro_batcher import MicroBatcher, Overloaded
+
+def test_micro_batcher():
+    print("Testing request micro-batching...")
+    print("-" * 50)
+
+    batches = []
+
+    def shout(texts):
+        batches.append(len(texts))
+        time.sleep(0.05)  # A blocking model call
+        return [text.upper() for text in texts]
+
+    async def run():
+        batcher = MicroBatcher(shout, max_batch_size=8, max_wait_ms=20, max_queue=32)
+
+        # Concurrent requests share model calls, and each gets its own output
+        outputs = await asyncio.gather(*(batcher.submit(f"text {i}") for i in range(20)))
+        assert outputs == [f"TEXT {i}" for i in range(20)]
+        assert max(batches) <= 8 and len(batches) < 20
+        print(f"20 requests in {len(batches)} batches: {batches}")
+
+        # The event loop keeps running while a batch is processed
+        ticks = 0
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.005)
+        ticker = asyncio.create_task(tick())
+        await batcher.submit("one")
+        ticker.cancel()
+        assert ticks > 3
+
+        # Beyond the queue depth, requests are shed rather than queued
+        results = await asyncio.gather(*(batcher.submit(f"x{i}") for i in range(60)), return_exceptions=True)
+        shed = sum(isinstance(result, Overloaded) for result in results)
+        assert shed > 0 and all(isinstance(r, (str, Overloaded)) for r in results)
+        print(f"{shed} of 60 requests shed")
+
+        # A failing batch fails its own requests only
+        def broken(texts):
+            raise RuntimeError("model crashed")
+        failing = MicroBatcher(broken, max_wait_ms=1)
+        try:
+            await failing.submit("x")
+            assert False, "expected the batch error"
+        except RuntimeError:
+            pass
+        assert await batcher.submit("still fine") == "STILL FINE"
+
+        # An input that breaks its batch fails alone; the rest are re-run one by one
+        calls = []
+        def picky(texts):
+            calls.append(len(texts))
+            if "bad" in texts:
+                raise ValueError("unreadable input")
+            return [text.upper() for text in texts]
+        mixed = MicroBatcher(picky, max_batch_size=4, max_wait_ms=20)
+        results = await asyncio.gather(*(mixed.submit(text) for text in ["a", "bad", "c", "d"]),
+                                       return_exceptions=True)
+        assert results[0] == "A" and results[2:] == ["C", "D"]
+        assert isinstance(results[1], ValueError)
+        assert calls == [4, 1, 1, 1, 1]
+        await mixed.close()
+
+        await batcher.close()
+        await failing.close()
+
+    asyncio.run(run())
+    print("Micro-batcher test passed!")
+
+if __name__ == "__main__":
+    test_micro_batcher()
@@ -0,0 +1,139 @@
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Add the src directory to the Python path, ahead of the API's main.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from main import ResearchAggregator
+from job_queue import MemoryBroker, StageWorkers, Task
+from pipeline_stages import ANALYZE, COMBINE, FETCH, SEARCH, StagedPipeline, parse_stage_workers
+
+class FakeScraper:
+    def __init__(self, pages, results=None):
+        self.pages = pages
+        self.results = results
+
+    async def search_sources(self, query, num_sources=5, **kwargs):
+        if isinstance(self.results, Exception):
+            raise self.results
+        return list(self.results or self.pages)
+
+    async def scrape_article_async(self, url, use_cache=True):
+        if self.pages[url] is None:
+            return None
+        return {'url': url, 'title': f"Title {url}", 'text': self.pages[url]}
+
+class FakeNLP:
+    def __init__(self):
+        self.batches = []
+
+    def process_articles(self, articles, batch_size=8):
+        self.batches.append(len(articles))
+        return [{'summary': article['text'], 'entities': [], 'key_phrases': [], 'embedding': np.zeros(4),
+                 'sentiment': {'label': "POSITIVE", 'score': 0.9}, 'original_data': article}
+                for article in articles]
+
+    def combine_summaries(self, processed_articles):
+        if any(a['summary'] == "unreadable" for a in processed_articles):
+            raise ValueError("cannot combine")
+        return {'comprehensive_summary': " ".join(sorted(a['summary'] for a in processed_articles))}
+
+class FakeAggregator(ResearchAggregator):
+    def __init__(self, scraper):
+        self.scraper = scraper
+        self.nlp_processor = FakeNLP()
+        self.nlp_executor = ThreadPoolExecutor(max_workers=1)
+        self.saved, self.recorded = [], []
+
+    def get_effective_sources(self, query):
+        return []
+
+    def update_memory(self, query, results):
+        pass
+
+    def save_results(self, results, query):
+        self.saved.append(query)
+
+    def record_corpus(self, processed_articles):
+        self.recorded.extend(processed_articles)
+
+def run(scraper, query="battery storage"):
+    """One run through all stages, with retries fast enough for a test."""
+    broker = MemoryBroker()
+    aggregator = FakeAggregator(scraper)
+    pipeline = StagedPipeline(broker, aggregator)
+    stages = pipeline.stages(fetch_workers=3, analyze_batch=4)
+    for stage in stages:
+        stage.retry_delay = 0.01
+    workers = StageWorkers(broker, stages, poll_seconds=0.01)
+    workers.start()
+    try:
+        run_id = pipeline.submit(query, num_sources=3)
+        output = pipeline.wait(run_id, timeout=10, poll_seconds=0.01)
+    finally:
+        workers.stop(5)
+    return broker, output
+
+def test_pipeline_stages():
+    print("Testing the staged pipeline...")
+    print("-" * 50)
+
+    assert parse_stage_workers("fetch=16,analyze") == {'fetch': 16, 'analyze': 1}
+
+    broker = MemoryBroker()
+    aggregator = FakeAggregator(FakeScraper({
+        "https://a.example/1": "alpha", "https://b.example/2": "beta", "https://c.example/3": None
+    }))
+    pipeline = StagedPipeline(broker, aggregator)
+    workers = StageWorkers(broker, pipeline.stages(fetch_workers=3, analyze_batch=4), poll_seconds=0.01)
+    workers.start()
+    try:
+        run_id = pipeline.submit("battery storage", num_sources=3)
+        output = pipeline.wait(run_id, timeout=10, poll_seconds=0.01)
+    finally:
+        workers.stop(5)
+
+    # The unfetchable page is left out; the rest are combined once
+    assert output['comprehensive_analysis'] == {'comprehensive_summary': "alpha beta"}
+    assert output['metadata']['run_id'] == run_id
+    assert sorted(a['url'] for a in output['source_articles']) == ["https://a.example/1", "https://b.example/2"]
+    assert aggregator.saved == ["battery storage"] and len(aggregator.recorded) == 2
+    assert sum(aggregator.nlp_processor.batches) == 2
+    assert broker.counts(FETCH)['done'] == 3 and broker.counts(ANALYZE)['done'] == 2
+
+    # Resubmitting the same run is a no-op
+    assert pipeline.submit("battery storage", num_sources=3, run_id=run_id) == run_id
+    assert broker.counts()['queued'] == 0
+
+    # A redelivered combine leaves a finished run alone
+    combine = Task(COMBINE, {'run_id': run_id, 'query': "battery storage"})
+    pipeline.combine([combine])
+    assert aggregator.saved == ["battery storage"] and len(aggregator.recorded) == 2
+    # ... and one retried after a crash before its output was saved doesn't repeat the side effects
+    broker._results.pop(f"{run_id}:output")
+    pipeline.combine([combine])
+    assert pipeline.wait(run_id, timeout=0)['comprehensive_analysis'] == output['comprehensive_analysis']
+    assert aggregator.saved == ["battery storage"] and len(aggregator.recorded) == 2
+
+    # A URL the search returns twice is fetched once and still counted toward completion
+    pages = {"https://a.example/1": "alpha", "https://b.example/2": "beta"}
+    broker, output = run(FakeScraper(pages, results=["https://a.example/1", "https://a.example/1",
+                                                      "https://b.example/2"]))
+    assert output['comprehensive_analysis'] == {'comprehensive_summary': "alpha beta"}
+    assert broker.counts(FETCH)['done'] == 2
+
+    # A search or combine step that keeps failing ends the run with an error instead of leaving it waiting
+    broker, output = run(FakeScraper(pages, results=RuntimeError("search engine down")))
+    assert output['error'] == "Search failed: search engine down" and 'run_id' in output['metadata']
+    assert broker.counts(SEARCH)['failed'] == 1
+    broker, output = run(FakeScraper({"https://a.example/1": "unreadable"}))
+    assert output['error'] == "Combining the analyses failed: cannot combine"
+    assert broker.counts(COMBINE)['failed'] == 1
+
+    print("Staged pipeline test passed!")
+
+if __name__ == "__main__":
+    test_pipeline_stages()
@@ -0,0 +1,48 @@
+import sys
+import os
+import tempfile
+
+# Add the src directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from query_index import QueryIndex
+
+def test_query_index():
+    print("Testing query index...")
+    print("-" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "queries.jsonl")
+        index = QueryIndex(path)
+        queries = [
+            "impact of artificial intelligence on healthcare",
+            "quantum computing error correction",
+            "artificial intelligence in hospitals",
+            "history of the roman empire",
+        ]
+        for query in queries:
+            index.add(query)
+
+        matches = index.search("artificial intelligence healthcare", k=2)
+        print(f"Matches: {[(index.texts[i], round(score, 3)) for i, score in matches]}")
+        assert index.texts[matches[0][0]] == queries[0]
+        assert len(matches) == 2
+
+        # Unrelated queries fall below the threshold
+        assert index.search("medieval poetry", threshold=0.3) == []
+
+        # The index survives a restart
+        reloaded = QueryIndex(path)
+        assert len(reloaded) == len(queries)
+        assert reloaded.search("quantum error correction", k=1)[0][0] == 1
+
+        # Another process sharing the log sees its queries on its next append
+        reloaded.add("roman empire trade routes")
+        index.add("quantum sensors")
+        assert index.texts[-2:] == ["roman empire trade routes", "quantum sensors"]
+        assert len(QueryIndex(path)) == len(queries) + 2
+
+    print("\nQuery index test passed!")
+
+if __name__ == "__main__":
+    test_query_index()
@@ -0,0 +1,54 @@
+import sys
+import os
+import time
+
+# Add the src directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from result_cache import ResultCache
+
+def make_article(url):
+    return {
+        'summary': f"Summary of {url}",
+        'key_phrases': [],
+        'sentiment': {'label': 'NEUTRAL', 'score': 0.0},
+        'original_data': {'title': url, 'url': url, 'text': ''}
+    }
+
+def test_result_cache():
+    print("Testing result cache...")
+    print("-" * 50)
+
+    cache = ResultCache(full_threshold=0.9, partial_threshold=0.5, source_ttls={'news.example.com': 60})
+    articles = [make_article("https://news.example.com/a"), make_article("https://journal.example.org/b")]
+    output = {'comprehensive_analysis': {}, 'source_articles': [], 'metadata': {}}
+    cache.put("impact of artificial intelligence on healthcare", 2, output, articles)
+
+    # Identical query: full hit
+    lookup = cache.lookup("impact of artificial intelligence on healthcare", 2)
+    print(f"Identical query: {lookup.metadata()}")
+    assert lookup.mode == 'full'
+
+    # Asking for more sources than were cached only allows partial reuse
+    assert cache.lookup("impact of artificial intelligence on healthcare", 5).mode == 'partial'
+
+    # Related query: partial reuse of article analyses
+    lookup = cache.lookup("artificial intelligence healthcare", 2)
+    print(f"Related query: {lookup.metadata()}")
+    assert lookup.mode == 'partial'
+    assert len(lookup.articles) == 2
+
+    # Stale news source: only the fresh article is reused
+    cache.entries[0]['articles'][0]['_cached_at'] = time.time() - 120
+    lookup = cache.lookup("impact of artificial intelligence on healthcare", 2)
+    assert lookup.mode == 'partial'
+    assert [a['original_data']['url'] for a in lookup.articles] == ["https://journal.example.org/b"]
+
+    # Unrelated query: miss
+    assert cache.lookup("history of the roman empire", 2).mode == 'miss'
+    print(f"Stats: {cache.stats}")
+
+    print("\nResult cache test passed!")
+
+if __name__ == "__main__":
+    test_result_cache()
@@ -0,0 +1,77 @@
+import sys
+import os
+import tempfile
+
+# Add the src directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from result_store import ResultStore
+
+def test_result_store():
+    print("Testing result store...")
+    print("-" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ResultStore(tmp, max_segment_bytes=256)
+        ids = [
+            store.append(f"query {i % 2}", {'summary': "text " * (i * 20), 'index': i})
+            for i in range(8)
+        ]
+        print(f"Segments: {store.list_segments()}")
+        assert len(store.list_segments()) > 1
+
+        # Single lookups by id
+        assert store.get(ids[5])['results']['index'] == 5
+        assert store.get("missing") is None
+
+        # Index lookups by query
+        matches = store.find(query="query 1")
+        assert len(matches) == 4
+        assert matches[0]['id'] == ids[7]
+
+        # A torn write at the tail is dropped on restart
+        store._active_file.write(b"\x00\x00\x10\x00partial")
+        store.close()
+        store = ResultStore(tmp, max_segment_bytes=256)
+        records = list(store.iter_results())
+        assert [r['results']['index'] for r in records] == list(range(8))
+
+        export_path = os.path.join(tmp, "export.jsonl.gz")
+        assert store.export_jsonl(export_path) == 8
+        store.close()
+
+    # Appends after dropping a torn tail land where the index says they do
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ResultStore(tmp)
+        first = store.append("query", {'index': 0})
+        store._active_file.write(b"\x00\x00\x10\x00partial")
+        store.close()
+        store = ResultStore(tmp)
+        second = store.append("query", {'index': 1})
+        assert store.get(first)['results']['index'] == 0
+        assert store.get(second)['results']['index'] == 1
+        store.close()
+
+    # Two stores on one directory (as two worker processes would have) take turns appending
+    with tempfile.TemporaryDirectory() as tmp:
+        stores = [ResultStore(tmp, max_segment_bytes=512), ResultStore(tmp, max_segment_bytes=512)]
+        ids = [
+            stores[i % 2].append(f"query {i}", {'summary': "text " * (i % 7 * 10), 'index': i})
+            for i in range(30)
+        ]
+        assert len(stores[0].list_segments()) > 1
+        for reader in stores:
+            assert [reader.get(record_id)['results']['index'] for record_id in ids] == list(range(30))
+        # A torn tail left by a writer that died is cut off before the next append
+        stores[0]._active_file.write(b"\x00\x00\x10\x00partial")
+        stores[0]._active_file.flush()
+        last = stores[1].append("query", {'index': 30})
+        assert stores[0].get(last)['results']['index'] == 30
+        assert [r['results']['index'] for r in stores[0].iter_results()] == list(range(31))
+        for store in stores:
+            store.close()
+
+    print("\nResult store test passed!")
+
+if __name__ == "__main__":
+    test_result_store()
@@ -0,0 +1,44 @@
+import sys
+import os
+import time
+
+# Add the src directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from startup import Readiness, StartupProfile, spacy_model_available
+
+def test_startup():
+    print("Testing startup profiling and readiness...")
+    print("-" * 50)
+
+    profile = StartupProfile("test")
+    with profile.phase("import wave"):
+        import wave  # noqa: F401
+    with profile.phase("sleep"):
+        time.sleep(0.05)
+    report = profile.report()
+    # Slowest phase first
+    assert [phase['phase'] for phase in report['phases']] == ["sleep", "import wave"]
+    assert report['phases'][0]['seconds'] >= 0.05
+    print(profile.format())
+
+    readiness = Readiness()
+    assert readiness.ready  # Nothing to wait for yet
+    readiness.warm_up("slow", lambda: time.sleep(0.1)).join(5)
+    def broken():
+        raise RuntimeError("model missing")
+    readiness.warm_up("broken", broken).join(5)
+    snapshot = readiness.snapshot()
+    assert snapshot['components']['slow']['status'] == 'ready'
+    assert snapshot['components']['broken'] == {**snapshot['components']['broken'],
+                                                 'status': 'failed', 'detail': "model missing"}
+    assert not snapshot['ready'] and not readiness.ready
+
+    # Model packages are looked up without importing them
+    assert spacy_model_available("json")
+    assert not spacy_model_available("no_such_spacy_model")
+
+    print("Startup test passed!")
+
+if __name__ == "__main__":
+    test_startup()
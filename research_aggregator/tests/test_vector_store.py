@@ -0,0 +1,56 @@
+import sys
+import os
+
+import numpy as np
+
+# Add the src directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from vector_store import VectorStore
+
+def test_vector_store():
+    print("Testing reduced-precision vector store...")
+    print("-" * 50)
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((2000, 384)).astype(np.float32)
+    queries = vectors[:20] + 0.3 * rng.standard_normal((20, 384)).astype(np.float32)
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    exact = VectorStore(dtype='float32', capacity=16)
+    exact.add(vectors, [f"doc {i}" for i in range(len(vectors))])
+    assert len(exact) == 2000
+
+    for dtype, ratio in (('float16', 2), ('int8', 4)):
+        store = VectorStore(dtype=dtype, capacity=16)
+        store.add(vectors, [f"doc {i}" for i in range(len(vectors))])
+        # Vector memory shrinks by the dtype's ratio (int8 adds one float32 scale per row)
+        vector_bytes = store.nbytes - store._item_bytes
+        assert vector_bytes <= (exact.nbytes - exact._item_bytes) / ratio + 4 * len(store._vectors)
+        # The best hit matches full precision, the rest differ at most in near-ties
+        recall = []
+        for query in queries:
+            expected = exact.search(query, k=5)
+            found = store.search(query, k=5)
+            assert found[0][0] == expected[0][0]
+            assert np.allclose([s for _, s in found], [s for _, s in expected], atol=0.005)
+            recall.append(len({i for i, _ in found} & {i for i, _ in expected}) / 5)
+        assert np.mean(recall) >= 0.9, dtype
+        print(f"{dtype}: {vector_bytes / len(store):.0f} bytes per vector")
+
+    hits = exact.search_items(queries[3], k=1)
+    assert hits == ["doc 3"]
+    top_score = exact.search(normalized[7], k=1)[0]
+    assert top_score[0] == 7 and abs(top_score[1] - 1.0) < 1e-5
+
+    # Oldest items are dropped past max_items
+    bounded = VectorStore(dtype='int8', capacity=4, max_items=3)
+    bounded.add(normalized[:5], ["a", "b", "c", "d", "e"])
+    assert bounded.items == ["c", "d", "e"] and len(bounded) == 3
+    assert bounded.search_items(normalized[4], k=1) == ["e"]
+    assert VectorStore().search(normalized[0]) == []
+
+    print("Vector store test passed!")
+
+if __name__ == "__main__":
+    test_vector_store()
@@ -0,0 +1,108 @@
+import sys
+import os
+import asyncio
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the src directory to the Python path, ahead of the API's main.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from main import ResearchAggregator
+from watchlist import WatchlistRunner, WatchlistStore
+
+class FakeScraper:
+    def __init__(self, pages):
+        self.pages = pages
+        self.use_cache = []
+
+    async def search_sources(self, query, num_sources=5, **kwargs):
+        return list(self.pages)
+
+    async def iter_scraped_articles(self, urls, use_cache=True):
+        self.use_cache.append(use_cache)
+        for url in urls:
+            yield {'url': url, 'title': f"Title {url}", 'text': self.pages[url]}
+
+class FakeNLP:
+    def __init__(self):
+        self.processed = []
+        self.combined_calls = []
+
+    def process_articles(self, articles, batch_size=8):
+        self.processed.extend(article['url'] for article in articles)
+        return [{'summary': article['text'], 'entities': [], 'key_phrases': [], 'embedding': [0.0],
+                 'sentiment': {'label': "POSITIVE", 'score': 0.9}, 'original_data': article}
+                for article in articles]
+
+    def update_combined(self, previous, changed_articles, processed_articles):
+        self.combined_calls.append((previous, [a['original_data']['url'] for a in changed_articles]))
+        return {'comprehensive_summary': " ".join(a['summary'] for a in processed_articles)}
+
+class FakeAggregator(ResearchAggregator):
+    def __init__(self, scraper):
+        self.scraper = scraper
+        self.nlp_processor = FakeNLP()
+        self.nlp_executor = ThreadPoolExecutor(max_workers=1)
+        self.saved = []
+
+    def update_memory(self, query, results):
+        pass
+
+    def save_results(self, results, query):
+        self.saved.append(results)
+
+    def record_corpus(self, processed_articles):
+        pass
+
+def test_watchlist():
+    print("Testing watchlist refresh...")
+    print("-" * 50)
+
+    with tempfile.TemporaryDirectory() as directory:
+        scraper = FakeScraper({"https://a.example/1": "first", "https://b.example/2": "second"})
+        aggregator = FakeAggregator(scraper)
+        store = WatchlistStore(os.path.join(directory, "watchlist.db"))
+        runner = WatchlistRunner(aggregator, store)
+        store.add("battery storage", num_sources=2, interval_seconds=3600)
+        assert [watch['query'] for watch in store.due()] == ["battery storage"]
+
+        results = asyncio.run(runner.run_due())
+        assert results["battery storage"] == {'new': 2, 'changed': 0, 'unchanged': 0, 'dropped': 0}
+        assert scraper.use_cache == [False]  # Pages are always fetched fresh
+        assert store.due() == [] and store.due(time.time() + 3601)
+
+        # Whitespace-only edits keep the fingerprint; a real edit and a new article are reprocessed
+        aggregator.nlp_processor.processed.clear()
+        scraper.pages = {"https://a.example/1": "first  ", "https://b.example/2": "second, revised",
+                         "https://c.example/3": "third"}
+        watch = store.watches()[0] | {'num_sources': 3}
+        output = asyncio.run(runner.refresh(watch))
+        assert output['metadata']['watch'] == {'new': 1, 'changed': 1, 'unchanged': 1, 'dropped': 0}
+        assert sorted(aggregator.nlp_processor.processed) == ["https://b.example/2", "https://c.example/3"]
+        previous, changed = aggregator.nlp_processor.combined_calls[-1]
+        assert previous == {'comprehensive_summary': "first second"}
+        assert sorted(changed) == ["https://b.example/2", "https://c.example/3"]
+        assert len(output['source_articles']) == 3
+
+        # Nothing changed: no models run and the previous analysis is reused
+        aggregator.nlp_processor.processed.clear()
+        calls, saved = len(aggregator.nlp_processor.combined_calls), len(aggregator.saved)
+        output = asyncio.run(runner.refresh(watch))
+        assert output['metadata']['watch']['unchanged'] == 3
+        assert aggregator.nlp_processor.processed == []
+        assert len(aggregator.nlp_processor.combined_calls) == calls and len(aggregator.saved) == saved
+
+        # An article that is gone is dropped from the watch
+        del scraper.pages["https://a.example/1"]
+        output = asyncio.run(runner.refresh(watch))
+        assert output['metadata']['watch'] == {'new': 0, 'changed': 0, 'unchanged': 2, 'dropped': 1}
+        assert sorted(store.articles(watch['id'])) == ["https://b.example/2", "https://c.example/3"]
+
+        assert store.remove("battery storage") and store.watches() == []
+        assert store.articles(watch['id']) == {}
+
+    print("Watchlist test passed!")
+
+if __name__ == "__main__":
+    test_watchlist()